@@ -0,0 +1,27 @@
+"""
+Benchmarks for ATS Mileage Sync.
+
+Each ``bench_*`` module is runnable on its own, e.g.::
+
+    python -m benchmarks.bench_db_write
+"""
+
+from dataclasses import replace
+
+from src.config import Settings
+
+
+def bench_settings(**overrides) -> Settings:
+    """
+    Settings for benchmark runs.
+
+    Benchmarks never talk to the real services, so the SOAP credentials are
+    placeholders; point soap_url at a SoapStub via ``overrides``.
+    """
+    placeholders = {
+        "soap_action": "bench",
+        "soap_username": "bench",
+        "soap_password": "bench",
+        "soap_company_code": "bench",
+    }
+    return replace(Settings(), **{**placeholders, **overrides})
@@ -0,0 +1,56 @@
+"""
+Benchmark: multi-day backfill throughput vs fetch concurrency.
+
+Runs src.job.run_for_range against the local SOAP stub (with simulated
+service latency) and the SQLite stand-in database, and reports days per
+minute at concurrency 1, 4 and 8.
+
+Usage:
+    python -m benchmarks.bench_backfill [--days 30] [--fleet 5000] [--latency-ms 500]
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from src.job import run_for_range
+from src.sqlite_db import SqliteKmLog
+from . import bench_settings
+from .soap_stub import SoapStub
+
+
+def main():
+    argp = argparse.ArgumentParser()
+    argp.add_argument("--days", type=int, default=30)
+    argp.add_argument("--fleet", type=int, default=5000)
+    argp.add_argument("--latency-ms", type=float, default=500)
+    argp.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    args = argp.parse_args()
+
+    start = datetime(2026, 1, 1)
+    end = start + timedelta(days=args.days - 1)
+
+    print(f"{'concurrency':>11} {'days':>5} {'inserted':>9} {'seconds':>8} {'days/min':>9}")
+    with SoapStub(fleet_size=args.fleet, latency_ms=args.latency_ms) as stub:
+        for concurrency in args.concurrency:
+            settings = bench_settings(
+                soap_url=stub.url,
+                fetch_concurrency=concurrency,
+                db_write_mode="executemany",
+                deduplicate=True,
+            )
+            db = SqliteKmLog()
+
+            started = time.perf_counter()
+            summary = run_for_range(start, end, settings, db=db)
+            elapsed = time.perf_counter() - started
+            db.close()
+
+            print(
+                f"{concurrency:>11} {args.days:>5} {summary['inserted']:>9} "
+                f"{elapsed:>8.2f} {args.days / elapsed * 60:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
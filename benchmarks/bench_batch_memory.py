@@ -0,0 +1,91 @@
+"""
+Memory benchmark: list of MileageRecord + inserted dicts vs MileageBatch.
+
+Measures Python heap bytes per record (tracemalloc) for what run_for_date
+keeps alive for one day:
+
+* ``before`` - a list of plain (``__dict__``) dataclass records plus the
+               former ``inserted_records`` list of dicts
+* ``after``  - a MileageBatch plus the inserted MileageBatch taken from it
+
+Strings are created the way the parser sees them (a fresh ``str`` per XML
+text node), so interning in MileageBatch is part of the measurement.
+
+Usage:
+    python -m benchmarks.bench_batch_memory [--records 100000]
+"""
+
+import argparse
+import gc
+import tracemalloc
+from dataclasses import dataclass
+
+from src.parser import MileageBatch
+from .fleet import make_records
+
+
+@dataclass
+class LegacyMileageRecord:
+    """Shape of MileageRecord before slots/columnar storage."""
+    device_id: str
+    license_plate: str | None
+    mileage: int | None
+
+
+def _fresh(text: str) -> str:
+    # lxml returns a new str object per .text access
+    return "".join(list(text))
+
+
+def build_before(raw: list[tuple[str, str, str]]):
+    records = [
+        LegacyMileageRecord(_fresh(d), _fresh(p), int(m)) for d, p, m in raw
+    ]
+    inserted = [
+        {"device_id": r.device_id, "plate": r.license_plate, "mileage": r.mileage}
+        for r in records
+    ]
+    return records, inserted
+
+
+def build_after(raw: list[tuple[str, str, str]]):
+    batch = MileageBatch()
+    for d, p, m in raw:
+        batch.append(_fresh(d), _fresh(p), int(m))
+    inserted = batch.compress([True] * len(batch))
+    return batch, inserted
+
+
+def measure(fn, raw) -> int:
+    gc.collect()
+    tracemalloc.start()
+    result = fn(raw)
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=100_000)
+    args = parser.parse_args()
+
+    # Each device appears once per day, but plates/devices repeat across the
+    # two structures, which is where the old dict copy paid twice.
+    raw = [
+        (r.device_id, r.license_plate, str(r.mileage))
+        for r in make_records(args.records)
+    ]
+
+    before = measure(build_before, raw)
+    after = measure(build_after, raw)
+    n = len(raw)
+    print(f"records={n}")
+    print(f"before: {before / 1024 / 1024:8.2f} MB  {before / n:7.1f} B/record")
+    print(f" after: {after / 1024 / 1024:8.2f} MB  {after / n:7.1f} B/record")
+    print(f" saved: {(1 - after / before) * 100:7.1f} %")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark: multi-company sync, one process per company vs one after another.
+
+Every company is served by the same local SOAP stub (``--fleet`` devices
+per response). The baseline syncs the companies one after another in this
+process, like consecutive per-company cron jobs; the multi-company runner
+then fetches and parses them in ``--workers`` processes while this process
+writes to the SQLite stand-in. Deduplication is off, since all companies
+report the same devices.
+
+Usage:
+    python -m benchmarks.bench_companies [--companies 4] [--fleet 50000] [--workers 1 2 4]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from dataclasses import replace
+from datetime import datetime
+
+from src.config import load_company_profiles
+from src.job import run_for_companies, run_for_date
+from src.logger import setup_logging
+from src.sqlite_db import SqliteKmLog
+from . import bench_settings
+from .soap_stub import SoapStub
+
+DAY = datetime(2026, 1, 6)
+
+
+def main():
+    argp = argparse.ArgumentParser()
+    argp.add_argument("--companies", type=int, default=4)
+    argp.add_argument("--fleet", type=int, default=50_000, help="Devices per company")
+    argp.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    argp.add_argument("--latency-ms", type=float, default=50.0, help="SOAP stub delay per request")
+    args = argp.parse_args()
+
+    setup_logging("WARNING", log_file="", console=False)
+    with tempfile.TemporaryDirectory() as tmp, SoapStub(fleet_size=args.fleet, latency_ms=args.latency_ms) as stub:
+        path = os.path.join(tmp, "companies.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump([{"name": f"c{i}", "SOAP_COMPANY_CODE": f"C{i}"} for i in range(args.companies)], f)
+        base = bench_settings(
+            soap_url=stub.url,
+            soap_cache_mode="off",
+            deduplicate=False,
+            checkpoint_file=os.path.join(tmp, "checkpoints.json"),
+        )
+        profiles = load_company_profiles(path, base)
+        rows = args.companies * args.fleet
+
+        print(f"companies={args.companies} fleet={args.fleet}")
+        print(f"{'run':<24} {'seconds':>8} {'rows/sec':>10} {'inserted':>9}")
+
+        db = SqliteKmLog()
+        started = time.perf_counter()
+        inserted = sum(run_for_date(DAY, p.settings, db=db)["inserted"] for p in profiles)
+        elapsed = time.perf_counter() - started
+        db.close()
+        print(f"{'sequential':<24} {elapsed:>8.2f} {rows / elapsed:>10.0f} {inserted:>9}")
+
+        for workers in args.workers:
+            db = SqliteKmLog()
+            started = time.perf_counter()
+            summary = run_for_companies(DAY, DAY, replace(base, company_workers=workers), profiles, db=db)
+            elapsed = time.perf_counter() - started
+            db.close()
+            name = f"process pool, {workers} workers"
+            print(f"{name:<24} {elapsed:>8.2f} {rows / elapsed:>10.0f} {summary['inserted']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark: per-call database overhead with fresh vs reused cursors and connections.
+
+Cursor part: the per-record INSERT and exists checks run ``--calls`` times,
+once allocating a new cursor for every call (the previous MsSql behaviour)
+and once on one cached cursor per statement (MsSql._cursor). Against
+SQLite this only shows the client-side cost; with ``--connection-string``
+the same comparison runs against a real SQL Server through pyodbc, where a
+reused cursor also keeps its prepared statement handle.
+
+Connection part: ``--runs`` short jobs each need a connection, once opening
+a fresh one per job and once checking it out of src.db.ConnectionPool.
+``--connect-ms`` models the ODBC login (TCP, TLS, authentication) that a
+fresh connection pays against a remote server; validated checkouts pay one
+``--rtt-ms`` ping instead.
+
+Usage:
+    python -m benchmarks.bench_db_cursor [--calls 20000] [--runs 20] [--connect-ms 40] [--rtt-ms 1]
+    python -m benchmarks.bench_db_cursor --connection-string "DRIVER={ODBC Driver 18 for SQL Server};..."
+"""
+
+import argparse
+import sqlite3
+import time
+
+from src.db import ConnectionPool
+
+_SQLITE_INSERT = "INSERT INTO km (DeviceId, [Date], Mileage) VALUES (?, ?, ?)"
+_SQLITE_EXISTS = "SELECT 1 FROM km WHERE DeviceId = ? AND [Date] = ? LIMIT 1"
+
+# Rolled back at the end, so nothing is left on the server
+_MSSQL_SETUP = "CREATE TABLE #km (DeviceId NVARCHAR(100) NOT NULL, [Date] DATE NOT NULL, Mileage BIGINT NULL)"
+_MSSQL_INSERT = "INSERT INTO #km (DeviceId, [Date], Mileage) VALUES (?, ?, ?)"
+_MSSQL_EXISTS = "SELECT TOP (1) 1 FROM #km WHERE DeviceId = ? AND [Date] = ?"
+
+
+def _calls(conn, insert_sql: str, exists_sql: str, calls: int, *, cached: bool) -> float:
+    """Run insert + exists per call and return the seconds per call."""
+    cursors: dict[str, object] = {}
+
+    def cursor(sql: str):
+        if not cached:
+            return conn.cursor()
+        cur = cursors.get(sql)
+        if cur is None:
+            cur = cursors[sql] = conn.cursor()
+        return cur
+
+    started = time.perf_counter()
+    for idx in range(calls):
+        device_id = f"DEV{idx:07d}"
+        cursor(insert_sql).execute(insert_sql, (device_id, "2026-01-06", idx))
+        cursor(exists_sql).execute(exists_sql, (device_id, "2026-01-06")).fetchall()
+    return (time.perf_counter() - started) / calls
+
+
+def bench_cursors(calls: int, connection_string: str | None) -> None:
+    print(f"{'backend':<8} {'cursor':<7} {'calls':>7} {'us/call':>8}")
+    if connection_string:
+        import pyodbc
+
+        conn = pyodbc.connect(connection_string, autocommit=False)
+        conn.execute(_MSSQL_SETUP)
+        insert_sql, exists_sql, backend = _MSSQL_INSERT, _MSSQL_EXISTS, "mssql"
+    else:
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE TABLE km (DeviceId TEXT NOT NULL, [Date] TEXT NOT NULL, Mileage INTEGER)")
+        conn.execute("CREATE INDEX IX_km ON km (DeviceId, [Date])")
+        insert_sql, exists_sql, backend = _SQLITE_INSERT, _SQLITE_EXISTS, "sqlite"
+
+    try:
+        for cached in (False, True):
+            per_call = _calls(conn, insert_sql, exists_sql, calls, cached=cached)
+            print(f"{backend:<8} {'cached' if cached else 'fresh':<7} {calls:>7} {per_call * 1e6:>8.1f}")
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+class _SimulatedRemote:
+    """SQLite connection that pays a login delay on connect and an RTT per ping."""
+
+    def __init__(self, connect_sec: float, rtt_sec: float):
+        time.sleep(connect_sec)
+        self.rtt = rtt_sec
+        self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+
+    def ping(self) -> bool:
+        time.sleep(self.rtt)
+        self.conn.execute("SELECT 1").fetchall()
+        return True
+
+    def rollback(self) -> None:
+        self.conn.rollback()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def bench_connections(runs: int, connect_ms: float, rtt_ms: float) -> None:
+    connect_sec, rtt_sec = connect_ms / 1000, rtt_ms / 1000
+    print(f"\n{'connection':<22} {'runs':>5} {'ms/run':>7} {'opened':>7} {'reused':>7}")
+
+    started = time.perf_counter()
+    for _ in range(runs):
+        _SimulatedRemote(connect_sec, rtt_sec).close()
+    per_run = (time.perf_counter() - started) / runs
+    print(f"{'fresh per run':<22} {runs:>5} {per_run * 1000:>7.2f} {runs:>7} {0:>7}")
+
+    for name, validate_after in (("pool, ping on reuse", 0.0), ("pool, ping after 30s", 30.0)):
+        pool = ConnectionPool(lambda: _SimulatedRemote(connect_sec, rtt_sec), validate_after_sec=validate_after)
+        started = time.perf_counter()
+        for _ in range(runs):
+            with pool.connection():
+                pass
+        per_run = (time.perf_counter() - started) / runs
+        pool.close()
+        print(f"{name:<22} {runs:>5} {per_run * 1000:>7.2f} {pool.created:>7} {pool.reused:>7}")
+
+
+def main():
+    argp = argparse.ArgumentParser()
+    argp.add_argument("--calls", type=int, default=20_000, help="Statement pairs per cursor mode")
+    argp.add_argument("--runs", type=int, default=20, help="Connection checkouts per connection mode")
+    argp.add_argument("--connect-ms", type=float, default=40.0, help="Simulated ODBC login time")
+    argp.add_argument("--rtt-ms", type=float, default=1.0, help="Simulated round trip of a validation ping")
+    argp.add_argument("--connection-string", help="Measure cursors on a real SQL Server via pyodbc")
+    args = argp.parse_args()
+
+    bench_cursors(args.calls, args.connection_string)
+    bench_connections(args.runs, args.connect_ms, args.rtt_ms)
+
+
+if __name__ == "__main__":
+    main()
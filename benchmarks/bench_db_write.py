@@ -0,0 +1,96 @@
+"""
+Benchmark: per-record vs set-based mileage writes.
+
+Compares the legacy ``exists_for_date`` + ``insert_km_log`` loop with
+``bulk_insert_km_logs`` (set-based dedup) and with a preloaded DedupIndex
+(``set`` and ``bloom`` modes) on an SQLite stand-in at 1k, 10k and 100k rows.
+SQLite runs in-process, so the raw timings understate the gap; the
+``projected`` column adds ``--rtt-ms`` of network latency per round trip
+to approximate a remote SQL Server.
+
+Usage:
+    python -m benchmarks.bench_db_write [--sizes 1000 10000 100000] [--rtt-ms 0.5]
+"""
+
+import argparse
+import time
+
+from src.db import DedupIndex
+from src.parser import MileageBatch
+from src.sqlite_db import SqliteKmLog
+from .fleet import make_records
+
+DATE_STR = "2026-01-06"
+
+
+def _seed_previous_run(db: SqliteKmLog, records, share: float) -> None:
+    """Pre-insert a share of the batch so dedup has something to skip."""
+    for r in records[: int(len(records) * share)]:
+        db.insert_km_log(r.device_id, r.license_plate, DATE_STR, r.mileage)
+    db.commit()
+    db.round_trips = 0
+
+
+def run_row(db: SqliteKmLog, records) -> int:
+    inserted = 0
+    for r in records:
+        if db.exists_for_date(r.device_id, DATE_STR):
+            continue
+        db.insert_km_log(r.device_id, r.license_plate, DATE_STR, r.mileage)
+        inserted += 1
+    db.commit()
+    return inserted
+
+
+def run_bulk(db: SqliteKmLog, records) -> int:
+    inserted = sum(db.bulk_insert_km_logs(MileageBatch.from_records(records), DATE_STR, deduplicate=True))
+    db.commit()
+    return inserted
+
+
+def _run_indexed(mode: str):
+    def run(db: SqliteKmLog, records) -> int:
+        batch = MileageBatch.from_records(records)
+        index = DedupIndex.load(db, DATE_STR, DATE_STR, mode=mode)
+        new, unsure = index.partition(batch, DATE_STR)
+        inserted = sum(db.bulk_insert_km_logs(batch.compress(new), DATE_STR, deduplicate=False))
+        if any(unsure):
+            inserted += sum(db.bulk_insert_km_logs(batch.compress(unsure), DATE_STR, deduplicate=True))
+        db.commit()
+        return inserted
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--rtt-ms", type=float, default=0.5, help="assumed network round trip per call")
+    parser.add_argument("--existing", type=float, default=0.2, help="share of rows already in the table")
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'mode':>6} {'inserted':>9} {'trips':>8} {'seconds':>9} {'projected':>10}")
+    for size in args.sizes:
+        records = make_records(size, duplicate_ratio=0.01)
+        for name, fn in (
+            ("row", run_row),
+            ("bulk", run_bulk),
+            ("set", _run_indexed("set")),
+            ("bloom", _run_indexed("bloom")),
+        ):
+            db = SqliteKmLog()
+            _seed_previous_run(db, records, args.existing)
+
+            started = time.perf_counter()
+            inserted = fn(db, records)
+            elapsed = time.perf_counter() - started
+            projected = elapsed + db.round_trips * args.rtt_ms / 1000
+
+            print(
+                f"{size:>8} {name:>6} {inserted:>9} {db.round_trips:>8} "
+                f"{elapsed:>9.3f} {projected:>10.3f}"
+            )
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark: dedup lookup latency, non-sargable vs half-open date range.
+
+Seeds an SQLite table shaped like dbo.arac_km_log with millions of rows
+(``--devices`` x ``--days``) and times exists_for_date style lookups:
+
+* ``scan``     - no index, ``date([Date]) = date(?)`` (the old query on an unindexed table)
+* ``convert``  - (DeviceId, [Date]) index, ``date([Date]) = date(?)``:
+                 the function on the column limits the seek to DeviceId
+* ``range``    - same index, ``[Date] >= ? AND [Date] < ?`` (what MsSql uses now)
+
+SQLite and SQL Server plan these the same way for this shape: a function
+wrapped around the indexed column cannot be used as a seek predicate.
+
+Usage:
+    python -m benchmarks.bench_dedup_index [--devices 20000] [--days 100] [--lookups 2000]
+"""
+
+import argparse
+import random
+import sqlite3
+import statistics
+import time
+from datetime import date, timedelta
+
+from src.sqlite_db import next_day
+
+CONVERT_SQL = "SELECT 1 FROM arac_km_log WHERE DeviceId = ? AND date([Date]) = date(?)"
+RANGE_SQL = "SELECT 1 FROM arac_km_log WHERE DeviceId = ? AND [Date] >= ? AND [Date] < ?"
+
+
+def seed(conn: sqlite3.Connection, devices: int, days: int) -> None:
+    conn.execute(
+        "CREATE TABLE arac_km_log (DeviceId TEXT, License_Plate TEXT, [Date] TEXT, Mileage INTEGER, KayitTarihi TEXT)"
+    )
+    start = date(2025, 1, 1)
+    for offset in range(days):
+        day = f"{start + timedelta(days=offset)} 00:00:00"
+        conn.executemany(
+            "INSERT INTO arac_km_log VALUES (?, NULL, ?, ?, ?)",
+            ((f"DEV{d:07d}", day, d * 10 + offset, day) for d in range(devices)),
+        )
+    conn.commit()
+
+
+def time_lookups(conn, sql: str, keys, with_range: bool) -> list[float]:
+    samples = []
+    for device_id, day in keys:
+        params = (device_id, day, next_day(day)) if with_range else (device_id, day)
+        started = time.perf_counter()
+        conn.execute(sql, params).fetchone()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def report(name: str, samples: list[float]) -> None:
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{name:>8}: n={len(samples):>5}  p50={statistics.median(samples):9.3f} ms  p95={p95:9.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=20_000)
+    parser.add_argument("--days", type=int, default=100)
+    parser.add_argument("--lookups", type=int, default=2_000)
+    parser.add_argument("--scan-lookups", type=int, default=20, help="lookups for the slow unindexed case")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(":memory:")
+    started = time.perf_counter()
+    seed(conn, args.devices, args.days)
+    print(f"seeded {args.devices * args.days:,} rows in {time.perf_counter() - started:.1f}s")
+
+    rnd = random.Random(7)
+    start = date(2025, 1, 1)
+    keys = [
+        (f"DEV{rnd.randrange(args.devices):07d}", str(start + timedelta(days=rnd.randrange(args.days + 5))))
+        for _ in range(args.lookups)
+    ]
+
+    report("scan", time_lookups(conn, CONVERT_SQL, keys[: args.scan_lookups], False))
+
+    conn.execute("CREATE INDEX IX_arac_km_log_DeviceId_Date ON arac_km_log (DeviceId, [Date], Mileage)")
+    report("convert", time_lookups(conn, CONVERT_SQL, keys, False))
+    report("range", time_lookups(conn, RANGE_SQL, keys, True))
+
+    for name, sql, params in (
+        ("convert", CONVERT_SQL, keys[0]),
+        ("range", RANGE_SQL, (*keys[0], next_day(keys[0][1]))),
+    ):
+        plan = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+        print(f"{name:>8} plan: {plan[0][-1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark: full vs incremental daily sync of a stable fleet.
+
+The SOAP stub serves odometer readings where only ``--moving`` of the
+fleet drives per day. Both modes first sync day 1 into their own SQLite
+database; day 2 is then measured once as a full run (every device is
+parsed, deduplicated and written) and once incrementally (devices with an
+unchanged reading are dropped while parsing). A second incremental run of
+day 2 shows that an already synced day is not requested again.
+
+Usage:
+    python -m benchmarks.bench_incremental [--fleet 50000] [--moving 0.1]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from src.job import run_for_date
+from src.logger import setup_logging
+from src.metrics import metrics
+from src.sqlite_db import SqliteKmLog
+from . import bench_settings
+from .soap_stub import SoapStub
+
+DAY_1 = datetime(2026, 1, 5)
+DAY_2 = DAY_1 + timedelta(days=1)
+
+
+def _run(settings, db: SqliteKmLog, day: datetime, stub: SoapStub) -> dict:
+    requests_before = stub.requests
+    started = time.perf_counter()
+    summary = run_for_date(day, settings, db=db)
+    return {
+        "seconds": time.perf_counter() - started,
+        "requests": stub.requests - requests_before,
+        "soap_mb": summary["soap_bytes"] / 1e6,
+        "parsed": metrics.counters.get("records_parsed_total", 0),
+        "inserted": summary["inserted"],
+        "skipped": summary["skipped"] + summary.get("unchanged", 0),
+        "round_trips": db.round_trips,
+    }
+
+
+def main():
+    argp = argparse.ArgumentParser()
+    argp.add_argument("--fleet", type=int, default=50_000)
+    argp.add_argument("--moving", type=float, default=0.1, help="Share of devices driving per day")
+    argp.add_argument("--streaming", action="store_true", help="Use SOAP_STREAMING for both modes")
+    args = argp.parse_args()
+
+    setup_logging("WARNING", log_file="", console=False)
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp, SoapStub(fleet_size=args.fleet, moving_ratio=args.moving) as stub:
+        for mode in ("full", "incremental"):
+            settings = bench_settings(
+                soap_url=stub.url,
+                soap_cache_mode="off",
+                soap_streaming=args.streaming,
+                incremental=mode == "incremental",
+                high_water_file=os.path.join(tmp, "high_water.json"),
+                metrics_enabled=True,
+                metrics_file="",
+            )
+            db = SqliteKmLog()
+            _run(settings, db, DAY_1, stub)
+            db.round_trips = 0
+            rows.append((f"{mode}, day 2", _run(settings, db, DAY_2, stub)))
+            if mode == "incremental":
+                db.round_trips = 0
+                rows.append((f"{mode}, day 2 rerun", _run(settings, db, DAY_2, stub)))
+            db.close()
+
+    print(f"fleet={args.fleet} moving={args.moving:.0%}")
+    print(
+        f"{'run':<24} {'seconds':>8} {'requests':>9} {'soap MB':>8} {'parsed':>8} "
+        f"{'inserted':>9} {'skipped':>8} {'db trips':>9}"
+    )
+    for name, r in rows:
+        print(
+            f"{name:<24} {r['seconds']:>8.3f} {r['requests']:>9} {r['soap_mb']:>8.2f} {r['parsed']:>8} "
+            f"{r['inserted']:>9} {r['skipped']:>8} {r['round_trips']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
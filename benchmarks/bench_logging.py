@@ -0,0 +1,88 @@
+"""
+Benchmark: parse + insert time with DEBUG logging on and off.
+
+Parses a synthetic SOAP response and writes it through the job's write
+path into the SQLite stand-in, once per logging mode:
+
+* ``off``        - LOG_LEVEL=INFO; per-record DEBUG calls are gated out
+* ``debug``      - LOG_LEVEL=DEBUG, plain text to a log file via the queue listener
+* ``debug-json`` - LOG_LEVEL=DEBUG, JSON lines to a log file via the queue listener
+
+``row`` write mode logs one line per inserted row (like MsSql.insert_km_log),
+``executemany`` one line per batch. Console output is disabled so the
+terminal does not dominate the timings.
+
+Usage:
+    python -m benchmarks.bench_logging [--records 100000] [--write-modes row executemany]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from src.config import Settings
+from src.job import _write_records
+from src.logger import setup_logging, shutdown_logging
+from src.parser import MileageBatch, parse_mileage_response
+from src.sqlite_db import SqliteKmLog
+from . import bench_settings
+from .fleet import make_soap_response
+
+DATE_STR = "2026-01-06"
+MODES = {
+    "off": ("INFO", False),
+    "debug": ("DEBUG", False),
+    "debug-json": ("DEBUG", True),
+}
+
+
+def run(xml_text: str, settings: Settings) -> tuple[float, float]:
+    """Return (parse seconds, insert seconds)."""
+    started = time.perf_counter()
+    batch = parse_mileage_response(xml_text)
+    parsed = time.perf_counter()
+
+    db = SqliteKmLog()
+    summary = {"inserted": 0, "skipped": 0, "errors": 0}
+    for part in batch.chunks(settings.parse_batch_size):
+        _write_records(db, part, DATE_STR, settings, summary, MileageBatch())
+    db.commit()
+    db.close()
+    return parsed - started, time.perf_counter() - parsed
+
+
+def main():
+    argp = argparse.ArgumentParser()
+    argp.add_argument("--records", type=int, default=100_000)
+    argp.add_argument("--write-modes", nargs="+", default=["row", "executemany"], choices=["row", "executemany"])
+    argp.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    args = argp.parse_args()
+
+    xml_text = make_soap_response(args.records)
+
+    print(f"{'write':>11} {'logging':>10} {'parse s':>8} {'insert s':>9} {'total s':>8} {'log MB':>7} {'vs off':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for write_mode in args.write_modes:
+            settings = bench_settings(db_write_mode=write_mode, dedup_cache="off", deduplicate=True)
+            baseline = None
+            for mode in args.modes:
+                level, json_format = MODES[mode]
+                log_file = os.path.join(tmp, f"{write_mode}-{mode}.log")
+                setup_logging(level, log_file=log_file, json_format=json_format, console=False)
+                parse_sec, insert_sec = run(xml_text, settings)
+                # Include the time to drain the queue, so file I/O is not hidden
+                drain_started = time.perf_counter()
+                shutdown_logging()
+                total = parse_sec + insert_sec + (time.perf_counter() - drain_started)
+
+                baseline = baseline or total
+                size_mb = os.path.getsize(log_file) / (1024 * 1024)
+                print(
+                    f"{write_mode:>11} {mode:>10} {parse_sec:>8.2f} {insert_sec:>9.2f} "
+                    f"{total:>8.2f} {size_mb:>7.1f} {total / baseline:>6.2f}x"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark: summary mail rendering and delivery.
+
+Rendering compares the previous ``rows += ...`` table builder with
+src.report's joined table and its gzip CSV attachment. The old loop is only
+fast thanks to CPython's in-place string concatenation shortcut; run with
+``--profiled`` (cProfile enabled, as with ``--profile``) to see it turn
+quadratic. Delivery sends a series of mails to the local SMTP stub with a
+simulated per-command latency, once opening a connection per mail
+synchronously (the previous behaviour) and once through one shared,
+asynchronous Mailer, and reports how long the caller is blocked.
+
+Usage:
+    python -m benchmarks.bench_mail [--sizes 1000 10000 100000] [--mails 10] [--latency-ms 20]
+    python -m benchmarks.bench_mail --profiled --sizes 5000 10000 20000
+"""
+
+import argparse
+import cProfile
+import time
+from contextlib import nullcontext
+
+from src.mail_client import Mailer, SmtpConfig
+from src.parser import MileageBatch
+from src.report import build_summary_mail
+from .fleet import make_records
+from .smtp_stub import SmtpStub
+
+SUMMARY = {"inserted": 0, "skipped": 0, "errors": 0}
+
+
+def legacy_rows(records: MileageBatch) -> str:
+    """The table loop the daily mail used before src.report."""
+    rows = ""
+    for device_id, plate, mileage in records.rows():
+        rows += f"""
+        <tr>
+            <td>{plate}</td>
+            <td>{device_id}</td>
+            <td>{mileage}</td>
+        </tr>
+        """
+    return rows
+
+
+def bench_render(sizes: list[int], legacy_max: int, profiled: bool) -> None:
+    profile = cProfile.Profile() if profiled else nullcontext()
+    with profile:
+        _render(sizes, legacy_max)
+
+
+def _render(sizes: list[int], legacy_max: int) -> None:
+    print(f"{'rows':>8} {'legacy s':>9} {'inline s':>9} {'inline KB':>10} {'csv.gz s':>9} {'csv.gz KB':>10}")
+    for n in sizes:
+        records = MileageBatch.from_records(make_records(n))
+
+        legacy = "-"
+        if n <= legacy_max:
+            started = time.perf_counter()
+            legacy_rows(records)
+            legacy = f"{time.perf_counter() - started:.3f}"
+
+        started = time.perf_counter()
+        html, _ = build_summary_mail("2026-01-06", SUMMARY, records, max_rows=n)
+        inline_sec = time.perf_counter() - started
+
+        started = time.perf_counter()
+        _, attachments = build_summary_mail("2026-01-06", SUMMARY, records, max_rows=0)
+        csv_sec = time.perf_counter() - started
+
+        print(
+            f"{n:>8} {legacy:>9} {inline_sec:>9.3f} {len(html.encode()) / 1024:>10.0f} "
+            f"{csv_sec:>9.3f} {len(attachments[0].data) / 1024:>10.0f}"
+        )
+
+
+def bench_delivery(mails: int, latency_ms: float) -> None:
+    records = MileageBatch.from_records(make_records(2000))
+    html, attachments = build_summary_mail("2026-01-06", SUMMARY, records, max_rows=0)
+
+    print(f"\n{'delivery':<22} {'mails':>6} {'blocked s':>10} {'total s':>8} {'connections':>12}")
+    for mode in ("per-mail, sync", "shared, async"):
+        with SmtpStub(latency_ms=latency_ms) as stub:
+            config = SmtpConfig(
+                host=stub.host,
+                port=stub.port,
+                user="bench",
+                password="bench",
+                mail_from="bench@localhost",
+                mail_to=("ops@localhost",),
+                starttls=False,
+            )
+            started = time.perf_counter()
+            if mode == "per-mail, sync":
+                for idx in range(mails):
+                    mailer = Mailer(config)
+                    mailer.submit(f"bench {idx}", html, attachments=attachments)
+                    mailer.close()
+                blocked = time.perf_counter() - started
+            else:
+                mailer = Mailer(config)
+                for idx in range(mails):
+                    mailer.submit(f"bench {idx}", html, attachments=attachments)
+                blocked = time.perf_counter() - started
+                mailer.close()
+            total = time.perf_counter() - started
+            print(f"{mode:<22} {stub.messages:>6} {blocked:>10.3f} {total:>8.3f} {stub.connections:>12}")
+
+
+def main():
+    argp = argparse.ArgumentParser()
+    argp.add_argument("--sizes", type=int, nargs="+", default=[1000, 10_000, 100_000])
+    argp.add_argument("--legacy-max", type=int, default=100_000, help="Skip the quadratic builder above this size")
+    argp.add_argument("--profiled", action="store_true", help="Render with cProfile enabled")
+    argp.add_argument("--mails", type=int, default=10)
+    argp.add_argument("--latency-ms", type=float, default=20.0, help="SMTP stub delay per command")
+    args = argp.parse_args()
+
+    bench_render(args.sizes, args.legacy_max, args.profiled)
+    bench_delivery(args.mails, args.latency_ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Micro-benchmark: per-field XPath lookups vs the single-pass FieldExtractor.
+
+Parses a synthetic wsMileageReport response once and times field
+extraction over all MileageL items with:
+
+* ``legacy``  - the former _first_text helper (fresh XPath per alias)
+* ``xpath``   - FieldExtractor.extract_xpath (precompiled XPath objects)
+* ``single``  - FieldExtractor.extract (one child walk per item)
+
+plus an end-to-end parse_mileage_response run.
+
+Usage:
+    python -m benchmarks.bench_parser [--records 100000] [--repeat 3]
+"""
+
+import argparse
+import time
+
+from lxml import etree
+
+from src import parser
+from .fleet import make_soap_response
+
+
+def _legacy_first_text(parent: etree._Element, names: list[str]) -> str | None:
+    """Verbatim copy of the pre-FieldExtractor implementation."""
+    for n in names:
+        nodes = parent.xpath(f".//*[local-name()='{n}']")
+        if nodes:
+            text = nodes[0].text
+            if text and text.strip():
+                return text.strip()
+    return None
+
+
+def _legacy_extract(item: etree._Element) -> tuple[str | None, ...]:
+    return tuple(
+        _legacy_first_text(item, list(names)) for names in parser.FIELD_ALIASES.values()
+    )
+
+
+def _best_of(repeat: int, fn) -> tuple[float, object]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    argp = argparse.ArgumentParser()
+    argp.add_argument("--records", type=int, default=100_000)
+    argp.add_argument("--repeat", type=int, default=3)
+    args = argp.parse_args()
+
+    xml_text = make_soap_response(args.records)
+    items = parser._MILEAGE_ITEMS_XPATH(etree.fromstring(xml_text.encode("utf-8")))
+    extractor = parser.FieldExtractor(parser.FIELD_ALIASES)
+
+    cases = {
+        "legacy": lambda: [_legacy_extract(i) for i in items],
+        "xpath": lambda: [extractor.extract_xpath(i) for i in items],
+        "single": lambda: [extractor.extract(i) for i in items],
+    }
+
+    print(f"records={len(items)} payload={len(xml_text) / 1024 / 1024:.1f} MB")
+    baseline = expected = None
+    for name, fn in cases.items():
+        elapsed, result = _best_of(args.repeat, fn)
+        if baseline is None:
+            baseline, expected = elapsed, result
+        assert result == expected, f"{name} extraction differs from legacy"
+        print(f"{name:>8}: {elapsed:8.3f} s  ({baseline / elapsed:5.1f}x)")
+
+    elapsed, _ = _best_of(args.repeat, lambda: parser.parse_mileage_response(xml_text))
+    print(f"{'parse':>8}: {elapsed:8.3f} s  (parse_mileage_response end to end)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark: archive sinks (Parquet, gzip CSV) throughput, file size and memory.
+
+A day of ``--sizes`` rows is written through src.sinks.ArchiveSink the way
+a run feeds it, one ``--batch-size`` batch at a time, then committed. The
+report shows rows/sec, bytes on disk and the peak memory of the write:
+Python allocations (tracemalloc) and, for Parquet, the Arrow memory pool.
+Both stay flat as the day grows, since only one batch (one row group for
+Parquet) is held at a time.
+
+Usage:
+    python -m benchmarks.bench_sinks [--sizes 100000 1000000] [--batch-size 10000] [--row-group-size 100000]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from src.parser import MileageBatch
+from src.sinks import FORMATS, ArchiveSink
+from .fleet import make_records
+
+
+def _arrow_peak_mb() -> float | None:
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return None
+    return pa.default_memory_pool().max_memory() / (1024 * 1024)
+
+
+def _disk_bytes(root: str) -> int:
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(root) for f in files)
+
+
+def main():
+    argp = argparse.ArgumentParser()
+    argp.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    argp.add_argument("--formats", nargs="+", default=list(FORMATS), choices=FORMATS)
+    argp.add_argument("--batch-size", type=int, default=10_000, help="Rows per write call (PARSE_BATCH_SIZE)")
+    argp.add_argument("--row-group-size", type=int, default=100_000, help="Rows per Parquet row group")
+    args = argp.parse_args()
+
+    print(f"{'rows':>9} {'sink':>8} {'seconds':>8} {'rows/sec':>10} {'disk MB':>8} {'py MB':>7} {'arrow MB':>9}")
+    for size in args.sizes:
+        day = MileageBatch.from_records(make_records(size))
+        batches = list(day.chunks(args.batch_size))
+        for fmt in args.formats:
+            with tempfile.TemporaryDirectory(prefix="ats-archive-") as tmp:
+                sink = ArchiveSink(tmp, fmt, row_group_size=args.row_group_size)
+                tracemalloc.start()
+                started = time.perf_counter()
+                for batch in batches:
+                    sink.write(batch, "2026-01-06")
+                sink.commit()
+                elapsed = time.perf_counter() - started
+                py_peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+                tracemalloc.stop()
+                disk = _disk_bytes(tmp) / (1024 * 1024)
+
+            arrow = _arrow_peak_mb() if fmt == "parquet" else None
+            arrow_txt = f"{arrow:>9.1f}" if arrow is not None else f"{'-':>9}"
+            print(
+                f"{size:>9} {fmt:>8} {elapsed:>8.3f} {size / elapsed:>10.0f} "
+                f"{disk:>8.2f} {py_peak:>7.1f} {arrow_txt}"
+            )
+
+
+if __name__ == "__main__":
+    main()
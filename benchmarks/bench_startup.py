@@ -0,0 +1,138 @@
+"""
+Benchmark: CLI startup time and import cost.
+
+Runs the CLI in fresh interpreters for commands that should stay cheap
+(``--help`` and ``config-check``) and reports the median wall time, the
+import time the CLI adds on top of interpreter startup (from
+``python -X importtime``) and the slowest imports. Heavy drivers (pyodbc, lxml, requests) must not be
+imported by these commands; if one is, or the median exceeds ``--max-ms``,
+the benchmark exits with status 1.
+
+Usage:
+    python -m benchmarks.bench_startup [--repeat 10] [--max-ms 150]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+COMMANDS = {
+    "help": ["--help"],
+    "config-check": ["config-check"],
+}
+HEAVY_MODULES = ("pyodbc", "lxml", "requests")
+
+# config-check must succeed without touching any service
+_PLACEHOLDER_ENV = {
+    name: "bench"
+    for name in (
+        "SOAP_URL", "SOAP_ACTION", "SOAP_USERNAME", "SOAP_PASSWORD", "SOAP_COMPANY_CODE",
+        "MSSQL_DRIVER", "MSSQL_SERVER", "MSSQL_DATABASE", "MSSQL_USER", "MSSQL_PASSWORD",
+    )
+}
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int, int]]:
+    """
+    Parse ``-X importtime`` output.
+
+    Returns:
+        (module, depth, self_us, cumulative_us) per imported module, in the
+        order reported (children before their parent)
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return entries
+
+
+def cli_import_ms(entries: list[tuple[str, int, int, int]]) -> float:
+    """
+    Import time caused by the CLI itself, in milliseconds.
+
+    Everything imported after ``site`` (the interpreter's own startup) at the
+    top level is triggered by ``src.main``; nested imports are already
+    included in their parent's cumulative time.
+    """
+    names = [entry[0] for entry in entries]
+    start = names.index("site") + 1 if "site" in names else 0
+    return sum(cum for _, depth, _, cum in entries[start:] if depth == 0) / 1000
+
+
+def run_command(args: list[str], env: dict) -> tuple[float, list[tuple[str, int, int, int]]]:
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "src.main", *args],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} failed ({proc.returncode}): {proc.stderr[-500:]}")
+    return elapsed, parse_importtime(proc.stderr)
+
+
+def main():
+    argp = argparse.ArgumentParser()
+    argp.add_argument("--repeat", type=int, default=10)
+    argp.add_argument("--max-ms", type=float, default=150.0, help="Budget for the median wall time per command")
+    argp.add_argument("--top", type=int, default=8, help="Slowest imports to list per command")
+    args = argp.parse_args()
+
+    env = {**os.environ, **_PLACEHOLDER_ENV, "LOG_FILE": "", "LOG_CONSOLE": "false"}
+    # Baseline: a bare interpreter, to separate Python's own startup from ours
+    bare = statistics.median(
+        _timed([sys.executable, "-c", "pass"], env) for _ in range(args.repeat)
+    )
+    print(f"bare interpreter: {bare * 1000:.1f} ms\n")
+
+    failures = []
+    details = {}
+    print(f"{'command':<14} {'median ms':>10} {'import ms':>10} {'modules':>8}  heavy")
+    for name, cmd in COMMANDS.items():
+        walls, import_ms = [], []
+        for _ in range(args.repeat):
+            wall, imports = run_command(cmd, env)
+            walls.append(wall)
+            import_ms.append(cli_import_ms(imports))
+        median = statistics.median(walls)
+        heavy = sorted({m.split(".")[0] for m, *_ in imports} & set(HEAVY_MODULES))
+        print(
+            f"{name:<14} {median * 1000:>10.1f} {statistics.median(import_ms):>10.1f} "
+            f"{len(imports):>8}  {', '.join(heavy) or '-'}"
+        )
+        details[name] = imports
+
+        if heavy:
+            failures.append(f"{name}: imports {', '.join(heavy)}")
+        if median * 1000 > args.max_ms:
+            failures.append(f"{name}: {median * 1000:.1f} ms > budget {args.max_ms:.0f} ms")
+
+    for name, imports in details.items():
+        print(f"\nslowest imports ({name}, self time):")
+        for module, _, self_us, cum_us in sorted(imports, key=lambda e: e[2], reverse=True)[: args.top]:
+            print(f"  {module:<40} {self_us / 1000:>7.2f} ms  (cumulative {cum_us / 1000:.2f} ms)")
+
+    if failures:
+        print("\nFAILED:")
+        for line in failures:
+            print(f"  {line}")
+        sys.exit(1)
+
+
+def _timed(cmd: list[str], env: dict) -> float:
+    started = time.perf_counter()
+    subprocess.run(cmd, env=env, check=True)
+    return time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark: whole-document vs streaming SOAP response parsing.
+
+Writes synthetic wsMileageReport responses of the requested sizes to a
+temporary directory, then parses each one in a fresh subprocess so the
+reported peak RSS belongs to a single mode:
+
+* ``full``   - read the body as text and call parse_mileage_response
+               (what fetch_mileage_xml + run_for_date did before)
+* ``stream`` - feed 64 KiB chunks into iter_mileage_batches and consume
+               PARSE_BATCH_SIZE batches
+
+Usage:
+    python -m benchmarks.bench_stream_parse [--sizes-mb 10 100 1000] [--modes full stream]
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from .fleet import write_soap_response
+
+CHUNK_SIZE = 64 * 1024
+BATCH_SIZE = 5000
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _child(mode: str, path: str) -> None:
+    from src import parser
+
+    started = time.perf_counter()
+
+    if mode == "full":
+        with open(path, encoding="utf-8") as fh:
+            xml_text = fh.read()
+        count = len(parser.parse_mileage_response(xml_text))
+    else:
+        def chunks():
+            with open(path, "rb") as fh:
+                while chunk := fh.read(CHUNK_SIZE):
+                    yield chunk
+
+        # Same consumption pattern as run_for_date (fixed-size batches)
+        count = 0
+        for batch in parser.iter_mileage_batches(chunks(), BATCH_SIZE):
+            count += len(batch)
+
+    elapsed = time.perf_counter() - started
+    print(f"{count} {elapsed:.3f} {_peak_rss_mb():.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--modes", nargs="+", default=["full", "stream"], choices=["full", "stream"])
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(*args.child)
+        return
+
+    print(f"{'size_mb':>8} {'mode':>7} {'records':>9} {'seconds':>9} {'MB/s':>8} {'peak_rss_mb':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in args.sizes_mb:
+            path = os.path.join(tmp, f"response_{size_mb}mb.xml")
+            with open(path, "wb") as fh:
+                write_soap_response(fh, size_mb * 1024 * 1024)
+            actual_mb = os.path.getsize(path) / (1024 * 1024)
+
+            for mode in args.modes:
+                out = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_stream_parse", "--child", mode, path],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                ).stdout.split()
+                count, elapsed, peak = int(out[-3]), float(out[-2]), float(out[-1])
+                print(
+                    f"{size_mb:>8} {mode:>7} {count:>9} {elapsed:>9.2f} "
+                    f"{actual_mb / elapsed:>8.1f} {peak:>12.1f}"
+                )
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
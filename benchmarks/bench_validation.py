@@ -0,0 +1,81 @@
+"""
+Benchmark: validation stage over a whole day's batch.
+
+The SQLite stand-in is seeded with the previous day's readings of the
+fleet; the day's batch then contains a mix of normal readings, rollbacks,
+outliers, zeroes, missing values and repeated devices (``--anomalies``
+share). Reported per size: loading the previous readings (one query), the
+vectorized check and the split into passing and flagged rows.
+
+Usage:
+    python -m benchmarks.bench_validation [--sizes 10000 100000] [--anomalies 0.02]
+"""
+
+import argparse
+import random
+import time
+from collections import Counter
+
+from src.parser import MileageBatch
+from src.sqlite_db import SqliteKmLog
+from src.validation import REASONS, BatchValidator, PreviousMileage
+
+PREVIOUS_DAY = "2026-01-05"
+DAY = "2026-01-06"
+
+
+def make_day(n: int, anomalies: float, seed: int = 42) -> tuple[MileageBatch, MileageBatch]:
+    """Build the previous day's and the current day's readings of ``n`` devices."""
+    rnd = random.Random(seed)
+    previous, current = MileageBatch(), MileageBatch()
+    for idx in range(n):
+        device_id = f"DEV{idx:07d}"
+        plate = f"{idx % 81 + 1:02d} ABC {idx % 10000:04d}"
+        km = rnd.randint(10_000, 900_000)
+        previous.append(device_id, plate, km)
+
+        reading = km + rnd.choice((0, 0, rnd.randint(1, 600)))
+        if rnd.random() < anomalies:
+            reading = rnd.choice((km - 500, km + 50_000, 0, None, -1))
+        current.append(device_id, plate, reading)
+        if rnd.random() < anomalies / 5:
+            current.append(device_id, plate, reading)
+    return previous, current
+
+
+def main():
+    argp = argparse.ArgumentParser()
+    argp.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    argp.add_argument("--anomalies", type=float, default=0.02, help="Share of anomalous readings")
+    argp.add_argument("--max-daily-km", type=int, default=2000)
+    args = argp.parse_args()
+
+    print(f"{'devices':>8} {'load s':>7} {'check s':>8} {'split s':>8} {'flagged':>8}  reasons")
+    for size in args.sizes:
+        previous, current = make_day(size, args.anomalies)
+        db = SqliteKmLog()
+        db.bulk_insert_km_logs(previous, PREVIOUS_DAY, deduplicate=False)
+        db.commit()
+
+        started = time.perf_counter()
+        history = PreviousMileage.load(db, DAY, 30)
+        load_sec = time.perf_counter() - started
+
+        started = time.perf_counter()
+        codes = BatchValidator(history, max_daily_km=args.max_daily_km).check(current)
+        check_sec = time.perf_counter() - started
+
+        started = time.perf_counter()
+        _, flagged = BatchValidator(history, max_daily_km=args.max_daily_km).split(current)
+        split_sec = time.perf_counter() - started
+        db.close()
+
+        reasons = Counter(REASONS[code] for code in codes.tolist() if code)
+        print(
+            f"{len(current):>8} {load_sec:>7.3f} {check_sec:>8.3f} {split_sec:>8.3f} {len(flagged):>8}  "
+            + ", ".join(f"{reason}={count}" for reason, count in sorted(reasons.items()))
+        )
+
+
+if __name__ == "__main__":
+    main()
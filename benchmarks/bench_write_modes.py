@@ -0,0 +1,73 @@
+"""
+Benchmark: rows/sec of the DB_WRITE_MODE strategies (row, executemany, bulk).
+
+Each mode writes the same batch through the job's write path
+(src.job._insert_rows) with the DB dedup check on. By default the target
+is the SQLite stand-in, with ``--rtt-ms`` latency per round trip and
+``--bcp-startup-ms`` per bcp invocation; the bulk mode writes and reads the
+real bcp data file, so its client-side cost is measured, not the server's
+bulk-load path.
+
+With ``--mssql`` the modes run against the SQL Server from the MSSQL_*
+environment (bulk mode needs bcp on PATH or BCP_PATH). Rows are written
+under ``--date`` and every mode is rolled back, so dbo.arac_km_log is left
+unchanged; rows bcp staged are purged from the staging table after a day.
+
+Usage:
+    python -m benchmarks.bench_write_modes [--sizes 10000 100000] [--rtt-ms 0.5] [--bcp-startup-ms 150]
+    python -m benchmarks.bench_write_modes --mssql --sizes 100000 1000000 --modes executemany bulk
+"""
+
+import argparse
+import time
+from dataclasses import replace
+
+from src.config import get_settings
+from src.db import MsSql
+from src.job import _insert_rows
+from src.parser import MileageBatch
+from src.sqlite_db import SqliteKmLog
+from . import bench_settings
+from .fleet import make_records
+
+MODES = ("row", "executemany", "bulk")
+
+
+def main():
+    argp = argparse.ArgumentParser()
+    argp.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    argp.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    argp.add_argument("--row-max", type=int, default=20_000, help="Skip the row mode above this size")
+    argp.add_argument("--rtt-ms", type=float, default=0.5, help="SQLite: simulated round trip per statement")
+    argp.add_argument("--bcp-startup-ms", type=float, default=150.0, help="SQLite: simulated bcp start and login")
+    argp.add_argument("--mssql", action="store_true", help="Write to the SQL Server from MSSQL_* (rolled back)")
+    argp.add_argument("--date", default="2099-01-01", help="Date the rows are written under")
+    args = argp.parse_args()
+
+    base = get_settings() if args.mssql else bench_settings()
+
+    def connect():
+        if args.mssql:
+            return MsSql.from_settings(base)
+        return SqliteKmLog(rtt_ms=args.rtt_ms, bcp_startup_ms=args.bcp_startup_ms)
+
+    print(f"{'rows':>9} {'mode':>12} {'inserted':>9} {'seconds':>9} {'rows/sec':>10}")
+    for size in args.sizes:
+        batch = MileageBatch.from_records(make_records(size, duplicate_ratio=0.01))
+        for mode in args.modes:
+            if mode == "row" and size > args.row_max:
+                continue
+            settings = replace(base, db_write_mode=mode)
+            db = connect()
+            try:
+                started = time.perf_counter()
+                inserted = sum(_insert_rows(db, batch, args.date, settings, True))
+                elapsed = time.perf_counter() - started
+            finally:
+                db.rollback()
+                db.close()
+            print(f"{size:>9} {mode:>12} {inserted:>9} {elapsed:>9.3f} {size / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Synthetic fleet data for benchmarks.
+
+Generates deterministic mileage records that look like what the TNB Mobil
+``wsMileageReport`` service returns for a fleet of the requested size.
+Responses can use different namespace layouts, alternative field tags
+(see parser.FIELD_ALIASES) and a share of malformed mileage values, so the
+parser is measured on the input variations it has to handle in production.
+"""
+
+import random
+from typing import IO
+
+from src.parser import FIELD_ALIASES, MileageRecord
+
+_SOAP11 = (
+    '<?xml version="1.0" encoding="utf-8"?>\n'
+    '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/" '
+    'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+    'xmlns:xsd="http://www.w3.org/2001/XMLSchema">'
+    "<soap:Body>"
+)
+_SOAP12 = (
+    '<?xml version="1.0" encoding="utf-8"?>\n'
+    '<soap12:Envelope xmlns:soap12="http://www.w3.org/2003/05/soap-envelope" '
+    'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+    "<soap12:Body>"
+)
+
+# variant -> (head, tail, item tag prefix)
+VARIANTS: dict[str, tuple[str, str, str]] = {
+    # Default namespace on the response element, inherited by the items
+    "default": (
+        _SOAP11 + '<wsMileageReportResponse xmlns="http://tempuri.org/"><wsMileageReportResult>',
+        "</wsMileageReportResult></wsMileageReportResponse></soap:Body></soap:Envelope>",
+        "",
+    ),
+    # Explicit namespace prefix on every element
+    "prefixed": (
+        _SOAP11 + '<m:wsMileageReportResponse xmlns:m="http://tempuri.org/"><m:wsMileageReportResult>',
+        "</m:wsMileageReportResult></m:wsMileageReportResponse></soap:Body></soap:Envelope>",
+        "m:",
+    ),
+    # SOAP 1.2 envelope
+    "soap12": (
+        _SOAP12 + '<wsMileageReportResponse xmlns="http://tempuri.org/"><wsMileageReportResult>',
+        "</wsMileageReportResult></wsMileageReportResponse></soap12:Body></soap12:Envelope>",
+        "",
+    ),
+    # No namespace on the payload at all
+    "plain": (
+        _SOAP11 + "<wsMileageReportResponse><wsMileageReportResult>",
+        "</wsMileageReportResult></wsMileageReportResponse></soap:Body></soap:Envelope>",
+        "",
+    ),
+}
+
+RESPONSE_HEAD, RESPONSE_TAIL, _ = VARIANTS["default"]
+
+PRIMARY_TAGS = tuple(aliases[0] for aliases in FIELD_ALIASES.values())
+# Mileage texts the parser must turn into NULL (the last one overflows BIGINT)
+BAD_MILEAGE_VALUES = ("", "abc", "12.5", "-", "1e5", "N/A", "99999999999999999999")
+
+
+def make_records(n: int, *, seed: int = 42, duplicate_ratio: float = 0.0) -> list[MileageRecord]:
+    """
+    Build ``n`` synthetic mileage records.
+
+    Args:
+        n: Number of records
+        seed: Random seed so runs are comparable
+        duplicate_ratio: Share of records that repeat an earlier DeviceId
+
+    Returns:
+        List of MileageRecord objects
+    """
+    rnd = random.Random(seed)
+    records: list[MileageRecord] = []
+    for idx in range(n):
+        if records and rnd.random() < duplicate_ratio:
+            device_no = rnd.randrange(len(records))
+        else:
+            device_no = idx
+        records.append(
+            MileageRecord(
+                device_id=f"DEV{device_no:07d}",
+                license_plate=f"{device_no % 81 + 1:02d} ABC {device_no % 10000:04d}",
+                mileage=rnd.randint(0, 900_000),
+            )
+        )
+    return records
+
+
+def make_odometer_records(n: int, day: int, *, moving_ratio: float = 1.0, seed: int = 42) -> list[MileageRecord]:
+    """
+    Build the odometer readings of a fleet on a given day.
+
+    Every device has a fixed starting reading and daily distance. Devices
+    drive every day with probability ``moving_ratio`` (fixed per device by
+    the seed); the others report the same reading day after day, like the
+    parked vehicles of a stable fleet.
+
+    Args:
+        n: Number of devices
+        day: Day number, e.g. ``date.toordinal()``; readings grow with it
+        moving_ratio: Share of devices that drive
+        seed: Random seed so runs are comparable
+
+    Returns:
+        List of MileageRecord objects
+    """
+    rnd = random.Random(seed)
+    records: list[MileageRecord] = []
+    for device_no in range(n):
+        start = rnd.randint(0, 500_000)
+        daily = rnd.randint(20, 400)
+        moving = rnd.random() < moving_ratio
+        records.append(
+            MileageRecord(
+                device_id=f"DEV{device_no:07d}",
+                license_plate=f"{device_no % 81 + 1:02d} ABC {device_no % 10000:04d}",
+                mileage=start + daily * day if moving else start,
+            )
+        )
+    return records
+
+
+def render_item(
+    record: MileageRecord,
+    *,
+    prefix: str = "",
+    tags: tuple[str, str, str] = PRIMARY_TAGS,
+    mileage_text: str | None = None,
+) -> str:
+    """
+    Render a record as a MileageL element.
+
+    Args:
+        record: Record to render
+        prefix: Namespace prefix of the elements (e.g. ``"m:"``)
+        tags: DeviceId, plate and mileage element names
+        mileage_text: Raw mileage text to emit instead of record.mileage
+    """
+    device_tag, plate_tag, mileage_tag = (prefix + tag for tag in tags)
+    mileage = record.mileage if mileage_text is None else mileage_text
+    return (
+        f"<{prefix}MileageL>"
+        f"<{device_tag}>{record.device_id}</{device_tag}>"
+        f"<{plate_tag}>{record.license_plate}</{plate_tag}>"
+        f"<{mileage_tag}>{mileage}</{mileage_tag}>"
+        f"</{prefix}MileageL>"
+    )
+
+
+def _render_items(
+    records: list[MileageRecord],
+    *,
+    seed: int,
+    prefix: str,
+    alias_ratio: float,
+    bad_ratio: float,
+) -> str:
+    if not alias_ratio and not bad_ratio:
+        return "".join(render_item(r, prefix=prefix) for r in records)
+
+    rnd = random.Random(seed ^ 0x5EED)
+    alias_choices = [aliases[1:] or aliases for aliases in FIELD_ALIASES.values()]
+    parts = []
+    for record in records:
+        tags = PRIMARY_TAGS
+        if rnd.random() < alias_ratio:
+            tags = tuple(rnd.choice(choices) for choices in alias_choices)
+        mileage_text = rnd.choice(BAD_MILEAGE_VALUES) if rnd.random() < bad_ratio else None
+        parts.append(render_item(record, prefix=prefix, tags=tags, mileage_text=mileage_text))
+    return "".join(parts)
+
+
+def make_soap_response(
+    n: int,
+    *,
+    seed: int = 42,
+    variant: str = "default",
+    alias_ratio: float = 0.0,
+    bad_ratio: float = 0.0,
+    records: list[MileageRecord] | None = None,
+) -> str:
+    """
+    Build a complete wsMileageReport SOAP response with ``n`` items.
+
+    Args:
+        n: Number of MileageL items
+        seed: Random seed
+        variant: Namespace layout, one of VARIANTS
+        alias_ratio: Share of items using alternative field tags
+        bad_ratio: Share of items with a malformed mileage value
+        records: Records to render instead of ``make_records(n, seed=seed)``
+
+    Returns:
+        SOAP response XML as a string
+
+    Raises:
+        KeyError: If variant is unknown
+    """
+    head, tail, prefix = VARIANTS[variant]
+    if records is None:
+        records = make_records(n, seed=seed)
+    items = _render_items(records, seed=seed, prefix=prefix, alias_ratio=alias_ratio, bad_ratio=bad_ratio)
+    return head + items + tail
+
+
+def write_soap_response(
+    fh: IO[bytes],
+    target_bytes: int,
+    *,
+    seed: int = 42,
+    variant: str = "default",
+    alias_ratio: float = 0.0,
+    bad_ratio: float = 0.0,
+) -> int:
+    """
+    Stream a SOAP response of roughly ``target_bytes`` into a binary file.
+
+    Items are generated in blocks so arbitrarily large payloads (1 GB and
+    more) can be produced without holding them in memory.
+
+    Args:
+        fh: Binary file object to write to
+        target_bytes: Approximate payload size in bytes
+        seed: Random seed
+        variant: Namespace layout, one of VARIANTS
+        alias_ratio: Share of items using alternative field tags
+        bad_ratio: Share of items with a malformed mileage value
+
+    Returns:
+        Number of MileageL items written
+    """
+    head, tail, prefix = VARIANTS[variant]
+    fh.write(head.encode("utf-8"))
+    written = len(head)
+    count = 0
+    block = 10_000
+    while written < target_bytes:
+        chunk = _render_items(
+            make_records(block, seed=seed + count),
+            seed=seed + count,
+            prefix=prefix,
+            alias_ratio=alias_ratio,
+            bad_ratio=bad_ratio,
+        ).encode("utf-8")
+        fh.write(chunk)
+        written += len(chunk)
+        count += block
+    fh.write(tail.encode("utf-8"))
+    return count
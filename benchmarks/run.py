@@ -0,0 +1,297 @@
+"""
+Benchmark runner: end-to-end scenarios with a baseline comparison.
+
+Every scenario runs the real job (src.job.run_for_date / run_for_range)
+against the local SOAP stub and the SQLite stand-in database, each repeat
+in a fresh child process so the peak RSS belongs to that run alone. The
+report shows records/sec, peak RSS and p50/p95 per stage (taken from the
+job's own ``*_seconds`` metrics histograms, merged over all repeats).
+
+Results can be stored as a baseline JSON and later runs compared against
+it; a throughput drop, RSS growth or stage p95 growth beyond the threshold
+is reported as a regression and the runner exits with status 1, so it can
+gate a CI job.
+
+Usage:
+    python -m benchmarks.run [--fleet 5000] [--repeat 3] [--scenario full stream ...]
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json [--threshold 0.15]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from multiprocessing import get_context
+
+from src.metrics import Histogram
+from . import bench_settings
+from .soap_stub import SoapStub
+
+# name -> settings overrides, SoapStub options, SqliteKmLog options, days
+SCENARIOS: dict[str, dict] = {
+    "full": {
+        "settings": {},
+        "stub": {},
+        "db": {},
+        "days": 1,
+    },
+    "stream": {
+        "settings": {"soap_streaming": True},
+        "stub": {"bandwidth_mbps": 200},
+        "db": {},
+        "days": 1,
+    },
+    "row": {
+        "settings": {"db_write_mode": "row"},
+        "stub": {},
+        "db": {"rtt_ms": 0.05},
+        "days": 1,
+    },
+    "bloom-range": {
+        "settings": {"dedup_cache": "bloom", "fetch_concurrency": 4},
+        "stub": {"latency_ms": 50},
+        "db": {},
+        "days": 5,
+    },
+    "flaky": {
+        "settings": {"soap_retries": 5, "soap_backoff_factor": 0.05},
+        "stub": {
+            "latency_ms": 20,
+            "failure_rate": 0.3,
+            "fail_first": 2,
+            "variant": "prefixed",
+            "alias_ratio": 0.2,
+            "bad_ratio": 0.05,
+        },
+        "db": {},
+        "days": 3,
+    },
+}
+
+START_DATE = datetime(2026, 1, 1)
+
+
+def _peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_once(name: str, url: str, days: int) -> dict:
+    """Child process: run one repeat of a scenario and return its measurements."""
+    from src.job import run_for_date, run_for_range
+    from src.logger import setup_logging
+    from src.metrics import metrics
+    from src.sqlite_db import SqliteKmLog
+
+    setup_logging("WARNING", log_file="", console=False)
+    scenario = SCENARIOS[name]
+    settings = bench_settings(
+        soap_url=url,
+        soap_cache_mode="off",
+        commit_batch_size=0,
+        metrics_enabled=True,
+        metrics_file="",
+        **scenario["settings"],
+    )
+    db = SqliteKmLog(**scenario["db"])
+
+    started = time.perf_counter()
+    if days == 1:
+        summary = run_for_date(START_DATE, settings, db=db)
+    else:
+        summary = run_for_range(START_DATE, START_DATE + timedelta(days=days - 1), settings, db=db)
+    elapsed = time.perf_counter() - started
+    db.close()
+
+    return {
+        "seconds": elapsed,
+        "records": metrics.counters.get("records_parsed_total", 0),
+        "inserted": summary["inserted"],
+        "errors": summary["errors"],
+        "peak_rss_mb": _peak_rss_mb(),
+        "histograms": {
+            hist_name: {"buckets": hist.buckets, "count": hist.count, "sum": hist.sum, "min": hist.min, "max": hist.max}
+            for hist_name, hist in metrics.histograms.items()
+            if hist_name.endswith("_seconds")
+        },
+    }
+
+
+def _merge(histograms: list[dict]) -> Histogram:
+    merged = Histogram()
+    for data in histograms:
+        merged.buckets = [a + b for a, b in zip(merged.buckets, data["buckets"])]
+        merged.count += data["count"]
+        merged.sum += data["sum"]
+        merged.min = min(merged.min, data["min"])
+        merged.max = max(merged.max, data["max"])
+    return merged
+
+
+def run_scenario(name: str, *, fleet: int, repeat: int, warmup: int) -> dict:
+    """
+    Run one scenario ``warmup + repeat`` times and aggregate the measured repeats.
+
+    Returns:
+        Dictionary with records_per_sec (median), peak_rss_mb (max), errors
+        and a "stages" map of stage name -> {count, p50, p95, total}
+    """
+    scenario = SCENARIOS[name]
+    runs = []
+    ctx = get_context("spawn")
+    with SoapStub(fleet_size=fleet, **scenario["stub"]) as stub:
+        for idx in range(warmup + repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                result = pool.submit(_run_once, name, stub.url, scenario["days"]).result()
+            if idx >= warmup:
+                runs.append(result)
+        soap_failures = stub.failures
+
+    stages = {}
+    for hist_name in sorted({h for run in runs for h in run["histograms"]}):
+        hist = _merge([run["histograms"][hist_name] for run in runs if hist_name in run["histograms"]])
+        stages[hist_name.removesuffix("_seconds")] = {
+            "count": hist.count,
+            "p50": round(hist.quantile(0.5), 6),
+            "p95": round(hist.quantile(0.95), 6),
+            "total": round(hist.sum / len(runs), 6),
+        }
+
+    rss = [run["peak_rss_mb"] for run in runs if run["peak_rss_mb"] is not None]
+    return {
+        "records": runs[0]["records"],
+        "records_per_sec": round(statistics.median(run["records"] / run["seconds"] for run in runs), 1),
+        "seconds": round(statistics.median(run["seconds"] for run in runs), 3),
+        "peak_rss_mb": round(max(rss), 1) if rss else None,
+        "errors": sum(run["errors"] for run in runs),
+        "soap_failures": soap_failures,
+        "stages": stages,
+    }
+
+
+def compare(results: dict, baseline: dict, *, threshold: float, min_stage_sec: float) -> list[str]:
+    """
+    Compare results against a stored baseline.
+
+    Args:
+        results: Scenario name -> run_scenario result
+        baseline: Previously saved results (same format)
+        threshold: Allowed relative change, e.g. 0.15 for 15%
+        min_stage_sec: Ignore stages whose baseline p95 is below this (too noisy)
+
+    Returns:
+        Human-readable regression messages (empty when nothing regressed)
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result["records_per_sec"] < base["records_per_sec"] * (1 - threshold):
+            regressions.append(
+                f"{name}: records/sec {result['records_per_sec']:.0f} < baseline {base['records_per_sec']:.0f}"
+            )
+        if result["peak_rss_mb"] and base.get("peak_rss_mb") and (
+            result["peak_rss_mb"] > base["peak_rss_mb"] * (1 + threshold)
+        ):
+            regressions.append(
+                f"{name}: peak RSS {result['peak_rss_mb']:.1f} MB > baseline {base['peak_rss_mb']:.1f} MB"
+            )
+        for stage, stats in result["stages"].items():
+            base_stats = base.get("stages", {}).get(stage)
+            if base_stats is None or base_stats["p95"] < min_stage_sec:
+                continue
+            if stats["p95"] > base_stats["p95"] * (1 + threshold):
+                regressions.append(
+                    f"{name}: {stage} p95 {stats['p95'] * 1000:.1f} ms > baseline {base_stats['p95'] * 1000:.1f} ms"
+                )
+    return regressions
+
+
+def print_report(results: dict) -> None:
+    print(f"{'scenario':<12} {'records':>8} {'seconds':>8} {'rec/s':>10} {'peak MB':>8} {'errors':>6} {'503s':>5}")
+    for name, r in results.items():
+        rss = f"{r['peak_rss_mb']:.1f}" if r["peak_rss_mb"] is not None else "-"
+        print(
+            f"{name:<12} {r['records']:>8} {r['seconds']:>8.3f} "
+            f"{r['records_per_sec']:>10.0f} {rss:>8} {r['errors']:>6} {r['soap_failures']:>5}"
+        )
+
+    print(f"\n{'scenario':<12} {'stage':<16} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'total ms':>9}")
+    for name, r in results.items():
+        for stage, s in r["stages"].items():
+            print(
+                f"{name:<12} {stage:<16} {s['count']:>6} {s['p50'] * 1000:>9.2f} "
+                f"{s['p95'] * 1000:>9.2f} {s['total'] * 1000:>9.1f}"
+            )
+
+
+def main():
+    argp = argparse.ArgumentParser()
+    argp.add_argument("--scenario", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    argp.add_argument("--fleet", type=int, default=5000)
+    argp.add_argument("--repeat", type=int, default=3)
+    argp.add_argument("--warmup", type=int, default=1)
+    argp.add_argument("--baseline", help="Compare against this baseline JSON")
+    argp.add_argument("--save-baseline", help="Write the results as a baseline JSON")
+    argp.add_argument("--threshold", type=float, default=0.15)
+    argp.add_argument("--min-stage-ms", type=float, default=10.0)
+    args = argp.parse_args()
+
+    # The job would try to send its summary mail
+    for name in ("SMTP_USER", "SMTP_PASSWORD", "MAIL_FROM", "MAIL_TO"):
+        os.environ.pop(name, None)
+
+    results = {}
+    for name in args.scenario:
+        print(f"running {name} ...", file=sys.stderr)
+        results[name] = run_scenario(name, fleet=args.fleet, repeat=args.repeat, warmup=args.warmup)
+    print_report(results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as fh:
+            json.dump(
+                {
+                    "created": datetime.now().isoformat(timespec="seconds"),
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "fleet": args.fleet,
+                    "scenarios": results,
+                },
+                fh,
+                indent=2,
+            )
+        print(f"\nBaseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        if baseline.get("fleet") != args.fleet:
+            print(f"\nWarning: baseline was recorded with --fleet {baseline.get('fleet')}", file=sys.stderr)
+        regressions = compare(
+            results,
+            baseline["scenarios"],
+            threshold=args.threshold,
+            min_stage_sec=args.min_stage_ms / 1000,
+        )
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) vs {args.baseline}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions vs {args.baseline} (threshold {args.threshold:.0%})")
+
+
+if __name__ == "__main__":
+    main()
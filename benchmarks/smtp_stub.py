@@ -0,0 +1,98 @@
+"""
+Minimal local SMTP server for mail benchmarks.
+
+Accepts EHLO/AUTH/MAIL/RCPT/DATA/NOOP/RSET/QUIT without TLS (use with
+``SMTP_STARTTLS=false``), counts connections and messages, and can add a
+per-command delay to model a remote server and drop connections to
+exercise retry and reconnect.
+
+Usage from a benchmark::
+
+    with SmtpStub(latency_ms=20) as stub:
+        config = SmtpConfig(host=stub.host, port=stub.port, ..., starttls=False)
+"""
+
+import random
+import socketserver
+import threading
+import time
+
+
+class SmtpStub:
+    """Threaded SMTP sink."""
+
+    def __init__(self, *, latency_ms: float = 0.0, drop_rate: float = 0.0, seed: int = 0, host: str = "127.0.0.1"):
+        """
+        Args:
+            latency_ms: Delay before every reply
+            drop_rate: Share of DATA commands answered by closing the connection
+            seed: Seed of the drop injection
+            host: Bind address
+        """
+        self.latency_ms = latency_ms
+        self.drop_rate = drop_rate
+        self.connections = 0
+        self.messages = 0
+        self.drops = 0
+        self.bytes = 0
+
+        stub = self
+        rnd = random.Random(seed)
+        lock = threading.Lock()
+
+        class _Handler(socketserver.StreamRequestHandler):
+            def reply(self, line: str) -> None:
+                if stub.latency_ms:
+                    time.sleep(stub.latency_ms / 1000)
+                self.wfile.write(line.encode("ascii") + b"\r\n")
+
+            def handle(self):
+                with lock:
+                    stub.connections += 1
+                self.reply("220 localhost ESMTP bench")
+                while line := self.rfile.readline():
+                    verb = line[:4].upper()
+                    if verb in (b"EHLO", b"HELO"):
+                        self.reply("250-localhost\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME")
+                    elif verb == b"AUTH":
+                        self.reply("235 2.7.0 Authentication successful")
+                    elif verb == b"DATA":
+                        with lock:
+                            drop = rnd.random() < stub.drop_rate
+                        if drop:
+                            with lock:
+                                stub.drops += 1
+                            return
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        size = 0
+                        while (chunk := self.rfile.readline()) not in (b".\r\n", b""):
+                            size += len(chunk)
+                        with lock:
+                            stub.messages += 1
+                            stub.bytes += size
+                        self.reply("250 2.0.0 Ok: queued")
+                    elif verb == b"QUIT":
+                        self.reply("221 2.0.0 Bye")
+                        return
+                    else:  # MAIL, RCPT, NOOP, RSET
+                        self.reply("250 2.0.0 Ok")
+
+        self._server = socketserver.ThreadingTCPServer((host, 0), _Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def host(self) -> str:
+        return self._server.server_address[0]
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def __enter__(self) -> "SmtpStub":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,175 @@
+"""
+Local stand-in for the TNB Mobil wsMileageReport SOAP endpoint.
+
+Serves synthetic responses from benchmarks.fleet on a background thread.
+The response for a given Startdate is deterministic, so repeated fetches
+of the same day return the same fleet. With ``moving_ratio`` the stub
+serves odometer readings instead, where only part of the fleet drives from
+one day to the next. Latency, bandwidth and failures
+(HTTP 503s, stalled responses) can be injected to exercise the client's
+retry, timeout and streaming paths.
+
+Usage from a benchmark::
+
+    with SoapStub(fleet_size=5000, latency_ms=200, failure_rate=0.1) as stub:
+        settings = replace(settings, soap_url=stub.url)
+"""
+
+import gzip
+import random
+import re
+import threading
+import time
+import zlib
+from datetime import date
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .fleet import make_odometer_records, make_soap_response
+
+_START_RE = re.compile(rb"<Startdate>([^<]*)</Startdate>")
+_WRITE_CHUNK = 64 * 1024
+
+
+class SoapStub:
+    """Threaded HTTP server answering every POST with a mileage report."""
+
+    def __init__(
+        self,
+        *,
+        fleet_size: int = 1000,
+        latency_ms: float = 0.0,
+        bandwidth_mbps: float = 0.0,
+        failure_rate: float = 0.0,
+        fail_first: int = 0,
+        stall_rate: float = 0.0,
+        stall_sec: float = 5.0,
+        variant: str = "default",
+        alias_ratio: float = 0.0,
+        bad_ratio: float = 0.0,
+        gzip_responses: bool = True,
+        moving_ratio: float | None = None,
+        seed: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        """
+        Args:
+            fleet_size: MileageL items per response
+            latency_ms: Delay before the response headers are sent
+            bandwidth_mbps: Throttle the body to this many megabits/s (0 = unlimited)
+            failure_rate: Share of requests answered with HTTP 503
+            fail_first: Answer the first N requests with HTTP 503
+            stall_rate: Share of requests that stall for ``stall_sec`` before answering
+            stall_sec: Stall duration (set above the client timeout to force timeouts)
+            variant: Namespace layout of the responses (see fleet.VARIANTS)
+            alias_ratio: Share of items using alternative field tags
+            bad_ratio: Share of items with a malformed mileage value
+            gzip_responses: Honour ``Accept-Encoding: gzip``
+            moving_ratio: Serve odometer readings of a fleet in which this share
+                of devices drives each day (None = random mileages per request)
+            seed: Seed of the failure injection
+            host: Bind address
+            port: Bind port (0 = any free port)
+        """
+        self.fleet_size = fleet_size
+        self.latency_ms = latency_ms
+        self.bandwidth_mbps = bandwidth_mbps
+        self.failure_rate = failure_rate
+        self.fail_first = fail_first
+        self.stall_rate = stall_rate
+        self.stall_sec = stall_sec
+        self.gzip_responses = gzip_responses
+        self.requests = 0
+        self.failures = 0
+        self.stalls = 0
+
+        stub = self
+        rnd = random.Random(seed)
+        lock = threading.Lock()
+
+        @lru_cache(maxsize=64)
+        def _payload(start_date: bytes, compressed: bool) -> bytes:
+            records = None
+            if moving_ratio is not None:
+                day = date.fromisoformat(start_date[:10].decode()).toordinal()
+                records = make_odometer_records(stub.fleet_size, day, moving_ratio=moving_ratio)
+            body = make_soap_response(
+                stub.fleet_size,
+                seed=zlib.crc32(start_date),
+                variant=variant,
+                alias_ratio=alias_ratio,
+                bad_ratio=bad_ratio,
+                records=records,
+            ).encode("utf-8")
+            return gzip.compress(body, compresslevel=5) if compressed else body
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with lock:
+                    stub.requests += 1
+                    fail = stub.requests <= stub.fail_first or rnd.random() < stub.failure_rate
+                    stall = not fail and rnd.random() < stub.stall_rate
+
+                if stub.latency_ms:
+                    time.sleep(stub.latency_ms / 1000)
+
+                if fail:
+                    with lock:
+                        stub.failures += 1
+                    self.send_response(503)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                if stall:
+                    with lock:
+                        stub.stalls += 1
+                    time.sleep(stub.stall_sec)
+
+                compressed = stub.gzip_responses and "gzip" in self.headers.get("Accept-Encoding", "")
+                match = _START_RE.search(body)
+                payload = _payload(match.group(1) if match else b"", compressed)
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/xml; charset=utf-8")
+                if compressed:
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self._write_throttled(payload)
+
+            def _write_throttled(self, payload: bytes) -> None:
+                if not stub.bandwidth_mbps:
+                    self.wfile.write(payload)
+                    return
+                bytes_per_sec = stub.bandwidth_mbps * 1_000_000 / 8
+                started = time.perf_counter()
+                for offset in range(0, len(payload), _WRITE_CHUNK):
+                    self.wfile.write(payload[offset:offset + _WRITE_CHUNK])
+                    ahead = (offset + _WRITE_CHUNK) / bytes_per_sec - (time.perf_counter() - started)
+                    if ahead > 0:
+                        time.sleep(ahead)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/Service.asmx"
+
+    def __enter__(self) -> "SoapStub":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,253 @@
+"""
+On-disk SOAP response cache for ATS Mileage Sync.
+
+Stores raw wsMileageReport XML bodies compressed on disk, addressed by a
+hash of (company code, window start, window end, device id), so a rerun
+after a DB or mail failure, a replay or a backfill of an already-fetched
+day does not hit TNB Mobil again. Entries expire after a TTL and the
+least recently used ones are evicted when the cache grows past its size
+limit. The directory is scanned once, on the first write; after that its
+size is tracked as entries are written, and eviction only scans again
+when the limit is exceeded. Entries are written and read as streams, so
+they can be fed straight into the incremental parser.
+"""
+
+import gzip
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from typing import BinaryIO
+
+from .logger import get_logger
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+CODECS = ("gzip", "zstd")
+
+# Eviction trims the cache to this share of max_bytes, so a full cache is
+# not rescanned on every following write
+_EVICT_TARGET = 0.9
+
+log = get_logger("cache")
+
+
+class ResponseCache:
+    """
+    Content-addressed, compressed cache of SOAP response bodies.
+
+    Entry mtime is the write time (used for TTL); atime is bumped on every
+    hit and used for LRU eviction.
+    """
+
+    def __init__(self, directory: str, *, ttl_sec: int = 72 * 3600, max_bytes: int = 2 * 1024 ** 3, codec: str = "gzip"):
+        """
+        Args:
+            directory: Cache root directory (created if missing)
+            ttl_sec: Entry lifetime in seconds (0 = never expires)
+            max_bytes: Total size limit on disk (0 = unlimited)
+            codec: "gzip" or "zstd" (zstd needs the zstandard package and
+                falls back to gzip when it is not installed)
+
+        Raises:
+            ValueError: If codec is unknown
+        """
+        if codec not in CODECS:
+            raise ValueError(f"Unsupported cache codec: {codec}")
+        if codec == "zstd" and zstandard is None:
+            log.warning("zstandard not installed, falling back to gzip")
+            codec = "gzip"
+
+        self.directory = directory
+        self.ttl_sec = ttl_sec
+        self.max_bytes = max_bytes
+        self.codec = codec
+        self._suffix = ".xml.zst" if codec == "zstd" else ".xml.gz"
+        # Bytes on disk; None until the first write scans the directory
+        self._size: int | None = None
+        self._size_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(company_code: str, start_date: str, end_date: str, device_id: str = "") -> str:
+        """Build the cache key for a request."""
+        raw = "\x1f".join((company_code, start_date, end_date, device_id))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str, suffix: str | None = None) -> str:
+        return os.path.join(self.directory, key[:2], key + (suffix or self._suffix))
+
+    def _existing_path(self, key: str) -> str | None:
+        for suffix in (".xml.gz", ".xml.zst"):
+            path = self._path(key, suffix)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def open(self, key: str) -> BinaryIO | None:
+        """
+        Open a cached entry for streaming reads.
+
+        Args:
+            key: Cache key from ResponseCache.key
+
+        Returns:
+            Binary file object yielding the decompressed XML, or None on a
+            miss or an expired entry (which is removed)
+        """
+        path = self._existing_path(key)
+        if path is None:
+            return None
+
+        stat = os.stat(path)
+        now = time.time()
+        if self.ttl_sec and now - stat.st_mtime > self.ttl_sec:
+            self._remove(path)
+            self._track(-stat.st_size)
+            return None
+
+        # Bump atime for LRU, keep mtime as the write time for TTL
+        os.utime(path, (now, stat.st_mtime))
+
+        if path.endswith(".zst"):
+            if zstandard is None:
+                return None
+            return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        return gzip.open(path, "rb")
+
+    def read_chunks(self, key: str, chunk_size: int = 64 * 1024) -> Iterator[bytes] | None:
+        """
+        Stream a cached entry as decompressed chunks.
+
+        Returns:
+            Chunk iterator, or None on a miss
+        """
+        fh = self.open(key)
+        if fh is None:
+            return None
+
+        def _chunks():
+            with fh:
+                while chunk := fh.read(chunk_size):
+                    yield chunk
+
+        return _chunks()
+
+    def write_through(self, key: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Pass chunks through while writing them to the cache.
+
+        The entry is published atomically only once the input is exhausted;
+        if the consumer stops early or an error occurs, nothing is stored.
+
+        Args:
+            key: Cache key from ResponseCache.key
+            chunks: Response body chunks
+
+        Yields:
+            The same chunks, unchanged
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        raw = os.fdopen(fd, "wb")
+        if self.codec == "zstd":
+            out = zstandard.ZstdCompressor(level=6).stream_writer(raw, closefd=True)
+        else:
+            out = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6)
+
+        completed = False
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+                yield chunk
+            completed = True
+        finally:
+            out.close()
+            raw.close()
+            if completed:
+                replaced = os.path.getsize(path) if os.path.exists(path) else 0
+                os.replace(tmp, path)
+                size = os.path.getsize(path)
+                log.debug("Stored %s (%d bytes)", key[:12], size)
+                self._stored(size - replaced)
+            else:
+                self._remove(tmp)
+
+    def put(self, key: str, body: bytes) -> None:
+        """Store a complete response body."""
+        for _ in self.write_through(key, (body,)):
+            pass
+
+    def _track(self, delta: int) -> None:
+        with self._size_lock:
+            if self._size is not None:
+                self._size += delta
+
+    def _stored(self, delta: int) -> None:
+        """Account for a written entry; evict on the first write and whenever over max_bytes."""
+        with self._size_lock:
+            if self._size is not None:
+                self._size += delta
+                if not self.max_bytes or self._size <= self.max_bytes:
+                    return
+            self.evict()
+
+    def evict(self) -> int:
+        """
+        Remove expired entries, then least recently used ones over max_bytes.
+
+        Once over max_bytes, entries are removed until the cache is back
+        under 90% of it.
+
+        Returns:
+            Number of removed entries
+        """
+        now = time.time()
+        entries = []
+        for root, _dirs, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_atime, stat.st_mtime, stat.st_size, path))
+
+        removed = 0
+        live = []
+        for atime, mtime, size, path in entries:
+            if self.ttl_sec and now - mtime > self.ttl_sec:
+                self._remove(path)
+                removed += 1
+            else:
+                live.append((atime, size, path))
+
+        total = sum(size for _atime, size, _path in live)
+        if self.max_bytes and total > self.max_bytes:
+            target = self.max_bytes * _EVICT_TARGET
+            for _atime, size, path in sorted(live):
+                if total <= target:
+                    break
+                self._remove(path)
+                total -= size
+                removed += 1
+        self._size = total
+
+        if removed:
+            log.debug("Evicted %d entries", removed)
+        return removed
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -3,34 +3,75 @@ Configuration module for ATS Mileage Sync application.
 
 This module handles loading and validation of environment variables
 required for SOAP web service communication and MSSQL database connection.
+
+Nothing is read at import time: the ``.env`` file is loaded and the
+environment evaluated when a Settings object is created (see get_settings),
+and required variables are validated per section when a component first
+needs them (Settings.validate), so ``--help`` and validation-only commands
+stay cheap and work without a complete environment.
 """
 
+import functools
+import json
 import os
-from dataclasses import dataclass
-from dotenv import load_dotenv
+import re
+from dataclasses import dataclass, field, fields, replace
+
+from .logger import get_logger
+
+log = get_logger("config")
+
+_TRUE = ("1", "true", "yes", "y")
+
 
-load_dotenv()
+@functools.cache
+def load_env() -> None:
+    """Load the ``.env`` file into os.environ (once per process)."""
+    from dotenv import load_dotenv
 
+    load_dotenv()
 
-def _req(name: str) -> str:
+
+def _getenv(name: str, default: str = "") -> str:
+    load_env()
+    return os.getenv(name, default)
+
+
+def _req(name: str, section: str):
     """
-    Get a required environment variable.
+    Declare a required environment variable.
+
+    The value is read when Settings is created; a missing value only
+    fails once its section is validated (see Settings.validate).
 
     Args:
         name: Environment variable name
+        section: Section the variable belongs to ("soap" or "mssql")
+    """
+    return field(default_factory=lambda: _getenv(name), metadata={"env": name, "section": section})
 
-    Returns:
-        The environment variable value
 
-    Raises:
-        RuntimeError: If the environment variable is not set
-    """
-    val = os.getenv(name)
-    if not val:
-        print(f"DEBUG CONFIG: Missing required environment variable: {name}")
-        raise RuntimeError(f"Missing env var: {name}")
-    print(f"DEBUG CONFIG: Loaded {name} = {'*' * len(val) if 'PASSWORD' in name else val}")
-    return val
+def _str(name: str, default: str = "", *, case: str | None = None):
+    def factory():
+        value = _getenv(name, default)
+        if case == "lower":
+            return value.lower()
+        if case == "upper":
+            return value.upper()
+        return value
+    return field(default_factory=factory)
+
+
+def _int(name: str, default: int):
+    return field(default_factory=lambda: int(_getenv(name, str(default))))
+
+
+def _float(name: str, default: float):
+    return field(default_factory=lambda: float(_getenv(name, str(default))))
+
+
+def _bool(name: str, default: bool):
+    return field(default_factory=lambda: _getenv(name, str(default).lower()).lower() in _TRUE)
 
 
 @dataclass(frozen=True)
@@ -40,29 +81,319 @@ class Settings:
 
     This dataclass contains all configuration required for the application
     to communicate with SOAP services and MSSQL database. All fields are
-    loaded from environment variables and the class is frozen to prevent
-    modification after initialization.
+    loaded from environment variables when the object is created and the
+    class is frozen to prevent modification after initialization.
     """
 
     # SOAP Web Service Configuration
-    soap_url: str = _req("SOAP_URL")
-    soap_action: str = _req("SOAP_ACTION")
-    soap_username: str = _req("SOAP_USERNAME")
-    soap_password: str = _req("SOAP_PASSWORD")
-    soap_company_code: str = _req("SOAP_COMPANY_CODE")
+    soap_url: str = _req("SOAP_URL", "soap")
+    soap_action: str = _req("SOAP_ACTION", "soap")
+    soap_username: str = _req("SOAP_USERNAME", "soap")
+    soap_password: str = _req("SOAP_PASSWORD", "soap")
+    soap_company_code: str = _req("SOAP_COMPANY_CODE", "soap")
 
     # MSSQL Database Configuration
-    mssql_driver: str = _req("MSSQL_DRIVER")
-    mssql_server: str = _req("MSSQL_SERVER")
-    mssql_database: str = _req("MSSQL_DATABASE")
-    mssql_user: str = _req("MSSQL_USER")
-    mssql_password: str = _req("MSSQL_PASSWORD")
-   
-    
+    mssql_driver: str = _req("MSSQL_DRIVER", "mssql")
+    mssql_server: str = _req("MSSQL_SERVER", "mssql")
+    mssql_database: str = _req("MSSQL_DATABASE", "mssql")
+    mssql_user: str = _req("MSSQL_USER", "mssql")
+    mssql_password: str = _req("MSSQL_PASSWORD", "mssql")
+    mssql_login_timeout_sec: int = _int("MSSQL_LOGIN_TIMEOUT_SEC", 15)
+    mssql_odbc_pooling: bool = _bool("MSSQL_ODBC_POOLING", True)  # ODBC driver manager pooling
+
+    # Connection pool (see ConnectionPool in src/db.py)
+    db_pool_size: int = _int("DB_POOL_SIZE", 2)
+    db_pool_validate_sec: float = _float("DB_POOL_VALIDATE_SEC", 30)  # ping idle connections older than this
+
+    # SOAP HTTP client (keep-alive pool, retry/backoff)
+    soap_timeout_sec: int = _int("SOAP_TIMEOUT_SEC", 60)
+    soap_pool_size: int = _int("SOAP_POOL_SIZE", 4)
+    soap_retries: int = _int("SOAP_RETRIES", 3)
+    soap_backoff_factor: float = _float("SOAP_BACKOFF_FACTOR", 0.5)
+    soap_backoff_jitter: float = _float("SOAP_BACKOFF_JITTER", 0.5)  # max random seconds added per retry
+
+    # Sharded SOAP fetch (see src/sharding.py)
+    soap_sharding: bool = _bool("SOAP_SHARDING", False)
+    soap_shard_minutes: int = _int("SOAP_SHARD_MINUTES", 0)  # 0 = full day
+    soap_min_shard_minutes: int = _int("SOAP_MIN_SHARD_MINUTES", 15)
+    soap_shard_concurrency: int = _int("SOAP_SHARD_CONCURRENCY", 4)
+    soap_max_response_mb: float = _float("SOAP_MAX_RESPONSE_MB", 0)  # 0 = no limit
+    soap_shard_by_device: bool = _bool("SOAP_SHARD_BY_DEVICE", False)
+    soap_device_ids: tuple[str, ...] = field(
+        default_factory=lambda: tuple(d.strip() for d in _getenv("SOAP_DEVICE_IDS").split(",") if d.strip())
+    )
+    soap_shard_merge: str = _str("SOAP_SHARD_MERGE", "max", case="lower")  # max | last
+
+    # On-disk SOAP response cache (see src/cache.py)
+    soap_cache_mode: str = _str("SOAP_CACHE_MODE", "off", case="lower")  # off | use | refresh
+    soap_cache_dir: str = _str("SOAP_CACHE_DIR", ".cache/soap")
+    soap_cache_ttl_hours: float = _float("SOAP_CACHE_TTL_HOURS", 72)
+    soap_cache_max_mb: float = _float("SOAP_CACHE_MAX_MB", 2048)
+    soap_cache_codec: str = _str("SOAP_CACHE_CODEC", "gzip", case="lower")  # gzip | zstd
+
     # Application Settings
-    deduplicate: bool = os.getenv("DEDUPLICATE", "true").lower() in ("1", "true", "yes", "y")
+    deduplicate: bool = _bool("DEDUPLICATE", True)
+    # "executemany": stage the batch and dedup/insert set-based (constant round trips)
+    # "row": legacy exists_for_date + insert_km_log per record
+    # "bulk": bcp bulk copy into a staging table, then a set-based merge (large backfills)
+    db_write_mode: str = _str("DB_WRITE_MODE", "executemany", case="lower")
+    bcp_path: str = _str("BCP_PATH", "bcp")
+    bulk_batch_size: int = _int("BULK_BATCH_SIZE", 50_000)  # rows per bcp commit
+    bulk_tablock: bool = _bool("BULK_TABLOCK", True)
+    bcp_extra_args: str = _str("BCP_EXTRA_ARGS", "")  # e.g. "-u" (trust server certificate, bcp 18+)
+    # Preloaded in-memory dedup index: "set" (exact hash set), "bloom" (Bloom filter
+    # front, hits confirmed in DB) or "off" (check in DB per row / per batch)
+    dedup_cache: str = _str("DEDUP_CACHE", "set", case="lower")
+    dedup_bloom_error_rate: float = _float("DEDUP_BLOOM_ERROR_RATE", 0.01)
+    # Stream the SOAP response into an incremental parser instead of loading it whole
+    soap_streaming: bool = _bool("SOAP_STREAMING", False)
+    # Number of parsed records handed to the DB layer at a time
+    parse_batch_size: int = _int("PARSE_BATCH_SIZE", 5000)
+    # Parallel SOAP fetch/parse workers for --from/--to range runs
+    fetch_concurrency: int = _int("FETCH_CONCURRENCY", 4)
+    # Commit every N rows and checkpoint progress (0 = one transaction per day)
+    commit_batch_size: int = _int("COMMIT_BATCH_SIZE", 0)
+    checkpoint_file: str = _str("CHECKPOINT_FILE", ".state/checkpoints.json")
+    resume_checkpoints: bool = _bool("RESUME_CHECKPOINTS", True)
+    # Incremental mode: only fetch windows after the per-device high-water marks
+    # and drop unchanged devices while parsing (see HighWaterMarks in src/state.py)
+    incremental: bool = _bool("INCREMENTAL", False)
+    high_water_file: str = _str("HIGH_WATER_FILE", ".state/high_water.json")
+
+    # Serve mode (see src/daemon.py) and the lock against overlapping runs
+    serve_schedule: str = _str("SERVE_SCHEDULE", "0 6 * * *")  # cron: daily run for yesterday
+    serve_intraday_minutes: int = _int("SERVE_INTRADAY_MINUTES", 0)  # 0 = no intra-day runs
+    serve_pending_file: str = _str("SERVE_PENDING_FILE", ".state/serve_pending.json")  # unfinished daily runs
+    lock_file: str = _str("LOCK_FILE", ".state/ats_mileage.lock")  # empty = no lock
+
+    # Validation stage between parse and write (see src/validation.py)
+    validation: str = _str("VALIDATION", "report", case="lower")  # report | quarantine | off
+    validation_max_daily_km: int = _int("VALIDATION_MAX_DAILY_KM", 2000)  # above this per day: outlier
+    validation_lookback_days: int = _int("VALIDATION_LOOKBACK_DAYS", 30)  # window for the previous reading
+
+    # Multi-company runs (see load_company_profiles and src.job.run_for_companies)
+    companies_file: str = _str("COMPANIES_FILE", "")  # JSON list of company profiles; empty = single company
+    company_workers: int = _int("COMPANY_WORKERS", 0)  # fetch/parse processes, 0 = CPU count
+    # Upper bound on rows written per second, shared by all writers of a run (0 = unlimited)
+    db_write_max_rows_per_sec: float = _float("DB_WRITE_MAX_ROWS_PER_SEC", 0)
+
+    # Archive sinks next to dbo.arac_km_log (see src/sinks.py)
+    archive_sinks: tuple[str, ...] = field(
+        default_factory=lambda: tuple(s.strip().lower() for s in _getenv("ARCHIVE_SINKS").split(",") if s.strip())
+    )  # parquet, csv; empty = no archive
+    archive_dir: str = _str("ARCHIVE_DIR", "archive")
+    archive_row_group_size: int = _int("ARCHIVE_ROW_GROUP_SIZE", 100_000)
+
+    # Summary mail: record tables above this size go into a gzip CSV attachment
+    mail_max_rows: int = _int("MAIL_MAX_ROWS", 1000)
+
+    # Metrics (see src/metrics.py)
+    metrics_enabled: bool = _bool("METRICS_ENABLED", True)
+    metrics_file: str = _str("METRICS_FILE", "")  # e.g. /var/lib/node_exporter/textfile/ats_mileage.prom
+    metrics_format: str = _str("METRICS_FORMAT", "prometheus", case="lower")  # prometheus | json
+
+    # Logging (see src/logger.py)
+    log_level: str = _str("LOG_LEVEL", "INFO", case="upper")
+    log_levels: str = _str("LOG_LEVELS", "")  # per module, e.g. "parser=WARNING,db=DEBUG"
+    log_file: str = _str("LOG_FILE", "ats_mileage.log")  # empty = no log file
+    log_json: bool = _bool("LOG_JSON", False)
+    log_console: bool = _bool("LOG_CONSOLE", True)
+
+    def missing(self, *sections: str) -> list[str]:
+        """
+        Names of required environment variables that are not set.
+
+        Args:
+            sections: Sections to check ("soap", "mssql"); all when omitted
+        """
+        return [
+            f.metadata["env"]
+            for f in fields(self)
+            if "env" in f.metadata
+            and (not sections or f.metadata["section"] in sections)
+            and not getattr(self, f.name)
+        ]
+
+    def validate(self, *sections: str) -> "Settings":
+        """
+        Check that the required variables of the given sections are set.
+
+        Args:
+            sections: Sections to check ("soap", "mssql"); all when omitted
+
+        Returns:
+            self, so the call can be chained
+
+        Raises:
+            RuntimeError: If a required environment variable is missing
+        """
+        missing = self.missing(*sections)
+        if missing:
+            raise RuntimeError(f"Missing env var: {', '.join(missing)}")
+        return self
+
+    def log_summary(self):
+        """Log the effective tuning settings (passwords are never logged)."""
+        log.debug("DEDUPLICATE = %s", self.deduplicate)
+        log.debug("DB_WRITE_MODE = %s, DEDUP_CACHE = %s", self.db_write_mode, self.dedup_cache)
+        if self.db_write_mode == "bulk":
+            log.debug(
+                "BCP_PATH = %s, BULK_BATCH_SIZE = %s, BULK_TABLOCK = %s",
+                self.bcp_path,
+                self.bulk_batch_size,
+                self.bulk_tablock,
+            )
+        log.debug("SOAP_STREAMING = %s, PARSE_BATCH_SIZE = %s", self.soap_streaming, self.parse_batch_size)
+        log.debug("FETCH_CONCURRENCY = %s", self.fetch_concurrency)
+        log.debug("COMMIT_BATCH_SIZE = %s, CHECKPOINT_FILE = %s", self.commit_batch_size, self.checkpoint_file)
+        log.debug("INCREMENTAL = %s, HIGH_WATER_FILE = %s", self.incremental, self.high_water_file)
+        log.debug("LOCK_FILE = %s", self.lock_file)
+        log.debug(
+            "VALIDATION = %s, VALIDATION_MAX_DAILY_KM = %s, VALIDATION_LOOKBACK_DAYS = %s",
+            self.validation,
+            self.validation_max_daily_km,
+            self.validation_lookback_days,
+        )
+        log.debug(
+            "COMPANIES_FILE = %s, COMPANY_WORKERS = %s, DB_WRITE_MAX_ROWS_PER_SEC = %s",
+            self.companies_file,
+            self.company_workers,
+            self.db_write_max_rows_per_sec,
+        )
+        if self.archive_sinks:
+            log.debug(
+                "ARCHIVE_SINKS = %s, ARCHIVE_DIR = %s, ARCHIVE_ROW_GROUP_SIZE = %s",
+                ",".join(self.archive_sinks),
+                self.archive_dir,
+                self.archive_row_group_size,
+            )
+        log.debug(
+            "DB_POOL_SIZE = %s, DB_POOL_VALIDATE_SEC = %s, MSSQL_ODBC_POOLING = %s",
+            self.db_pool_size,
+            self.db_pool_validate_sec,
+            self.mssql_odbc_pooling,
+        )
+        log.debug(
+            "SOAP_SHARDING = %s, SOAP_SHARD_MINUTES = %s, SOAP_SHARD_BY_DEVICE = %s (%d devices)",
+            self.soap_sharding,
+            self.soap_shard_minutes,
+            self.soap_shard_by_device,
+            len(self.soap_device_ids),
+        )
+
+
+@functools.cache
+def get_settings() -> Settings:
+    """
+    Return the process-wide Settings, loading the environment on first call.
+
+    Required variables are not validated here; call Settings.validate for
+    the sections a command needs.
+    """
+    return Settings()
+
+
+_PROFILE_NAME = re.compile(r"[A-Za-z0-9_-]+")
+
+
+@dataclass(frozen=True)
+class CompanyProfile:
+    """
+    One company of a multi-company run.
+
+    Attributes:
+        name: Short name used in logs, the summary mail and state file names
+        settings: Base settings with the company's SOAP_* values applied
+    """
+    name: str
+    settings: Settings
+
+
+def _per_company(path: str, name: str) -> str:
+    """Insert the company name before the extension of a state file path."""
+    if not path:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{name}{ext}"
+
+
+def _profile_value(current, value, key: str):
+    """Convert a JSON value to the type of the setting it overrides."""
+    if isinstance(current, tuple):
+        if not isinstance(value, list):
+            raise ValueError(f"{key} must be a list")
+        return tuple(str(v) for v in value)
+    if isinstance(current, bool):
+        if not isinstance(value, bool):
+            raise ValueError(f"{key} must be true or false")
+        return value
+    try:
+        return type(current)(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} must be a {type(current).__name__}") from None
+
+
+def load_company_profiles(path: str, base: Settings) -> list[CompanyProfile]:
+    """
+    Load the company profiles of a multi-company run.
+
+    The file is a JSON list with one object per company: a ``name`` and the
+    SOAP_* variables that differ from the environment, e.g.
+    ``{"name": "tnb", "SOAP_COMPANY_CODE": "...", "SOAP_USERNAME": "...",
+    "SOAP_PASSWORD": "..."}``. Database, mail and tuning settings are shared
+    and come from ``base``. Checkpoint and high-water files get the company
+    name as a suffix, so companies never share progress.
+
+    Args:
+        path: Profiles file
+        base: Settings the profiles are applied to
+
+    Returns:
+        One CompanyProfile per entry, in file order
+
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If the file is malformed, a key is not a SOAP_* setting
+            or a company lacks a required SOAP_* value
+    """
+    with open(path, encoding="utf-8") as f:
+        try:
+            entries = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{path}: invalid JSON: {e}") from None
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"{path}: expected a non-empty list of company profiles")
+
+    soap_fields = {f.name for f in fields(Settings) if f.name.startswith("soap_")}
+    profiles: list[CompanyProfile] = []
+    for entry in entries:
+        name = entry.get("name") if isinstance(entry, dict) else None
+        if not isinstance(name, str) or not _PROFILE_NAME.fullmatch(name):
+            raise ValueError(f"{path}: every profile needs a \"name\" of letters, digits, '-' or '_'")
+        if any(p.name == name for p in profiles):
+            raise ValueError(f"{path}: duplicate profile name {name!r}")
+
+        overrides = {}
+        for key, value in entry.items():
+            if key == "name":
+                continue
+            attr = key.lower()
+            if attr not in soap_fields:
+                raise ValueError(f"{path}: {name}: {key} is not a SOAP_* setting")
+            try:
+                overrides[attr] = _profile_value(getattr(base, attr), value, key)
+            except ValueError as e:
+                raise ValueError(f"{path}: {name}: {e}") from None
+
+        settings = replace(
+            base,
+            checkpoint_file=_per_company(base.checkpoint_file, name),
+            high_water_file=_per_company(base.high_water_file, name),
+            **overrides,
+        )
+        missing = settings.missing("soap")
+        if missing:
+            raise ValueError(f"{path}: {name}: missing {', '.join(missing)}")
+        profiles.append(CompanyProfile(name=name, settings=settings))
 
-    def __post_init__(self):
-        """Post-initialization hook to log successful settings loading."""
-        print("DEBUG CONFIG: Settings loaded successfully")
-        print(f"DEBUG CONFIG: DEDUPLICATE = {self.deduplicate}")
\ No newline at end of file
+    return profiles
@@ -0,0 +1,203 @@
+"""
+Serve mode for ATS Mileage Sync.
+
+``python -m src.main serve`` keeps one process running instead of starting
+a fresh interpreter from cron for every sync. The database connection and
+the SOAP session (with its keep-alive connections) stay open between
+runs, so a run no longer pays interpreter startup, imports, the ODBC
+connect and the TLS handshake. The daily sync of the previous day runs on
+a cron schedule (SERVE_SCHEDULE); optionally the current day is synced
+incrementally every SERVE_INTRADAY_MINUTES. The rows an intra-day run
+writes are provisional: the daily sync then runs incrementally as well
+and replaces them with the readings of the closed day.
+
+The connection is kept in the process-wide pool (src.db.get_pool), which
+health-checks it before reuse and reopens it if it was dropped while idle.
+SIGTERM/SIGINT let the current batch finish and be committed before the
+process exits; a second signal stops immediately. A daily sync that did
+not finish (stopped, failed or skipped) is recorded in SERVE_PENDING_FILE
+and rerun when the process starts again.
+Runs take the LOCK_FILE lock, so they never overlap with a cron or manual
+run of the CLI.
+"""
+
+import signal
+import threading
+from dataclasses import replace
+from datetime import datetime, timedelta
+
+from .config import Settings
+from .db import get_pool
+from .job import run_for_date
+from .logger import get_logger
+from .schedule import CronSchedule
+from .soap_client import SoapClient
+from .state import PendingDays, RunLock
+
+log = get_logger("daemon")
+
+# Longest single sleep, so clock changes and suspends are noticed quickly
+_MAX_SLEEP_SEC = 60
+
+
+class Daemon:
+    """
+    Scheduler loop with a warm database connection and SOAP session.
+
+    Attributes:
+        runs: Number of runs started
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        *,
+        schedule: CronSchedule,
+        intraday_minutes: int = 0,
+        lock: RunLock | None = None,
+    ):
+        """
+        Args:
+            settings: Application configuration settings
+            schedule: When to run the daily sync of the previous day
+            intraday_minutes: Interval of incremental syncs of the current day (0 = off)
+            lock: Lock taken for the duration of each run
+        """
+        self.settings = settings
+        self.schedule = schedule
+        self.intraday = timedelta(minutes=intraday_minutes) if intraday_minutes > 0 else None
+        self.lock = lock
+        self.runs = 0
+        self.pending = PendingDays(settings.serve_pending_file)
+        self._pool = get_pool(settings)
+        self._stop = threading.Event()
+        self._client: SoapClient | None = None
+
+    def stop(self) -> None:
+        """Ask the loop to exit once the current batch is committed."""
+        self._stop.set()
+
+    def run(self) -> None:
+        """Run until stop() is called or SIGTERM/SIGINT is received."""
+        self._install_signal_handlers()
+        self._client = SoapClient.from_settings(self.settings)
+
+        now = datetime.now()
+        next_daily = self.schedule.next_after(now)
+        next_intraday = now if self.intraday else None
+        log.info(
+            "Serving: daily sync at '%s' (next %s), intra-day every %s",
+            self.schedule.expr,
+            next_daily.strftime("%Y-%m-%d %H:%M"),
+            self.intraday or "never",
+        )
+
+        try:
+            for date_str in self.pending.days():
+                if self._stop.is_set():
+                    break
+                log.info("Rerunning unfinished daily sync of %s", date_str)
+                self.run_daily(datetime.strptime(date_str, "%Y-%m-%d"))
+
+            while not self._stop.is_set():
+                daily = next_intraday is None or next_daily <= next_intraday
+                due = next_daily if daily else next_intraday
+                remaining = (due - datetime.now()).total_seconds()
+                if remaining > 0:
+                    self._stop.wait(min(remaining, _MAX_SLEEP_SEC))
+                    continue
+
+                if daily:
+                    self.run_daily(due - timedelta(days=1))
+                    next_daily = self.schedule.next_after(datetime.now())
+                    log.info("Next daily sync at %s", next_daily.strftime("%Y-%m-%d %H:%M"))
+                else:
+                    settings = replace(self.settings, incremental=True)
+                    self.run_once(due, settings, send_summary=False)
+                    next_intraday = max(due + self.intraday, datetime.now())
+        finally:
+            self._shutdown()
+
+    def run_daily(self, day: datetime) -> dict | None:
+        """
+        Run the daily sync of ``day`` and keep it pending until it completes.
+
+        Returns:
+            The run summary, or None if the run was skipped or failed outright
+        """
+        # The intra-day runs left partial-day rows for the day; an
+        # incremental run replaces them with the closing readings
+        settings = replace(self.settings, incremental=True) if self.intraday else self.settings
+        summary = self.run_once(day, settings, send_summary=True)
+
+        date_str = day.strftime("%Y-%m-%d")
+        if summary is None:
+            reason = "skipped"
+        elif summary.get("interrupted"):
+            reason = "interrupted"
+        elif summary["errors"]:
+            reason = "failed"
+        else:
+            self.pending.remove(date_str)
+            return summary
+        self.pending.add(date_str, reason)
+        log.warning("Daily sync of %s %s; kept in %s to be rerun", date_str, reason, self.pending.path)
+        return summary
+
+    def run_once(self, day: datetime, settings: Settings, *, send_summary: bool = True) -> dict | None:
+        """
+        Run one sync over the warm connections.
+
+        Returns:
+            The run summary, or None if the run was skipped or failed outright
+        """
+        if self.lock is not None and not self.lock.acquire():
+            log.warning(
+                "Sync of %s skipped: another run holds %s (pid %s)",
+                day.strftime("%Y-%m-%d"),
+                self.lock.path,
+                self.lock.owner(),
+            )
+            return None
+
+        self.runs += 1
+        try:
+            # The connection comes from the pool and goes back to it afterwards
+            return run_for_date(
+                day,
+                settings,
+                client=self._client,
+                stop=self._stop,
+                send_summary=send_summary,
+            )
+        except Exception as e:
+            # e.g. connecting failed; the pool drops a broken connection
+            log.exception("Sync of %s failed: %s", day.strftime("%Y-%m-%d"), e)
+            return None
+        finally:
+            if self.lock is not None:
+                self.lock.release()
+
+    def _shutdown(self) -> None:
+        self._pool.close()
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+        log.info(
+            "Serve mode stopped after %d runs (%d connections opened, %d dropped)",
+            self.runs,
+            self._pool.created,
+            self._pool.discarded,
+        )
+
+    def _install_signal_handlers(self) -> None:
+        if threading.current_thread() is not threading.main_thread():
+            return  # signal handlers can only be installed from the main thread
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, self._on_signal)
+
+    def _on_signal(self, signum, _frame) -> None:
+        if self._stop.is_set():
+            raise KeyboardInterrupt
+        log.info("%s received, stopping after the current batch", signal.Signals(signum).name)
+        self._stop.set()
@@ -3,22 +3,290 @@ Database module for MSSQL operations in ATS Mileage Sync.
 
 This module provides a wrapper class for Microsoft SQL Server database operations
 including connection management, transaction handling, and mileage log insertion.
+Connections are handed out by a small ConnectionPool (see get_pool), so
+multi-run processes such as the serve mode reuse a validated connection
+instead of logging in again.
 """
 
+import atexit
+import hashlib
+import math
+import os
+import re
+import shlex
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
 from datetime import datetime
-import pyodbc
-from .logger import _send_mail, log_info
-from .mail_client import send_html_mail
-from .config import Settings
+from itertools import islice
+from typing import TYPE_CHECKING
+
+from .logger import get_logger
+from .metrics import metrics
+
+if TYPE_CHECKING:
+    from .config import Settings
+    from .parser import MileageBatch
+
+log = get_logger("db")
+
+# Set-based bulk write statements (see MsSql.bulk_insert_km_logs)
+_STAGE_CREATE_SQL = """
+IF OBJECT_ID('tempdb..#km_stage') IS NOT NULL DROP TABLE #km_stage;
+CREATE TABLE #km_stage (
+    RowNo INT NOT NULL PRIMARY KEY,
+    DeviceId NVARCHAR(100) NOT NULL,
+    License_Plate NVARCHAR(100) NULL,
+    Mileage BIGINT NULL,
+    Skip BIT NOT NULL DEFAULT 0
+);
+CREATE INDEX IX_km_stage_device ON #km_stage (DeviceId, RowNo);
+"""
+
+_STAGE_DEDUP_SQL = """
+UPDATE s
+SET Skip = 1
+FROM #km_stage s
+WHERE EXISTS (
+        SELECT 1
+        FROM dbo.arac_km_log l WITH (NOLOCK)
+        WHERE l.DeviceId = s.DeviceId
+          AND l.[Date] >= CONVERT(date, ?)
+          AND l.[Date] < DATEADD(day, 1, CONVERT(date, ?))
+    )
+   OR EXISTS (
+        SELECT 1
+        FROM #km_stage p
+        WHERE p.DeviceId = s.DeviceId
+          AND p.RowNo < s.RowNo
+    )
+"""
+
+_STAGE_INSERT_SQL = """
+INSERT INTO dbo.arac_km_log
+(DeviceId, License_Plate, [Date], Mileage, KayitTarihi)
+SELECT DeviceId, License_Plate, ?, Mileage, GETDATE()
+FROM #km_stage
+WHERE Skip = 0
+ORDER BY RowNo
+"""
+
+# Bulk-copy staging table (see MsSql.bulk_copy_km_logs). A permanent heap,
+# because bcp loads through its own session and cannot see #temp tables;
+# concurrent loads are kept apart by LoadId.
+BULK_STAGE_TABLE = "dbo.arac_km_log_stage"
+
+_BULK_STAGE_CREATE_SQL = f"""
+IF OBJECT_ID('{BULK_STAGE_TABLE}') IS NULL
+    CREATE TABLE {BULK_STAGE_TABLE} (
+        LoadId CHAR(32) NOT NULL,
+        RowNo INT NOT NULL,
+        DeviceId NVARCHAR(100) NOT NULL,
+        License_Plate NVARCHAR(100) NULL,
+        Mileage BIGINT NULL,
+        Skip BIT NOT NULL DEFAULT 0,
+        LoadedAt DATETIME2(0) NOT NULL DEFAULT SYSUTCDATETIME()
+    );
+DELETE FROM {BULK_STAGE_TABLE} WHERE LoadedAt < DATEADD(day, -1, SYSUTCDATETIME());
+"""
+
+_BULK_DEDUP_SQL = f"""
+UPDATE s
+SET Skip = 1
+FROM {BULK_STAGE_TABLE} s
+WHERE s.LoadId = ?
+  AND (
+        EXISTS (
+            SELECT 1
+            FROM dbo.arac_km_log l WITH (NOLOCK)
+            WHERE l.DeviceId = s.DeviceId
+              AND l.[Date] >= CONVERT(date, ?)
+              AND l.[Date] < DATEADD(day, 1, CONVERT(date, ?))
+        )
+     OR EXISTS (
+            SELECT 1
+            FROM {BULK_STAGE_TABLE} p
+            WHERE p.LoadId = s.LoadId
+              AND p.DeviceId = s.DeviceId
+              AND p.RowNo < s.RowNo
+        )
+  )
+"""
+
+_BULK_MERGE_SQL = f"""
+INSERT INTO dbo.arac_km_log
+(DeviceId, License_Plate, [Date], Mileage, KayitTarihi)
+SELECT DeviceId, License_Plate, ?, Mileage, GETDATE()
+FROM {BULK_STAGE_TABLE}
+WHERE LoadId = ? AND Skip = 0
+ORDER BY RowNo
+"""
+
+# bcp prints "<n> rows copied." when a load completes
+_BCP_COPIED_RE = re.compile(r"(\d+) rows copied")
+# Terminators inside a value would split the row; XML text never needs them
+_BCP_UNSAFE = str.maketrans({"\t": " ", "\r": " ", "\n": " "})
+
+
+def write_bcp_file(batch: "MileageBatch", path: str, load_id: str) -> None:
+    """
+    Write a batch as a bcp wide-character (``-w``) data file for the staging table.
+
+    Fields are tab-separated UTF-16LE text in the column order of
+    BULK_STAGE_TABLE; missing plates and mileages are left empty, which bcp
+    loads as NULL, and the trailing LoadedAt field is left empty so the
+    column default applies.
+
+    Args:
+        batch: Records to stage
+        path: Data file to create
+        load_id: Value of the LoadId column for every row
+    """
+    newline = "\r\n" if os.name == "nt" else "\n"  # bcp's "\n" row terminator means CRLF on Windows
+    lines = (
+        f"{load_id}\t{idx}\t{device_id.translate(_BCP_UNSAFE)}\t"
+        f"{'' if plate is None else plate.translate(_BCP_UNSAFE)}\t"
+        f"{'' if mileage is None else mileage}\t0\t{newline}"
+        for idx, (device_id, plate, mileage) in enumerate(batch.rows())
+    )
+    with open(path, "w", encoding="utf-16-le", newline="") as f:
+        while chunk := "".join(islice(lines, 10_000)):
+            f.write(chunk)
+
+# Rows held back by the validation stage (see src/validation.py)
+QUARANTINE_TABLE = "dbo.arac_km_log_quarantine"
+
+_QUARANTINE_CREATE_SQL = f"""
+IF OBJECT_ID('{QUARANTINE_TABLE}') IS NULL
+    CREATE TABLE {QUARANTINE_TABLE} (
+        Id BIGINT IDENTITY(1, 1) NOT NULL PRIMARY KEY,
+        DeviceId NVARCHAR(100) NOT NULL,
+        License_Plate NVARCHAR(100) NULL,
+        [Date] DATE NOT NULL,
+        Mileage BIGINT NULL,
+        PreviousMileage BIGINT NULL,
+        Reason VARCHAR(20) NOT NULL,
+        KayitTarihi DATETIME NOT NULL DEFAULT GETDATE()
+    );
+"""
+
+_QUARANTINE_INSERT_SQL = f"""
+INSERT INTO {QUARANTINE_TABLE}
+(DeviceId, License_Plate, [Date], Mileage, PreviousMileage, Reason)
+VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+# Last reading per device within a lookback window before a day; the
+# (DeviceId, [Date]) INCLUDE (Mileage) index covers it
+_PREVIOUS_MILEAGE_SQL = """
+SELECT DeviceId, Mileage, DATEDIFF(day, [Date], CONVERT(date, ?))
+FROM (
+    SELECT DeviceId, Mileage, [Date],
+           ROW_NUMBER() OVER (PARTITION BY DeviceId ORDER BY [Date] DESC) AS rn
+    FROM dbo.arac_km_log WITH (NOLOCK)
+    WHERE [Date] < CONVERT(date, ?)
+      AND [Date] >= DATEADD(day, -?, CONVERT(date, ?))
+      AND DeviceId IS NOT NULL
+      AND Mileage IS NOT NULL
+) last_reading
+WHERE rn = 1
+"""
+
+
+_INSERT_SQL = """
+INSERT INTO dbo.arac_km_log
+(DeviceId, License_Plate, [Date], Mileage, KayitTarihi)
+VALUES (?, ?, ?, ?, GETDATE())
+"""
+
+_DELETE_SQL = """
+DELETE FROM dbo.arac_km_log
+WHERE DeviceId = ?
+  AND [Date] >= CONVERT(date, ?)
+  AND [Date] < DATEADD(day, 1, CONVERT(date, ?))
+"""
+
+_EXISTS_SQL = """
+SELECT TOP (1) 1
+FROM dbo.arac_km_log WITH (NOLOCK)
+WHERE DeviceId = ?
+  AND [Date] >= CONVERT(date, ?)
+  AND [Date] < DATEADD(day, 1, CONVERT(date, ?))
+"""
+
+
+# Schema bootstrap (see MsSql.ensure_indexes / python -m src.main db-init)
+DEDUP_INDEX_NAME = "IX_arac_km_log_DeviceId_Date"
+UNIQUE_INDEX_NAME = "UX_arac_km_log_DeviceId_Date"
+
+_INDEX_COLUMNS_SQL = """
+SELECT c.name, ic.is_included_column
+FROM sys.indexes i
+JOIN sys.index_columns ic ON ic.object_id = i.object_id AND ic.index_id = i.index_id
+JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+WHERE i.object_id = OBJECT_ID('dbo.arac_km_log')
+  AND i.name = ?
+ORDER BY ic.is_included_column, ic.key_ordinal, c.name
+"""
+
+_INDEX_USAGE_SQL = """
+SELECT
+    i.name,
+    i.type_desc,
+    i.is_unique,
+    i.has_filter,
+    ISNULL(u.user_seeks, 0),
+    ISNULL(u.user_scans, 0),
+    ISNULL(u.user_lookups, 0),
+    ISNULL(u.user_updates, 0),
+    u.last_user_seek,
+    u.last_user_scan
+FROM sys.indexes i
+LEFT JOIN sys.dm_db_index_usage_stats u
+    ON u.object_id = i.object_id
+   AND u.index_id = i.index_id
+   AND u.database_id = DB_ID()
+WHERE i.object_id = OBJECT_ID('dbo.arac_km_log')
+ORDER BY i.index_id
+"""
+
+_DEDUP_KEYS_WHERE = """
+FROM dbo.arac_km_log WITH (NOLOCK)
+WHERE [Date] >= CONVERT(date, ?)
+  AND [Date] < DATEADD(day, 1, CONVERT(date, ?))
+  AND DeviceId IS NOT NULL
+"""
+
+
 class MsSql:
     """
     Microsoft SQL Server database connection and operations wrapper.
 
     This class manages database connections, transactions, and provides methods
     for inserting mileage records and checking for existing records.
+
+    Statements executed per record keep one cursor each for the lifetime of
+    the connection. pyodbc prepares a statement once and re-executes the
+    prepared handle as long as the same SQL runs on the same cursor, so the
+    per-row path skips cursor allocation and re-preparation.
     """
 
-    def __init__(self, *, driver: str, server: str, database: str, user: str, password: str):
+    def __init__(
+        self,
+        *,
+        driver: str,
+        server: str,
+        database: str,
+        user: str,
+        password: str,
+        login_timeout_sec: int = 15,
+        odbc_pooling: bool = True,
+    ):
         """
         Initialize database connection.
 
@@ -28,20 +296,59 @@ class MsSql:
             database: Database name
             user: Database username
             password: Database password
+            login_timeout_sec: Give up connecting after this many seconds (0 = driver default)
+            odbc_pooling: ODBC driver manager connection pooling; only takes
+                effect before the first connection of the process
         """
-        log_info(f"Connecting to database: {server}/{database}")
-        print(f"DEBUG DB: Connecting to database {server}/{database}")
+        # Imported here so commands that never touch the database skip the driver
+        import pyodbc
+
+        pyodbc.pooling = odbc_pooling
+        log.info("Connecting to database: %s/%s", server, database)
+        started = time.perf_counter()
         self.conn = pyodbc.connect(
             f"DRIVER={{{driver}}};"
             f"SERVER={server};"
             f"DATABASE={database};"
             f"UID={user};"
             f"PWD={password};"
-            "TrustServerCertificate=yes;"
+            "TrustServerCertificate=yes;",
+            timeout=login_timeout_sec,
         )
         self.conn.autocommit = False
-        #log_info("Database connection established")
-        print("DEBUG DB: Database connection established successfully")
+        self._cursors: dict[str, "pyodbc.Cursor"] = {}
+        # bcp opens its own session with the same login (see bulk_copy_km_logs)
+        self._bcp_login = ("-S", server, "-d", database, "-U", user, "-P", password)
+        self._bulk_stage_ready = False
+        self._quarantine_ready = False
+        metrics.observe("db_connect_seconds", time.perf_counter() - started)
+        log.debug("Database connection established successfully")
+
+    @classmethod
+    def from_settings(cls, settings: "Settings") -> "MsSql":
+        """
+        Open a new connection using application Settings.
+
+        Raises:
+            RuntimeError: If a required MSSQL_* variable is missing
+        """
+        settings.validate("mssql")
+        return cls(
+            driver=settings.mssql_driver,
+            server=settings.mssql_server,
+            database=settings.mssql_database,
+            user=settings.mssql_user,
+            password=settings.mssql_password,
+            login_timeout_sec=settings.mssql_login_timeout_sec,
+            odbc_pooling=settings.mssql_odbc_pooling,
+        )
+
+    def _cursor(self, key: str):
+        """Return the cached cursor for a statement, creating it on first use."""
+        cur = self._cursors.get(key)
+        if cur is None:
+            cur = self._cursors[key] = self.conn.cursor()
+        return cur
 
     def insert_km_log(
         self,
@@ -49,38 +356,54 @@ class MsSql:
         license_plate: str | None,
         date_str: str,
         mileage: int | None,
-        # settings: dict,  # Add settings parameter
     ):
-        sql = """
-        INSERT INTO dbo.arac_km_log
-        (DeviceId, License_Plate, [Date], Mileage, KayitTarihi)
-        VALUES (?, ?, ?, ?, GETDATE())
-        """
-        cur = self.conn.cursor()
-        cur.execute(sql, device_id, license_plate, date_str, mileage)
-
-        print(f"DEBUG DB: Executed INSERT for Plate={license_plate}, Date={date_str}, KM={mileage}")
+        self._cursor(_INSERT_SQL).execute(_INSERT_SQL, device_id, license_plate, date_str, mileage)
+        metrics.inc("db_round_trips_total")
 
-        
+        log.debug("Executed INSERT for Plate=%s, Date=%s, KM=%s", license_plate, date_str, mileage)
 
     def commit(self):
         """Commit the current database transaction."""
-        log_info("Committing database transaction")
-        print("DEBUG DB: Committing database transaction")
-        self.conn.commit()
+        log.debug("Committing database transaction")
+        with metrics.timer("db_commit"):
+            self.conn.commit()
+        metrics.inc("db_round_trips_total")
 
     def rollback(self):
         """Rollback the current database transaction."""
-        log_info("Rolling back database transaction")
-        print("DEBUG DB: Rolling back database transaction")
+        log.info("Rolling back database transaction")
         self.conn.rollback()
+        metrics.inc("db_round_trips_total")
 
     def close(self):
         """Close the database connection."""
-        log_info("Closing database connection")
-        print("DEBUG DB: Closing database connection")
+        log.debug("Closing database connection")
+        cursors, self._cursors = self._cursors, {}
+        for cur in cursors.values():
+            try:
+                cur.close()
+            except Exception:
+                pass  # already invalid if the connection was dropped
         self.conn.close()
 
+    def ping(self) -> bool:
+        """
+        Check that the connection is still usable.
+
+        Used by long-running processes before reusing an idle connection
+        (the server or a firewall may have dropped it in the meantime).
+
+        Returns:
+            False if a trivial query fails
+        """
+        try:
+            self._cursor("SELECT 1").execute("SELECT 1").fetchall()
+        except Exception as e:
+            log.warning("Database health check failed: %s", e)
+            return False
+        metrics.inc("db_round_trips_total")
+        return True
+
     def exists_for_date(self, device_id: str, date_str: str) -> bool:
         """
         Check if a mileage record exists for the given device and date.
@@ -92,12 +415,691 @@ class MsSql:
         Returns:
             True if a record exists, False otherwise
         """
-        sql = """
-        SELECT 1
-        FROM dbo.arac_km_log WITH (NOLOCK)
-        WHERE DeviceId = ?
-          AND CONVERT(date, [Date]) = CONVERT(date, ?)
+        # fetchall drains the result, so the cached cursor never keeps the connection busy
+        rows = self._cursor(_EXISTS_SQL).execute(_EXISTS_SQL, device_id, date_str, date_str).fetchall()
+        metrics.inc("db_round_trips_total")
+        return bool(rows)
+
+    def delete_km_logs(self, device_ids: list[str], date_str: str) -> None:
+        """
+        Delete the rows of some devices for a date, in the current transaction.
+
+        Used to replace rows an earlier run wrote while the day was still open.
+
+        Args:
+            device_ids: Devices whose rows are deleted
+            date_str: Date string in YYYY-MM-DD format
+        """
+        if not device_ids:
+            return
+        cur = self._cursor(_DELETE_SQL)
+        cur.fast_executemany = True
+        cur.executemany(_DELETE_SQL, [(device_id, date_str, date_str) for device_id in device_ids])
+        cur.fast_executemany = False
+        metrics.inc("db_round_trips_total")
+        log.debug("Deleted rows of %d devices for Date=%s", len(device_ids), date_str)
+
+    def bulk_insert_km_logs(
+        self,
+        batch: "MileageBatch",
+        date_str: str,
+        *,
+        deduplicate: bool = True,
+    ) -> list[bool]:
+        """
+        Insert a whole parsed batch with a constant number of round trips.
+
+        Rows are staged into a session temp table with ``fast_executemany``,
+        duplicates (already in ``dbo.arac_km_log`` for the date, or repeated
+        within the batch) are flagged in one set-based UPDATE, and the
+        remaining rows are copied with a single ``INSERT ... SELECT``.
+
+        Args:
+            batch: Parsed records; its columns are bound directly
+            date_str: Date string in YYYY-MM-DD format
+            deduplicate: Skip rows whose device already has a log for the date
+
+        Returns:
+            One flag per batch row, True if the row was inserted and
+            False if it was skipped as a duplicate
+        """
+        if not batch:
+            return []
+
+        cur = self._cursor("bulk")
+        cur.execute(_STAGE_CREATE_SQL)
+
+        cur.fast_executemany = True
+        cur.executemany(
+            "INSERT INTO #km_stage (RowNo, DeviceId, License_Plate, Mileage) VALUES (?, ?, ?, ?)",
+            [(idx, *row) for idx, row in enumerate(batch.rows())],
+        )
+        cur.fast_executemany = False
+
+        if deduplicate:
+            cur.execute(_STAGE_DEDUP_SQL, date_str, date_str)
+
+        cur.execute(_STAGE_INSERT_SQL, date_str)
+        skipped = {row[0] for row in cur.execute("SELECT RowNo FROM #km_stage WHERE Skip = 1").fetchall()}
+        cur.execute("DROP TABLE #km_stage")
+        metrics.inc("db_round_trips_total", 6 if deduplicate else 5)
+
+        log.debug(
+            "Bulk insert for Date=%s | Staged=%d Inserted=%d Skipped=%d",
+            date_str,
+            len(batch),
+            len(batch) - len(skipped),
+            len(skipped),
+        )
+        return [idx not in skipped for idx in range(len(batch))]
+
+    def ensure_bulk_stage(self) -> None:
+        """
+        Create the bulk-copy staging table if needed and purge stale loads.
+
+        Rows of a load are deleted by the merge that consumes them; rows of
+        loads whose merge was rolled back are removed here after a day.
+        Runs once per connection.
+        """
+        if self._bulk_stage_ready:
+            return
+        self._cursor("bulk").execute(_BULK_STAGE_CREATE_SQL)
+        self.conn.commit()  # the table must exist for bcp's own session
+        metrics.inc("db_round_trips_total", 2)
+        self._bulk_stage_ready = True
+
+    def bulk_copy_km_logs(
+        self,
+        batch: "MileageBatch",
+        date_str: str,
+        *,
+        deduplicate: bool = True,
+        bcp_path: str = "bcp",
+        batch_size: int = 50_000,
+        tablock: bool = True,
+        extra_args: str = "",
+    ) -> list[bool]:
+        """
+        Insert a batch through the bcp bulk-copy utility.
+
+        The batch is written to a bcp data file and loaded into
+        BULK_STAGE_TABLE with the TDS bulk-load protocol, committed every
+        ``batch_size`` rows and, with ``tablock``, under a table lock (bulk
+        update lock on the heap, so parallel loads still run side by side
+        and the load can be minimally logged). Duplicates are then flagged
+        and the rest merged into ``dbo.arac_km_log`` set-based, inside this
+        connection's transaction, as in bulk_insert_km_logs.
+
+        The staged rows are committed by bcp itself; if the merge is rolled
+        back they stay in the staging table until ensure_bulk_stage purges
+        them.
+
+        Args:
+            batch: Parsed records
+            date_str: Date string in YYYY-MM-DD format
+            deduplicate: Skip rows whose device already has a log for the date
+            bcp_path: bcp executable
+            batch_size: Rows per bcp commit (``-b``)
+            tablock: Load with the TABLOCK hint
+            extra_args: Additional bcp arguments, e.g. ``-u`` to trust the server certificate
+
+        Returns:
+            One flag per batch row, True if the row was inserted and
+            False if it was skipped as a duplicate
+
+        Raises:
+            RuntimeError: If bcp fails or loads fewer rows than staged
+        """
+        if not batch:
+            return []
+
+        self.ensure_bulk_stage()
+        load_id = uuid.uuid4().hex
+        with tempfile.TemporaryDirectory(prefix="ats-bcp-") as tmp:
+            data_file = os.path.join(tmp, "stage.dat")
+            with metrics.timer("bcp_write_file"):
+                write_bcp_file(batch, data_file, load_id)
+
+            args = [bcp_path, BULK_STAGE_TABLE, "in", data_file, "-w", "-b", str(max(1, batch_size))]
+            if tablock:
+                args += ["-h", "TABLOCK"]
+            error_file = os.path.join(tmp, "errors.log")
+            args += [*self._bcp_login, "-e", error_file, *shlex.split(extra_args)]
+
+            with metrics.timer("bcp_load"):
+                result = subprocess.run(args, capture_output=True, text=True)
+            metrics.inc("db_round_trips_total")
+
+            match = _BCP_COPIED_RE.search(result.stdout)
+            copied = int(match.group(1)) if match else 0
+            if result.returncode != 0 or copied != len(batch):
+                errors = ""
+                if os.path.exists(error_file):
+                    with open(error_file, encoding="utf-8", errors="replace") as f:
+                        errors = f.read()
+                raise RuntimeError(
+                    f"bcp loaded {copied} of {len(batch)} rows (exit {result.returncode}): "
+                    f"{(result.stdout + result.stderr + errors).strip()[-2000:]}"
+                )
+
+        cur = self._cursor("bulk")
+        if deduplicate:
+            cur.execute(_BULK_DEDUP_SQL, load_id, date_str, date_str)
+        cur.execute(_BULK_MERGE_SQL, date_str, load_id)
+        skipped = {
+            row[0]
+            for row in cur.execute(
+                f"SELECT RowNo FROM {BULK_STAGE_TABLE} WHERE LoadId = ? AND Skip = 1", load_id
+            ).fetchall()
+        }
+        cur.execute(f"DELETE FROM {BULK_STAGE_TABLE} WHERE LoadId = ?", load_id)
+        metrics.inc("db_round_trips_total", 4 if deduplicate else 3)
+
+        log.debug(
+            "Bulk copy for Date=%s | Staged=%d Inserted=%d Skipped=%d",
+            date_str,
+            len(batch),
+            len(batch) - len(skipped),
+            len(skipped),
+        )
+        return [idx not in skipped for idx in range(len(batch))]
+
+    def ensure_quarantine_table(self) -> None:
+        """Create the quarantine table if needed (once per connection)."""
+        if self._quarantine_ready:
+            return
+        self._cursor("quarantine").execute(_QUARANTINE_CREATE_SQL)
+        metrics.inc("db_round_trips_total")
+        self._quarantine_ready = True
+
+    def quarantine_km_logs(
+        self,
+        batch: "MileageBatch",
+        date_str: str,
+        reasons: list[str],
+        previous: list[int | None],
+    ) -> None:
+        """
+        Write rows rejected by the validation stage to the quarantine table.
+
+        Runs in the current transaction, so quarantined rows commit or roll
+        back together with the day's inserts.
+
+        Args:
+            batch: Rejected rows
+            date_str: Date string in YYYY-MM-DD format
+            reasons: Reason per row (see src.validation.REASONS)
+            previous: Previous known mileage per row, None if unknown
+        """
+        if not batch:
+            return
+        self.ensure_quarantine_table()
+        cur = self._cursor("quarantine")
+        cur.fast_executemany = True
+        cur.executemany(
+            _QUARANTINE_INSERT_SQL,
+            [
+                (device_id, plate, date_str, mileage, prev, reason)
+                for (device_id, plate, mileage), reason, prev in zip(batch.rows(), reasons, previous)
+            ],
+        )
+        metrics.inc("db_round_trips_total")
+        log.debug("Quarantined %d rows for Date=%s", len(batch), date_str)
+
+    def iter_previous_mileages(
+        self, date_str: str, lookback_days: int, *, chunk_size: int = 50_000
+    ) -> Iterator[tuple[str, int, int]]:
+        """
+        Stream the last known mileage of every device before a day.
+
+        One query; only readings within ``lookback_days`` before
+        ``date_str`` are considered.
+
+        Args:
+            date_str: Day being validated (YYYY-MM-DD, exclusive)
+            lookback_days: How far back to look for a previous reading
+            chunk_size: Rows per fetchmany call
+
+        Yields:
+            ``(device_id, mileage, days_ago)`` tuples
         """
         cur = self.conn.cursor()
-        row = cur.execute(sql, device_id, date_str).fetchone()
-        return row is not None
+        cur.execute(_PREVIOUS_MILEAGE_SQL, date_str, date_str, lookback_days, date_str)
+        metrics.inc("db_round_trips_total")
+        while rows := cur.fetchmany(chunk_size):
+            metrics.inc("db_round_trips_total")
+            for device_id, mileage, days_ago in rows:
+                yield device_id, mileage, days_ago
+
+    def ensure_indexes(self, *, unique: bool = False) -> list[str]:
+        """
+        Create or validate the indexes used by the dedup lookups.
+
+        The covering index ``(DeviceId, [Date]) INCLUDE (Mileage)`` serves
+        the half-open date range filter of exists_for_date and the bulk
+        dedup UPDATE. With ``unique`` a filtered unique index on the same
+        key is added as well, which makes duplicate inserts fail instead of
+        relying on the dedup check alone (creation fails if duplicates
+        already exist).
+
+        Args:
+            unique: Also create the filtered unique index
+
+        Returns:
+            Human-readable list of actions taken / problems found
+        """
+        actions = []
+        specs = [(DEDUP_INDEX_NAME, False)]
+        if unique:
+            specs.append((UNIQUE_INDEX_NAME, True))
+
+        cur = self.conn.cursor()
+        for name, is_unique in specs:
+            columns = cur.execute(_INDEX_COLUMNS_SQL, name).fetchall()
+            keys = [c[0] for c in columns if not c[1]]
+
+            if not columns:
+                cur.execute(
+                    f"CREATE {'UNIQUE ' if is_unique else ''}NONCLUSTERED INDEX {name} "
+                    "ON dbo.arac_km_log (DeviceId, [Date]) "
+                    + ("WHERE DeviceId IS NOT NULL" if is_unique else "INCLUDE (Mileage)")
+                )
+                actions.append(f"created {name}")
+            elif keys != ["DeviceId", "Date"]:
+                actions.append(f"WARNING {name} exists with unexpected keys {keys}")
+            else:
+                actions.append(f"ok {name}")
+
+            log.debug("Index check - %s", actions[-1])
+
+        return actions
+
+    def index_report(self) -> list[dict]:
+        """
+        Report the indexes of dbo.arac_km_log with usage counters.
+
+        Counters come from sys.dm_db_index_usage_stats and reset when the
+        SQL Server instance restarts.
+
+        Returns:
+            One dict per index
+        """
+        cur = self.conn.cursor()
+        keys = (
+            "name", "type", "is_unique", "has_filter", "user_seeks", "user_scans",
+            "user_lookups", "user_updates", "last_user_seek", "last_user_scan",
+        )
+        return [dict(zip(keys, row)) for row in cur.execute(_INDEX_USAGE_SQL).fetchall()]
+
+    def iter_dedup_keys(self, start_date: str, end_date: str, *, chunk_size: int = 50_000) -> Iterator[tuple[str, str]]:
+        """
+        Stream every (DeviceId, date) pair already logged in a date window.
+
+        One query for the whole window; rows are fetched in chunks so large
+        windows do not materialize the result twice.
+
+        Args:
+            start_date: First date (YYYY-MM-DD, inclusive)
+            end_date: Last date (YYYY-MM-DD, inclusive)
+            chunk_size: Rows per fetchmany call
+
+        Yields:
+            ``(device_id, "YYYY-MM-DD")`` tuples
+        """
+        cur = self.conn.cursor()
+        cur.execute(
+            "SELECT DISTINCT DeviceId, CONVERT(char(10), [Date], 23) " + _DEDUP_KEYS_WHERE,
+            start_date, end_date,
+        )
+        metrics.inc("db_round_trips_total")
+        while rows := cur.fetchmany(chunk_size):
+            metrics.inc("db_round_trips_total")
+            for device_id, date_str in rows:
+                yield device_id, date_str
+
+    def count_dedup_keys(self, start_date: str, end_date: str) -> int:
+        """Number of log rows in a date window (sizing hint for DedupIndex)."""
+        cur = self.conn.cursor()
+        metrics.inc("db_round_trips_total")
+        return cur.execute("SELECT COUNT_BIG(*) " + _DEDUP_KEYS_WHERE, start_date, end_date).fetchone()[0]
+
+
+class ConnectionPool:
+    """
+    Small pool of open MsSql connections.
+
+    Connections are checked out with acquire()/release() or the
+    connection() context manager. An idle connection is validated with
+    MsSql.ping before it is handed out again if it has been idle for more
+    than ``validate_after_sec`` (the server or a firewall may have dropped
+    it); broken connections are discarded and replaced. At most ``size``
+    idle connections are kept.
+
+    Callers commit or roll back before releasing; a connection released
+    after an error is rolled back, and discarded if that fails.
+
+    Attributes:
+        created: Connections opened
+        reused: Checkouts served by an idle connection
+        discarded: Connections dropped after a failed validation or rollback
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], MsSql],
+        *,
+        size: int = 2,
+        validate_after_sec: float = 30.0,
+    ):
+        """
+        Args:
+            factory: Opens a new connection
+            size: Maximum idle connections kept open
+            validate_after_sec: Ping idle connections older than this before reuse (0 = always)
+        """
+        self._factory = factory
+        self.size = max(1, size)
+        self.validate_after_sec = validate_after_sec
+        self._idle: list[tuple[MsSql, float]] = []
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+
+    @classmethod
+    def from_settings(cls, settings: "Settings") -> "ConnectionPool":
+        """Build a pool that opens connections with MsSql.from_settings."""
+        return cls(
+            lambda: MsSql.from_settings(settings),
+            size=settings.db_pool_size,
+            validate_after_sec=settings.db_pool_validate_sec,
+        )
+
+    def acquire(self) -> MsSql:
+        """Return a validated idle connection, or open a new one."""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                db, since = self._idle.pop()
+            if time.monotonic() - since < self.validate_after_sec or db.ping():
+                self.reused += 1
+                metrics.inc("db_pool_reused_total")
+                return db
+            self._discard(db)
+
+        db = self._factory()
+        self.created += 1
+        metrics.inc("db_connections_total")
+        return db
+
+    def release(self, db: MsSql, *, failed: bool = False) -> None:
+        """
+        Return a connection to the pool.
+
+        Args:
+            db: Connection from acquire()
+            failed: The caller hit an error; roll back and discard the connection if that fails
+        """
+        if failed:
+            try:
+                db.rollback()
+            except Exception as e:
+                log.warning("Rollback on release failed, dropping connection: %s", e)
+                self._discard(db)
+                return
+
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append((db, time.monotonic()))
+                return
+        db.close()
+
+    @contextmanager
+    def connection(self) -> Iterator[MsSql]:
+        """Check out a connection for the duration of a ``with`` block."""
+        db = self.acquire()
+        try:
+            yield db
+        except BaseException:
+            self.release(db, failed=True)
+            raise
+        self.release(db)
+
+    def close(self) -> None:
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for db, _since in idle:
+            self._discard(db, count=False)
+
+    def _discard(self, db: MsSql, *, count: bool = True) -> None:
+        if count:
+            self.discarded += 1
+            metrics.inc("db_pool_discarded_total")
+        try:
+            db.close()
+        except Exception as e:
+            log.debug("Closing a dropped connection failed: %s", e)
+
+
+_pool: ConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(settings: "Settings") -> ConnectionPool:
+    """
+    Return the process-wide connection pool, created on first use.
+
+    Idle connections are closed at interpreter exit.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool.from_settings(settings)
+            atexit.register(_pool.close)
+        return _pool
+
+
+class WriteThrottle:
+    """
+    Cap on the rate at which rows are written to the database.
+
+    A token bucket holding one second's worth of rows: wait() returns at
+    once while the budget allows and sleeps otherwise, so bursts (e.g.
+    several companies finishing their fetch at once) are smoothed to
+    ``rows_per_sec`` on average. Safe to share between threads.
+
+    Attributes:
+        waited_sec: Total time callers were held back
+    """
+
+    def __init__(self, rows_per_sec: float):
+        """
+        Args:
+            rows_per_sec: Average rows allowed per second (> 0)
+        """
+        self.rate = rows_per_sec
+        self._allowance = rows_per_sec
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        self.waited_sec = 0.0
+
+    def wait(self, rows: int) -> None:
+        """Block until ``rows`` more rows may be written."""
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(self.rate, self._allowance + (now - self._last) * self.rate) - rows
+            self._last = now
+            delay = -self._allowance / self.rate if self._allowance < 0 else 0.0
+            self.waited_sec += delay
+        if delay:
+            metrics.observe("db_throttle_seconds", delay)
+            time.sleep(delay)
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over string keys.
+
+    Never reports a false negative; false positives occur at roughly
+    ``error_rate`` once ``capacity`` keys have been added.
+    """
+
+    __slots__ = ("size", "hashes", "bits")
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(1, capacity)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str) -> Iterator[int]:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str) -> None:
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class DedupIndex:
+    """
+    In-memory index of (DeviceId, date) keys already in dbo.arac_km_log.
+
+    Loaded once per run (or per date range) with MsSql.iter_dedup_keys, so
+    duplicate checks are in-memory lookups instead of one exists_for_date
+    round trip per record. Keys seen by partition() are added immediately,
+    which also drops duplicates within and across batches of the run; they
+    follow the caller's transaction, so rollback() forgets the keys added
+    since the last commit() and a retry in the same process writes them.
+
+    In ``bloom`` mode only a Bloom filter of the preloaded keys is kept (a
+    few bits per key instead of a Python set entry). Rows that hit the
+    filter are reported as "unsure"; the writer (src.job._write_records)
+    sends them to the DB in a separate call that checks the table, so
+    results stay exact. Where that check runs depends on DB_WRITE_MODE:
+
+    - ``row``: one exists_for_date lookup per unsure row before its insert
+    - ``executemany``: bulk_insert_km_logs(deduplicate=True) marks the
+      staged rows that already have a log for the date and skips them
+    - ``bulk``: bulk_copy_km_logs(deduplicate=True) does the same on the
+      bcp staging table before the merge
+
+    Rows the index reports as new are written without any DB check.
+    """
+
+    MODES = ("set", "bloom")
+
+    def __init__(self, *, mode: str = "set", capacity: int = 0, error_rate: float = 0.01):
+        """
+        Args:
+            mode: "set" or "bloom"
+            capacity: Expected preloaded keys (bloom mode sizing)
+            error_rate: Bloom filter false positive rate
+
+        Raises:
+            ValueError: If mode is unknown
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unsupported dedup index mode: {mode}")
+
+        self.mode = mode
+        self.bloom = BloomFilter(capacity, error_rate) if mode == "bloom" else None
+        # Exact keys: everything in set mode, only keys seen in this run in bloom mode
+        self.keys: dict[str, set[str]] = {}
+        self.preloaded = 0
+        # (date, device) keys added since the last commit
+        self._uncommitted: list[tuple[str, str]] = []
+
+    @classmethod
+    def load(
+        cls,
+        db: MsSql,
+        start_date: str,
+        end_date: str,
+        *,
+        mode: str = "set",
+        error_rate: float = 0.01,
+    ) -> "DedupIndex":
+        """
+        Build an index with all keys of a date window.
+
+        Args:
+            db: Open connection
+            start_date: First date (YYYY-MM-DD, inclusive)
+            end_date: Last date (YYYY-MM-DD, inclusive)
+            mode: "set" or "bloom"
+            error_rate: Bloom filter false positive rate
+
+        Returns:
+            Loaded DedupIndex
+        """
+        capacity = db.count_dedup_keys(start_date, end_date) if mode == "bloom" else 0
+        index = cls(mode=mode, capacity=capacity, error_rate=error_rate)
+
+        for device_id, date_str in db.iter_dedup_keys(start_date, end_date):
+            if index.bloom is not None:
+                index.bloom.add(f"{date_str}|{device_id}")
+            else:
+                index.keys.setdefault(date_str, set()).add(sys.intern(device_id))
+            index.preloaded += 1
+
+        log.info("Dedup index loaded (%s) for %s - %s | Keys=%d", mode, start_date, end_date, index.preloaded)
+        return index
+
+    def add(self, device_id: str, date_str: str) -> None:
+        """Record a key written during this run."""
+        self.keys.setdefault(date_str, set()).add(device_id)
+        self._uncommitted.append((date_str, device_id))
+
+    def commit(self) -> None:
+        """Keep the keys added since the last commit (call after the DB commit)."""
+        self._uncommitted = []
+
+    def rollback(self) -> None:
+        """Forget the keys added since the last commit (call with the DB rollback)."""
+        uncommitted, self._uncommitted = self._uncommitted, []
+        for date_str, device_id in uncommitted:
+            self.keys.get(date_str, set()).discard(device_id)
+
+    def partition(self, batch: "MileageBatch", date_str: str) -> tuple[list[bool], list[bool]]:
+        """
+        Classify the rows of a batch against the index.
+
+        Every device not seen before is added to the index right away, so
+        a device that repeats later in the run is a known duplicate.
+
+        Args:
+            batch: Parsed records
+            date_str: Target date in YYYY-MM-DD format
+
+        Returns:
+            ``(new, unsure)`` flag lists, one flag per row. ``new`` rows can
+            be inserted without any check; ``unsure`` rows (Bloom hits) need
+            a DB existence check. Rows with neither flag are duplicates.
+        """
+        day_keys = self.keys.setdefault(date_str, set())
+        bloom = self.bloom
+        new: list[bool] = []
+        unsure: list[bool] = []
+
+        for device_id in batch.device_ids:
+            if device_id in day_keys:
+                new.append(False)
+                unsure.append(False)
+                continue
+
+            day_keys.add(device_id)
+            self._uncommitted.append((date_str, device_id))
+            maybe = bloom is not None and f"{date_str}|{device_id}" in bloom
+            new.append(not maybe)
+            unsure.append(maybe)
+
+        return new, unsure
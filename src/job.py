@@ -6,46 +6,32 @@ from SOAP web services to MSSQL database, including date range processing
 and deduplication logic.
 """
 
+import os
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from functools import partial
+from typing import Iterable, Iterator
 
-from src.config import Settings
-from src.db import MsSql
-from src.parser import parse_mileage_response
-from src.soap_client import fetch_mileage_xml
+from src.config import CompanyProfile, Settings
+from src.db import BULK_STAGE_TABLE, QUARANTINE_TABLE, DedupIndex, MsSql, WriteThrottle, get_pool
+from src.parser import MileageBatch, UnchangedFilter, iter_mileage_batches, parse_mileage_response
+from src.sharding import fetch_sharded
+from src.soap_client import SoapClient
+from src.sinks import Archive
+from src.state import CheckpointStore, HighWaterMarks
+from src.validation import MODES as VALIDATION_MODES, BatchValidator, PreviousMileage
 from src.mail_client import send_html_mail
+from src.report import build_company_summary_mail, build_error_mail, build_range_summary_mail, build_summary_mail
+from src.logger import get_logger, setup_logging
+from src.metrics import metrics
+from src.profiling import profile_stage
 
+log = get_logger("job")
 
-def build_summary_mail(date_str: str, summary: dict, records: list[dict]) -> str:
-    rows = ""
-    for r in records:
-        rows += f"""
-        <tr>
-            <td>{r['plate']}</td>
-            <td>{r['device_id']}</td>
-            <td>{r['mileage']}</td>
-        </tr>
-        """
-
-    return f"""
-    <h3>ATS Mileage Günlük Senkronizasyon</h3>
-
-    <p><b>Tarih:</b> {date_str}</p>
-
-    <ul>
-        <li><b>Insert:</b> {summary['inserted']}</li>
-        <li><b>Skip (Duplicate):</b> {summary['skipped']}</li>
-        <li><b>Hata:</b> {summary['errors']}</li>
-    </ul>
-
-    <table border="1" cellpadding="6" cellspacing="0">
-        <tr>
-            <th>Plaka</th>
-            <th>DeviceId</th>
-            <th>KM</th>
-        </tr>
-        {rows}
-    </table>
-    """
 
 def iso_range_for_day(day: datetime) -> tuple[str, str]:
     """
@@ -63,19 +49,647 @@ def iso_range_for_day(day: datetime) -> tuple[str, str]:
     )
 
 
-def run_for_date(target_date: datetime, settings: Settings) -> dict:
+def _open_db(settings: Settings) -> MsSql:
+    """Check out a database connection from the process-wide pool."""
+    return get_pool(settings).acquire()
+
+
+def _release_db(settings: Settings, db: MsSql, *, failed: bool = False) -> None:
+    """Return a connection from _open_db to the pool (rolled back and checked if ``failed``)."""
+    get_pool(settings).release(db, failed=failed)
+    log.debug("Database connection released")
+
+
+@dataclass(frozen=True)
+class DeltaPlan:
+    """
+    What an incremental run requests for one day.
+
+    Attributes:
+        start: First second of the day not fetched and committed yet
+        end: Last second of the day
+        device_ids: Devices to request one by one, None for a fleet-wide request
+        skip: Parse-time filter of devices whose mileage is unchanged
+        synced_through: Window end recorded in the marks once the day is committed
+        replace: Devices whose row for the day was written before the day
+            closed; a newer reading replaces that row
+    """
+    start: datetime
+    end: datetime
+    device_ids: tuple[str, ...] | None
+    skip: UnchangedFilter
+    synced_through: datetime
+    replace: frozenset[str] = frozenset()
+
+    @property
+    def empty(self) -> bool:
+        """True if there is nothing left to request for the day."""
+        return self.start > self.end or self.device_ids == ()
+
+
+def _high_water(settings: Settings) -> HighWaterMarks | None:
+    """Return the high-water mark store in incremental mode, or None."""
+    if not settings.incremental:
+        return None
+    return HighWaterMarks(settings.high_water_file)
+
+
+def _plan_delta(settings: Settings, marks: HighWaterMarks | None, day: datetime) -> DeltaPlan | None:
+    """
+    Work out the window and devices an incremental run of ``day`` requests.
+
+    The window starts after the last second already synced for the day.
+    With SOAP_SHARDING and SOAP_SHARD_BY_DEVICE the configured devices are
+    requested one by one. Rows an earlier run wrote while the day was still
+    open hold a partial-day reading: devices reporting a different mileage
+    in the new window get their row replaced, the others are dropped as
+    unchanged.
+
+    Returns:
+        DeltaPlan, or None when incremental mode is off
+    """
+    if marks is None:
+        return None
+
+    date_str = day.strftime("%Y-%m-%d")
+    day_start = day.replace(hour=0, minute=0, second=0, microsecond=0)
+    end = day_start + timedelta(days=1, seconds=-1)
+    synced_through = marks.synced_through(date_str)
+    previous, synced = marks.baseline(date_str)
+
+    device_ids = None
+    if settings.soap_sharding and settings.soap_shard_by_device and settings.soap_device_ids:
+        device_ids = settings.soap_device_ids
+
+    return DeltaPlan(
+        start=synced_through + timedelta(seconds=1) if synced_through else day_start,
+        end=end,
+        device_ids=device_ids,
+        skip=UnchangedFilter(previous),
+        # Data after the fetch starts may still arrive; a later run requests it
+        synced_through=min(end, datetime.now().replace(microsecond=0)),
+        replace=frozenset(synced),
+    )
+
+
+def _advance_marks(
+    marks: HighWaterMarks,
+    plan: DeltaPlan,
+    date_str: str,
+    inserted: MileageBatch,
+    summary: dict,
+) -> None:
+    """Record the committed rows of a day as the new high-water marks."""
+    updated = marks.advance(date_str, inserted.rows(), plan.synced_through)
+    summary["unchanged"] = plan.skip.skipped
+    log.debug("%s high-water marks updated for %d devices (%d unchanged)", date_str, updated, plan.skip.skipped)
+
+
+def _fetch_batches(
+    settings: Settings,
+    client: SoapClient,
+    target_date: datetime,
+    plan: DeltaPlan | None = None,
+) -> Iterator[MileageBatch]:
+    """
+    Fetch and parse one day of mileage data.
+
+    With SOAP_SHARDING the day is fetched as concurrent shards and merged
+    per device. With SOAP_STREAMING the response is parsed incrementally
+    while it is downloaded; otherwise it is fetched whole and then parsed.
+    In incremental mode only the window and devices of ``plan`` are
+    requested and unchanged devices are dropped while parsing (after the
+    merge when sharded, since a shard only holds part of the day).
+
+    Args:
+        settings: Application configuration settings
+        client: SOAP client whose connection pool is reused
+        target_date: Day to fetch
+        plan: Incremental plan of the day, None for a full fetch
+
+    Returns:
+        Iterator of MileageBatch objects of at most settings.parse_batch_size rows
+    """
     start_iso, end_iso = iso_range_for_day(target_date)
+    skip = None
+    if plan is not None:
+        if plan.empty:
+            log.info("%s is already synced, nothing to fetch", target_date.strftime("%Y-%m-%d"))
+            return iter(())
+        start_iso = plan.start.isoformat(timespec="seconds")
+        skip = plan.skip
+    log.debug("Fetching XML from %s to %s", start_iso, end_iso)
+
+    if settings.soap_sharding:
+        with profile_stage("fetch_parse"):
+            merged = fetch_sharded(
+                client,
+                settings,
+                target_date,
+                start=plan.start if plan else None,
+                device_ids=plan.device_ids if plan else None,
+            )
+            if skip is not None:
+                merged = skip.apply(merged)
+        return merged.chunks(settings.parse_batch_size)
+
+    if settings.soap_streaming:
+        # Fetch and parse happen lazily, inside the caller's "write" stage
+        return iter_mileage_batches(client.stream(start_iso, end_iso), settings.parse_batch_size, skip=skip)
+
+    with profile_stage("fetch"):
+        xml = client.fetch(start_iso, end_iso)
+    log.debug("XML fetched successfully")
+    with profile_stage("parse"):
+        batch = parse_mileage_response(xml, skip=skip)
+    return batch.chunks(settings.parse_batch_size)
+
+
+def _load_dedup(db: MsSql, settings: Settings, start_date: str, end_date: str) -> DedupIndex | None:
+    """
+    Preload the dedup index for a window, if enabled.
+
+    Returns:
+        DedupIndex, or None when deduplication or DEDUP_CACHE is off
+    """
+    if not settings.deduplicate or settings.dedup_cache == "off":
+        return None
+    with metrics.timer("dedup_load"), profile_stage("dedup_load"):
+        return DedupIndex.load(
+            db,
+            start_date,
+            end_date,
+            mode=settings.dedup_cache,
+            error_rate=settings.dedup_bloom_error_rate,
+        )
+
+
+def _validator(db: MsSql, settings: Settings, date_str: str) -> BatchValidator | None:
+    """
+    Load the previous readings of a day and return its validator.
+
+    Returns:
+        BatchValidator, or None when VALIDATION is off
+
+    Raises:
+        ValueError: If settings.validation is not supported
+    """
+    if settings.validation not in VALIDATION_MODES:
+        raise ValueError(f"Unsupported VALIDATION: {settings.validation}")
+    if settings.validation == "off":
+        return None
+    with metrics.timer("validation_load"), profile_stage("validation_load"):
+        previous = PreviousMileage.load(db, date_str, settings.validation_lookback_days)
+    log.debug("%s previous readings loaded for %d devices", date_str, len(previous))
+    return BatchValidator(previous, max_daily_km=settings.validation_max_daily_km)
+
+
+def add_anomalies(summary: dict, parts: Iterable[dict]) -> None:
+    """Add up the validation counts of per-day (or per-company) summaries."""
+    for part in parts:
+        if "quarantined" in part:
+            summary["quarantined"] = summary.get("quarantined", 0) + part["quarantined"]
+        for reason, count in part.get("anomalies", {}).items():
+            anomalies = summary.setdefault("anomalies", {})
+            anomalies[reason] = anomalies.get(reason, 0) + count
+
+
+def _checkpoints(settings: Settings) -> CheckpointStore | None:
+    """Return the checkpoint store for chunked commits, or None in single-transaction mode."""
+    if settings.commit_batch_size <= 0:
+        return None
+    return CheckpointStore(settings.checkpoint_file)
+
+
+def _throttle(settings: Settings) -> WriteThrottle | None:
+    """Return the write rate limit of a run, or None if DB_WRITE_MAX_ROWS_PER_SEC is off."""
+    if settings.db_write_max_rows_per_sec <= 0:
+        return None
+    return WriteThrottle(settings.db_write_max_rows_per_sec)
+
+
+def _commit(db: MsSql, archive: Archive | None, dedup: DedupIndex | None = None) -> None:
+    """
+    Commit the transaction together with the archive parts and dedup keys written in it.
+
+    The parts are finished before the database commit, so a failure there
+    still rolls the whole transaction back; afterwards they only have to be
+    renamed into place.
+    """
+    if archive is not None:
+        archive.prepare()
+    db.commit()
+    if dedup is not None:
+        dedup.commit()
+    if archive is not None:
+        archive.commit()
+
+
+def _rollback(db: MsSql, archive: Archive | None, dedup: DedupIndex | None = None) -> None:
+    """Roll back the transaction, the archive parts and the dedup keys written in it."""
+    db.rollback()
+    if dedup is not None:
+        dedup.rollback()
+    if archive is not None:
+        archive.rollback()
+
+
+def _reset_counts(summary: dict, checkpoints: CheckpointStore | None, date_str: str) -> None:
+    """Reset the counts of a rolled back day to the rows its last checkpoint committed."""
+    # Rows committed before the last checkpoint stay in the table
+    committed = checkpoints.load(date_str) if checkpoints is not None else None
+    summary["inserted"] = committed["inserted"] if committed else 0
+    summary["skipped"] = committed["skipped"] if committed else 0
+    summary.pop("quarantined", None)
+    summary.pop("anomalies", None)
+
+
+def _write_batches(
+    db: MsSql,
+    batches: Iterable[MileageBatch],
+    date_str: str,
+    settings: Settings,
+    summary: dict,
+    inserted_records: MileageBatch,
+    dedup: DedupIndex | None = None,
+    checkpoints: CheckpointStore | None = None,
+    stop: threading.Event | None = None,
+    throttle: WriteThrottle | None = None,
+    validator: BatchValidator | None = None,
+    archive: Archive | None = None,
+    replace: set[str] | None = None,
+) -> bool:
+    """
+    Write every batch of one day.
+
+    Without a checkpoint store the caller commits or rolls back the whole
+    day. With one, the transaction is committed every
+    settings.commit_batch_size records and the committed offset is saved,
+    so a rerun skips the already committed prefix of the response (unless
+    RESUME_CHECKPOINTS is off). The caller still commits the tail and
+    clears the checkpoint once the day is complete.
+
+    Once ``stop`` is set, writing ends after the current batch; with a
+    checkpoint store that batch is committed and checkpointed first. With a
+    ``throttle`` every batch waits for its share of the write rate. An
+    ``archive`` is committed together with every checkpoint commit. Rows of
+    the devices in ``replace`` take the place of their existing row (see
+    _replace_rows).
+
+    Returns:
+        False if writing was stopped before the end of the day
+
+    Raises:
+        RuntimeError: If the response does not match the saved checkpoint
+    """
+    step = settings.commit_batch_size if checkpoints is not None else 0
+    resume = checkpoints.load(date_str) if step and settings.resume_checkpoints else None
+    skip = resume["offset"] if resume else 0
+    if resume:
+        summary["inserted"] += resume["inserted"]
+        summary["skipped"] += resume["skipped"]
+        summary["resumed_from"] = skip
+        log.info("%s resuming after %d committed records", date_str, skip)
+
+    parsed = 0
+    uncommitted = 0
+    for batch in batches:
+        for part in (batch.chunks(step) if step else (batch,)):
+            start = parsed
+            parsed += len(part)
+
+            if start < skip:
+                if parsed >= skip and part.device_ids[skip - 1 - start] != resume["last_device_id"]:
+                    raise RuntimeError(
+                        f"checkpoint for {date_str} does not match the response "
+                        f"(record {skip} is not {resume['last_device_id']}); rerun with --no-resume"
+                    )
+                if parsed <= skip:
+                    continue
+                part = part.take(range(skip - start, len(part)))
+
+            if throttle is not None:
+                throttle.wait(len(part))
+            _write_records(
+                db, part, date_str, settings, summary, inserted_records, dedup, validator, archive, replace
+            )
+
+            uncommitted += len(part)
+            stopping = stop is not None and stop.is_set()
+            if step and (uncommitted >= step or stopping):
+                _commit(db, archive, dedup)
+                checkpoints.save(
+                    date_str,
+                    offset=parsed,
+                    last_device_id=part.device_ids[-1],
+                    inserted=summary["inserted"],
+                    skipped=summary["skipped"],
+                )
+                uncommitted = 0
+                log.debug("%s committed through record %d", date_str, parsed)
+
+            if stopping:
+                log.warning("%s stopped after record %d (shutdown requested)", date_str, parsed)
+                close = getattr(batches, "close", None)
+                if close is not None:
+                    close()  # releases a streaming response
+                return False
+
+    if parsed < skip:
+        raise RuntimeError(
+            f"checkpoint for {date_str} is past the end of the response "
+            f"({skip} > {parsed} records); rerun with --no-resume"
+        )
+
+    log.debug("Parsed %d records", parsed)
+    return True
+
+
+def _insert_rows(
+    db: MsSql,
+    batch: MileageBatch,
+    date_str: str,
+    settings: Settings,
+    check_db: bool,
+) -> list[bool]:
+    """
+    Insert a batch using the configured write mode.
+
+    Args:
+        db: Open database connection
+        batch: Rows to insert
+        date_str: Target date in YYYY-MM-DD format
+        settings: Application configuration settings
+        check_db: Skip rows that already exist in the DB for the date
+
+    Returns:
+        One flag per row, True if it was inserted
+
+    Raises:
+        ValueError: If settings.db_write_mode is not supported
+    """
+    if settings.db_write_mode == "executemany":
+        return db.bulk_insert_km_logs(batch, date_str, deduplicate=check_db)
+
+    if settings.db_write_mode == "bulk":
+        return db.bulk_copy_km_logs(
+            batch,
+            date_str,
+            deduplicate=check_db,
+            bcp_path=settings.bcp_path,
+            batch_size=settings.bulk_batch_size,
+            tablock=settings.bulk_tablock,
+            extra_args=settings.bcp_extra_args,
+        )
+
+    if settings.db_write_mode == "row":
+        flags = []
+        for device_id, plate, mileage in batch.rows():
+            if check_db and db.exists_for_date(device_id, date_str):
+                flags.append(False)
+                continue
+
+            db.insert_km_log(
+                device_id=device_id,
+                license_plate=plate,
+                date_str=date_str,
+                mileage=mileage,
+            )
+            flags.append(True)
+        return flags
+
+    raise ValueError(f"Unsupported DB_WRITE_MODE: {settings.db_write_mode}")
+
+
+def _replace_rows(
+    db: MsSql,
+    batch: MileageBatch,
+    date_str: str,
+    settings: Settings,
+    replace: set[str],
+) -> dict[int, bool]:
+    """
+    Replace the rows an earlier run wrote for a day that was still open.
+
+    The first row of every device in ``replace`` takes the place of the
+    device's existing row for the date, in the current transaction. The
+    device is then removed from ``replace``, so later rows of it are
+    deduplicated as usual.
+
+    Returns:
+        Inserted flag per replacing row, keyed by its index in the batch
+    """
+    indices = []
+    for idx, device_id in enumerate(batch.device_ids):
+        if device_id in replace:
+            replace.discard(device_id)
+            indices.append(idx)
+    if not indices:
+        return {}
+    rows = batch.take(indices)
+    db.delete_km_logs(rows.device_ids, date_str)
+    return dict(zip(indices, _insert_rows(db, rows, date_str, settings, False)))
+
+
+def _write_records(
+    db: MsSql,
+    batch: MileageBatch,
+    date_str: str,
+    settings: Settings,
+    summary: dict,
+    inserted_records: MileageBatch,
+    dedup: DedupIndex | None = None,
+    validator: BatchValidator | None = None,
+    archive: Archive | None = None,
+    replace: set[str] | None = None,
+) -> None:
+    """
+    Validate, deduplicate and insert parsed records using the configured write mode.
+
+    Updates ``summary`` counters in place and appends every inserted row to
+    ``inserted_records`` for the summary mail. With a validator, flagged
+    rows are counted per reason in ``summary["anomalies"]`` and, in
+    quarantine mode, written to the quarantine table instead. With a
+    preloaded DedupIndex duplicates are filtered in memory; only rows the
+    index is unsure about (Bloom hits) are checked in the DB. Devices in
+    ``replace`` get their existing row replaced instead (counted in
+    ``summary["replaced"]``). The inserted rows are also written to the
+    ``archive`` sinks, if any.
+
+    Args:
+        db: Open database connection (transaction is not committed here)
+        batch: Parsed mileage records
+        date_str: Target date in YYYY-MM-DD format
+        settings: Application configuration settings
+        summary: Job summary dict to update
+        inserted_records: Collector for inserted rows
+        dedup: Preloaded dedup index for the run, if any
+        validator: Validation stage of the day, if enabled
+        archive: Archive sinks of the run, if enabled
+        replace: Devices whose row for the date is replaced (consumed here)
+
+    Raises:
+        ValueError: If settings.db_write_mode is not supported
+    """
+    if validator is not None:
+        with metrics.timer("validate"):
+            passed, flagged = validator.split(batch)
+        if flagged:
+            anomalies = summary.setdefault("anomalies", {})
+            for reason in flagged.reasons:
+                anomalies[reason] = anomalies.get(reason, 0) + 1
+            metrics.inc("records_flagged_total", len(flagged))
+            if settings.validation == "quarantine":
+                db.quarantine_km_logs(batch.take(flagged.indices), date_str, flagged.reasons, flagged.previous)
+                summary["quarantined"] = summary.get("quarantined", 0) + len(flagged)
+                batch = passed
+        if not batch:
+            return
+
+    replaced: dict[int, bool] = {}
+    rest = batch
+    if replace:
+        with metrics.timer("db_write"):
+            replaced = _replace_rows(db, batch, date_str, settings, replace)
+        if replaced:
+            rest = batch.take([idx for idx in range(len(batch)) if idx not in replaced])
+            summary["replaced"] = summary.get("replaced", 0) + len(replaced)
+            metrics.inc("rows_replaced_total", len(replaced))
+
+    if not rest:
+        flags = []
+    elif dedup is None:
+        with metrics.timer("db_write"):
+            flags = _insert_rows(db, rest, date_str, settings, settings.deduplicate)
+    else:
+        flags = [False] * len(rest)
+        with metrics.timer("dedup"):
+            new_flags, unsure_flags = dedup.partition(rest, date_str)
+        for part_flags, check_db in ((new_flags, False), (unsure_flags, True)):
+            indices = [idx for idx, selected in enumerate(part_flags) if selected]
+            if not indices:
+                continue
+            with metrics.timer("db_write"):
+                written = _insert_rows(db, rest.take(indices), date_str, settings, check_db)
+            for idx, inserted in zip(indices, written):
+                flags[idx] = inserted
+
+    if replaced:
+        others = iter(flags)
+        flags = [replaced[idx] if idx in replaced else next(others) for idx in range(len(batch))]
+
+    inserted = sum(flags)
+    inserted_batch = batch.compress(flags)
+    inserted_records.extend(inserted_batch)
+    if archive is not None:
+        archive.write(inserted_batch, date_str)
+    summary["inserted"] += inserted
+    summary["skipped"] += len(flags) - inserted
+    metrics.inc("rows_inserted_total", inserted)
+    metrics.inc("rows_skipped_total", len(flags) - inserted)
+
+
+def write_pipeline(
+    db: MsSql,
+    batches: Iterable[MileageBatch],
+    date_str: str,
+    settings: Settings,
+    summary: dict,
+    *,
+    archive: Archive | None = None,
+    commit: bool = True,
+) -> MileageBatch:
+    """
+    Write already parsed batches of one day the way a sync run does, in one transaction.
+
+    Loads the dedup index and the validator for the day, writes every batch
+    under the configured write rate and then commits the transaction (or
+    rolls it back if ``commit`` is False). Checkpoints, high-water marks and
+    mails are not touched. Used by the offline replay mode (src.replay).
+
+    Args:
+        db: Open database connection
+        batches: Parsed records of the day; lazy batches are parsed inside the "write" stage
+        date_str: Target date in YYYY-MM-DD format
+        settings: Application configuration settings
+        summary: Dictionary whose "inserted" and "skipped" counts (and
+            validation counts) are updated
+        archive: Archive sinks committed or rolled back with the transaction
+        commit: Commit the transaction; False rolls it back once written
+
+    Returns:
+        Inserted records
+
+    Raises:
+        Exception: Whatever writing raised, after the transaction is rolled back
+    """
+    inserted_records = MileageBatch()
+    dedup = None
+    try:
+        dedup = _load_dedup(db, settings, date_str, date_str)
+        validator = _validator(db, settings, date_str)
+        with profile_stage("write"):
+            _write_batches(
+                db,
+                batches,
+                date_str,
+                settings,
+                summary,
+                inserted_records,
+                dedup,
+                throttle=_throttle(settings),
+                validator=validator,
+                archive=archive,
+            )
+        with profile_stage("commit"):
+            if commit:
+                _commit(db, archive, dedup)
+            else:
+                _rollback(db, archive, dedup)
+    except Exception:
+        _rollback(db, archive, dedup)
+        raise
+    return inserted_records
+
+
+def run_for_date(
+    target_date: datetime,
+    settings: Settings,
+    *,
+    db: MsSql | None = None,
+    client: SoapClient | None = None,
+    stop: threading.Event | None = None,
+    send_summary: bool = True,
+) -> dict:
+    """
+    Run mileage synchronization for one day.
+
+    Args:
+        target_date: Day to synchronize
+        settings: Application configuration settings
+        db: Open connection to reuse; by default one is taken from the connection pool
+        client: SOAP client to reuse (its stats are reset); by default one is created and closed here
+        stop: Once set, the run ends after the current batch; what was written is
+            committed with a checkpoint, or rolled back when COMMIT_BATCH_SIZE is 0
+        send_summary: Send the summary mail (error mails are always sent)
+
+    Returns:
+        Dictionary with "inserted", "skipped" and "errors" counts and run statistics
+    """
     date_str = target_date.strftime("%Y-%m-%d")
 
-    print(f"DEBUG JOB: Starting job for date {date_str}")
+    log.info("Starting job for date %s", date_str)
+    metrics.reset()
+    started = time.perf_counter()
 
-    db = MsSql(
-        driver=settings.mssql_driver,
-        server=settings.mssql_server,
-        database=settings.mssql_database,
-        user=settings.mssql_user,
-        password=settings.mssql_password,
-    )
+    own_db = db is None
+    if own_db:
+        db = _open_db(settings)
+    own_client = client is None
+    if own_client:
+        client = SoapClient.from_settings(settings)
+    else:
+        client.stats.clear()
 
     summary = {
         "date": date_str,
@@ -84,89 +698,615 @@ def run_for_date(target_date: datetime, settings: Settings) -> dict:
         "errors": 0,
     }
 
-    inserted_records: list[dict] = []
+    inserted_records = MileageBatch()
+    checkpoints = _checkpoints(settings)
+    marks = _high_water(settings)
+    archive: Archive | None = None
+    dedup: DedupIndex | None = None
+    failure: Exception | None = None
+    resumable = False
 
     try:
-        print(f"DEBUG JOB: Fetching XML from {start_iso} to {end_iso}")
-
-        xml = fetch_mileage_xml(
-            soap_url=settings.soap_url,
-            soap_action=settings.soap_action,
-            username=settings.soap_username,
-            password=settings.soap_password,
-            company_code=settings.soap_company_code,
-            start_date=start_iso,
-            end_date=end_iso,
-        )
+        archive = Archive.from_settings(settings)
+        plan = _plan_delta(settings, marks, target_date)
+        idle = plan is not None and plan.empty
+        dedup = None if idle else _load_dedup(db, settings, date_str, date_str)
+        validator = None if idle else _validator(db, settings, date_str)
+        batches = _fetch_batches(settings, client, target_date, plan)
+        with profile_stage("write"):
+            completed = _write_batches(
+                db,
+                batches,
+                date_str,
+                settings,
+                summary,
+                inserted_records,
+                dedup,
+                checkpoints,
+                stop,
+                throttle=_throttle(settings),
+                validator=validator,
+                archive=archive,
+                replace=set(plan.replace) if plan is not None else None,
+            )
 
-        print("DEBUG JOB: XML fetched successfully")
+        with profile_stage("commit"):
+            if completed or checkpoints is not None:
+                _commit(db, archive, dedup)
+            else:
+                # Without a checkpoint a rerun cannot skip a committed prefix,
+                # so an interrupted day is written again from the start
+                _rollback(db, archive, dedup)
+                _reset_counts(summary, checkpoints, date_str)
+                inserted_records = MileageBatch()
+        if not completed:
+            # The checkpointed prefix is skipped on the next run
+            summary["interrupted"] = True
+        else:
+            if checkpoints is not None:
+                checkpoints.clear(date_str)
+            if plan is not None:
+                _advance_marks(marks, plan, date_str, inserted_records, summary)
+        log.debug("Commit successful (%d rows)", summary["inserted"])
 
-        records = parse_mileage_response(xml)
-        print(f"DEBUG JOB: Parsed {len(records)} records")
+    except Exception as e:
+        failure = e
+        _rollback(db, archive, dedup)
+        _reset_counts(summary, checkpoints, date_str)
+        summary["errors"] += 1
+        inserted_records = MileageBatch()
 
-        for r in records:
-            if not r.device_id:
-                continue
+        log.exception("Job failed for %s: %s", date_str, e)
+        resumable = checkpoints is not None and bool(checkpoints.load(date_str))
+        if resumable:
+            log.info("Checkpoint kept in %s, rerun to resume", checkpoints.path)
 
-            if settings.deduplicate and db.exists_for_date(r.device_id, date_str):
-                summary["skipped"] += 1
-                continue
+    finally:
+        if archive is not None:
+            archive.close()
+        if own_client:
+            client.close()
+        if own_db:
+            _release_db(settings, db, failed=failure is not None)
 
-            db.insert_km_log(
-                device_id=r.device_id,
-                license_plate=r.license_plate,
-                date_str=date_str,
-                mileage=r.mileage,
+    # Mail is rendered and queued after the connection is released; delivery
+    # runs on the mail thread (see src/mail_client.py)
+    if failure is not None:
+        with metrics.timer("mail"), profile_stage("mail"):
+            send_html_mail(
+                subject=f"ATS Mileage | {date_str} | HATA",
+                html_body=build_error_mail(date_str, summary, failure, resumable=resumable),
+            )
+    elif send_summary and summary["inserted"] > 0:
+        summary["metrics"] = metrics.snapshot()
+        with metrics.timer("mail"), profile_stage("mail"):
+            html, attachments = build_summary_mail(
+                date_str, summary, inserted_records, max_rows=settings.mail_max_rows
+            )
+            send_html_mail(
+                subject=f"ATS Mileage | {date_str} | {summary['inserted']} kayıt",
+                html_body=html,
+                attachments=attachments,
             )
 
-            inserted_records.append({
-                "device_id": r.device_id,
-                "plate": r.license_plate,
-                "mileage": r.mileage,
-            })
+    summary["soap_seconds"] = round(sum(s.elapsed_sec for s in client.stats), 3)
+    summary["soap_bytes"] = sum(s.wire_bytes for s in client.stats)
+    _finish_metrics(settings, summary, started)
 
-            summary["inserted"] += 1
+    log.info(
+        "Completed | Inserted=%d Skipped=%d Errors=%d",
+        summary["inserted"],
+        summary["skipped"],
+        summary["errors"],
+    )
 
-        db.commit()
-        print(f"DEBUG JOB: Commit successful ({summary['inserted']} rows)")
+    return summary
 
-        if summary["inserted"] > 0:
-            html = build_summary_mail(
-                date_str=date_str,
-                summary=summary,
-                records=inserted_records,
-            )
 
+def _finish_metrics(settings: Settings, summary: dict, started: float) -> None:
+    """Record run totals, attach the metrics snapshot to the summary and export it."""
+    metrics.observe("run_seconds", time.perf_counter() - started)
+    for key in ("inserted", "skipped", "errors"):
+        metrics.set_gauge(f"last_run_{key}", summary[key])
+    metrics.set_gauge("last_run_timestamp_seconds", time.time())
+    summary["metrics"] = metrics.snapshot()
+
+    if settings.metrics_file:
+        try:
+            metrics.export(settings.metrics_file, settings.metrics_format)
+        except OSError as e:
+            log.warning("Metrics export to %s failed: %s", settings.metrics_file, e)
+
+
+def _fetch_day(
+    settings: Settings,
+    client: SoapClient,
+    day: datetime,
+    plan: DeltaPlan | None = None,
+) -> MileageBatch:
+    """Fetch and fully parse one day (runs on a worker thread)."""
+    batch = MileageBatch()
+    for part in _fetch_batches(settings, client, day, plan):
+        batch.extend(part)
+    return batch
+
+
+def run_for_range(
+    start_date: datetime,
+    end_date: datetime,
+    settings: Settings,
+    *,
+    db: MsSql | None = None,
+) -> dict:
+    """
+    Run mileage synchronization for every day in an inclusive date range.
+
+    SOAP fetch and parse run concurrently on a bounded thread pool
+    (settings.fetch_concurrency workers, at most twice that many days in
+    flight). The calling thread is the single writer: it takes finished
+    days as they complete, writes them over one reused connection and
+    commits per day, so a failing day is rolled back without affecting the
+    others. One aggregated summary mail is sent at the end.
+
+    In incremental mode every day is planned against the high-water marks
+    as they were when its fetch was submitted, and the marks move forward
+    as each day commits.
+
+    Args:
+        start_date: First day (inclusive)
+        end_date: Last day (inclusive)
+        settings: Application configuration settings
+        db: Open connection to reuse; by default one is taken from the connection pool
+
+    Returns:
+        Dictionary with range totals and a per-day "days" list
+        (each entry has the same format as run_for_date)
+
+    Raises:
+        ValueError: If end_date is before start_date
+    """
+    if end_date < start_date:
+        raise ValueError("end date must not be before start date")
+
+    days = [
+        start_date + timedelta(days=offset)
+        for offset in range((end_date - start_date).days + 1)
+    ]
+    concurrency = max(1, settings.fetch_concurrency)
+
+    summary = {
+        "from": days[0].strftime("%Y-%m-%d"),
+        "to": days[-1].strftime("%Y-%m-%d"),
+        "inserted": 0,
+        "skipped": 0,
+        "errors": 0,
+        "days": [],
+    }
+    inserted_by_day: dict[str, MileageBatch] = {}
+
+    log.info(
+        "Starting range job %s - %s (%d days, concurrency=%d)",
+        summary["from"],
+        summary["to"],
+        len(days),
+        concurrency,
+    )
+    metrics.reset()
+    started = time.perf_counter()
+
+    own_db = db is None
+    if own_db:
+        db = _open_db(settings)
+    shard_factor = settings.soap_shard_concurrency if settings.soap_sharding else 1
+    client = SoapClient.from_settings(settings, pool_size=concurrency * max(1, shard_factor))
+
+    checkpoints = _checkpoints(settings)
+    marks = _high_water(settings)
+    throttle = _throttle(settings)
+    archive = None
+    failed = True
+
+    try:
+        archive = Archive.from_settings(settings)
+        dedup = _load_dedup(db, settings, summary["from"], summary["to"])
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="soap-fetch") as pool:
+            pending: dict[Future, tuple[datetime, DeltaPlan | None]] = {}
+            remaining = iter(days)
+
+            def _fill():
+                for day in remaining:
+                    plan = _plan_delta(settings, marks, day)
+                    pending[pool.submit(_fetch_day, settings, client, day, plan)] = day, plan
+                    if len(pending) >= concurrency * 2:
+                        break
+
+            _fill()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    day, plan = pending.pop(future)
+                    day_summary, inserted = _write_day(
+                        db, day, future.result, settings, dedup, checkpoints, marks, plan, throttle, archive
+                    )
+                    summary["days"].append(day_summary)
+                    if inserted:
+                        inserted_by_day[day_summary["date"]] = inserted
+                _fill()
+        failed = False
+    finally:
+        if archive is not None:
+            archive.close()
+        client.close()
+        if own_db:
+            _release_db(settings, db, failed=failed)
+
+    summary["days"].sort(key=lambda d: d["date"])
+    for key in ("inserted", "skipped", "errors"):
+        summary[key] = sum(d[key] for d in summary["days"])
+    if marks is not None:
+        summary["unchanged"] = sum(d.get("unchanged", 0) for d in summary["days"])
+    add_anomalies(summary, summary["days"])
+    summary["soap_seconds"] = round(sum(s.elapsed_sec for s in client.stats), 3)
+    summary["soap_bytes"] = sum(s.wire_bytes for s in client.stats)
+
+    if summary["inserted"] > 0 or summary["errors"] > 0:
+        summary["metrics"] = metrics.snapshot()
+        with metrics.timer("mail"), profile_stage("mail"):
+            html, attachments = build_range_summary_mail(
+                summary, inserted_by_day, max_rows=settings.mail_max_rows
+            )
             send_html_mail(
-                subject=f"ATS Mileage | {date_str} | {summary['inserted']} kayıt",
+                subject=(
+                    f"ATS Mileage | {summary['from']} - {summary['to']} | "
+                    f"{summary['inserted']} kayıt"
+                ),
                 html_body=html,
+                attachments=attachments,
             )
+    _finish_metrics(settings, summary, started)
+
+    log.info(
+        "Range completed | Inserted=%d Skipped=%d Errors=%d",
+        summary["inserted"],
+        summary["skipped"],
+        summary["errors"],
+    )
+
+    return summary
+
 
+def _write_day(
+    db: MsSql,
+    day: datetime,
+    fetched: Callable[[], MileageBatch],
+    settings: Settings,
+    dedup: DedupIndex | None = None,
+    checkpoints: CheckpointStore | None = None,
+    marks: HighWaterMarks | None = None,
+    plan: DeltaPlan | None = None,
+    throttle: WriteThrottle | None = None,
+    archive: Archive | None = None,
+    label: str = "",
+) -> tuple[dict, MileageBatch]:
+    """
+    Write one fetched day of a range or multi-company run and commit it (writer thread).
+
+    ``fetched`` returns the day's records, re-raising a fetch error so the
+    day is counted as failed. ``label`` (e.g. the company) prefixes the log lines.
+    """
+    date_str = day.strftime("%Y-%m-%d")
+    name = f"{label} {date_str}" if label else date_str
+    summary = {
+        "date": date_str,
+        "inserted": 0,
+        "skipped": 0,
+        "errors": 0,
+    }
+    inserted_records = MileageBatch()
+
+    try:
+        batch = fetched()
+        validator = _validator(db, settings, date_str) if batch else None
+        with profile_stage("write"):
+            _write_batches(
+                db,
+                batch.chunks(settings.parse_batch_size),
+                date_str,
+                settings,
+                summary,
+                inserted_records,
+                dedup,
+                checkpoints,
+                throttle=throttle,
+                validator=validator,
+                archive=archive,
+                replace=set(plan.replace) if plan is not None else None,
+            )
+        with profile_stage("commit"):
+            _commit(db, archive, dedup)
+        if checkpoints is not None:
+            checkpoints.clear(date_str)
+        if plan is not None:
+            _advance_marks(marks, plan, date_str, inserted_records, summary)
+        log.info("%s commit successful (%d rows)", name, summary["inserted"])
     except Exception as e:
-        db.rollback()
+        _rollback(db, archive, dedup)
+        _reset_counts(summary, checkpoints, date_str)
         summary["errors"] += 1
+        inserted_records = MileageBatch()
+        log.exception("%s failed: %s", name, e)
 
-        print(f"❌ DEBUG JOB ERROR: {str(e)}")
+    return summary, inserted_records
 
-        send_html_mail(
-            subject=f"ATS Mileage | {date_str} | {summary['inserted']} kayıt",
-            html_body=html
-        )
 
+@dataclass(frozen=True)
+class CompanyFetch:
+    """
+    Result of fetching one company-day in a worker process.
+
+    Attributes:
+        batch: Parsed records
+        unchanged: Records dropped by the incremental filter
+        soap_seconds: Time spent in SOAP requests
+        soap_bytes: Bytes received from the SOAP service
+    """
+    batch: MileageBatch
+    unchanged: int
+    soap_seconds: float
+    soap_bytes: int
+
+
+def _init_company_worker(settings: Settings) -> None:
+    """Set up logging in a fetch worker process (handlers of the parent do not carry over)."""
+    setup_logging(
+        settings.log_level,
+        module_levels=settings.log_levels,
+        log_file=settings.log_file,
+        json_format=settings.log_json,
+        console=settings.log_console,
+    )
+    metrics.enabled = False  # worker metrics are never exported
+
+
+def _fetch_company(settings: Settings, day: datetime, plan: DeltaPlan | None) -> CompanyFetch:
+    """Fetch and parse one company-day (runs in a worker process)."""
+    client = SoapClient.from_settings(settings)
+    try:
+        batch = _fetch_day(settings, client, day, plan)
+    finally:
+        client.close()
+    return CompanyFetch(
+        batch=batch,
+        unchanged=plan.skip.skipped if plan is not None else 0,
+        soap_seconds=sum(s.elapsed_sec for s in client.stats),
+        soap_bytes=sum(s.wire_bytes for s in client.stats),
+    )
+
+
+def _company_batch(future: Future, plan: DeltaPlan | None, totals: dict) -> MileageBatch:
+    """Unpack a worker result into the company totals and return its records."""
+    fetched: CompanyFetch = future.result()
+    totals["soap_seconds"] += fetched.soap_seconds
+    totals["soap_bytes"] += fetched.soap_bytes
+    if plan is not None:
+        # The filter counted in the worker's copy of the plan
+        plan.skip.skipped = fetched.unchanged
+    return fetched.batch
+
+
+def run_for_companies(
+    start_date: datetime,
+    end_date: datetime,
+    settings: Settings,
+    profiles: list[CompanyProfile],
+    *,
+    db: MsSql | None = None,
+) -> dict:
+    """
+    Run mileage synchronization for several companies over an inclusive date range.
+
+    SOAP fetch and lxml parsing are CPU-bound per company, so every
+    company-day is fetched and parsed in its own worker process
+    (settings.company_workers, default one per CPU; at most twice that
+    many in flight). The calling process is the single writer shared by
+    all companies: it writes finished company-days over one pooled
+    connection, commits each separately (a failing company-day is rolled
+    back without affecting the others) and, with DB_WRITE_MAX_ROWS_PER_SEC,
+    paces the writes. One consolidated summary mail with a per-company
+    breakdown is sent at the end.
+
+    Args:
+        start_date: First day (inclusive)
+        end_date: Last day (inclusive)
+        settings: Shared settings (database, mail, tuning)
+        profiles: Companies to synchronize, see load_company_profiles
+        db: Open connection to reuse; by default one is taken from the connection pool
+
+    Returns:
+        Dictionary with run totals and a per-company "companies" list,
+        each with its own totals and "days" entries
+
+    Raises:
+        ValueError: If end_date is before start_date or there are no profiles
+    """
+    if end_date < start_date:
+        raise ValueError("end date must not be before start date")
+    if not profiles:
+        raise ValueError("no company profiles")
+
+    days = [
+        start_date + timedelta(days=offset)
+        for offset in range((end_date - start_date).days + 1)
+    ]
+    # Day-major order: all companies of a day finish before the next day starts
+    tasks = [(profile, day) for day in days for profile in profiles]
+    workers = max(1, min(settings.company_workers or os.cpu_count() or 1, len(tasks)))
+
+    summary = {
+        "from": days[0].strftime("%Y-%m-%d"),
+        "to": days[-1].strftime("%Y-%m-%d"),
+        "inserted": 0,
+        "skipped": 0,
+        "errors": 0,
+        "companies": [],
+    }
+    companies = {
+        profile.name: {
+            "company": profile.name,
+            "inserted": 0,
+            "skipped": 0,
+            "errors": 0,
+            "soap_seconds": 0.0,
+            "soap_bytes": 0,
+            "days": [],
+        }
+        for profile in profiles
+    }
+    inserted_by_company: dict[tuple[str, str], MileageBatch] = {}
+
+    log.info(
+        "Starting multi-company job %s - %s (%d companies, %d days, workers=%d)",
+        summary["from"],
+        summary["to"],
+        len(profiles),
+        len(days),
+        workers,
+    )
+    metrics.reset()
+    started = time.perf_counter()
+
+    own_db = db is None
+    if own_db:
+        db = _open_db(settings)
+    checkpoints = {p.name: _checkpoints(p.settings) for p in profiles}
+    marks = {p.name: _high_water(p.settings) for p in profiles}
+    throttle = _throttle(settings)
+    archives: dict[str, Archive | None] = {}
+    failed = True
+
+    try:
+        archives = {p.name: Archive.from_settings(p.settings, company=p.name) for p in profiles}
+        # One index for all companies: they share dbo.arac_km_log
+        dedup = _load_dedup(db, settings, summary["from"], summary["to"])
+
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_company_worker, initargs=(settings,)
+        ) as pool:
+            pending: dict[Future, tuple[CompanyProfile, datetime, DeltaPlan | None]] = {}
+            remaining = iter(tasks)
+
+            def _fill():
+                for profile, day in remaining:
+                    plan = _plan_delta(profile.settings, marks[profile.name], day)
+                    future = pool.submit(_fetch_company, profile.settings, day, plan)
+                    pending[future] = profile, day, plan
+                    if len(pending) >= workers * 2:
+                        break
+
+            _fill()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    profile, day, plan = pending.pop(future)
+                    totals = companies[profile.name]
+                    day_summary, inserted = _write_day(
+                        db,
+                        day,
+                        partial(_company_batch, future, plan, totals),
+                        profile.settings,
+                        dedup,
+                        checkpoints[profile.name],
+                        marks[profile.name],
+                        plan,
+                        throttle,
+                        archives[profile.name],
+                        label=profile.name,
+                    )
+                    totals["days"].append(day_summary)
+                    if inserted:
+                        inserted_by_company[profile.name, day_summary["date"]] = inserted
+                _fill()
+        failed = False
     finally:
-        db.close()
-        print("DEBUG JOB: Database connection closed")
-
-    print(
-        f"DEBUG JOB: Completed | "
-        f"Inserted={summary['inserted']} "
-        f"Skipped={summary['skipped']} "
-        f"Errors={summary['errors']}"
+        for archive in archives.values():
+            if archive is not None:
+                archive.close()
+        if own_db:
+            _release_db(settings, db, failed=failed)
+
+    for totals in companies.values():
+        totals["days"].sort(key=lambda d: d["date"])
+        for key in ("inserted", "skipped", "errors"):
+            totals[key] = sum(d[key] for d in totals["days"])
+        if marks[totals["company"]] is not None:
+            totals["unchanged"] = sum(d.get("unchanged", 0) for d in totals["days"])
+        add_anomalies(totals, totals["days"])
+        totals["soap_seconds"] = round(totals["soap_seconds"], 3)
+        summary["companies"].append(totals)
+    for key in ("inserted", "skipped", "errors", "soap_bytes"):
+        summary[key] = sum(c[key] for c in summary["companies"])
+    summary["soap_seconds"] = round(sum(c["soap_seconds"] for c in summary["companies"]), 3)
+    if any(m is not None for m in marks.values()):
+        summary["unchanged"] = sum(c.get("unchanged", 0) for c in summary["companies"])
+    add_anomalies(summary, summary["companies"])
+    if throttle is not None:
+        summary["throttled_seconds"] = round(throttle.waited_sec, 3)
+
+    if summary["inserted"] > 0 or summary["errors"] > 0:
+        summary["metrics"] = metrics.snapshot()
+        period = summary["from"] if summary["from"] == summary["to"] else f"{summary['from']} - {summary['to']}"
+        with metrics.timer("mail"), profile_stage("mail"):
+            html, attachments = build_company_summary_mail(
+                summary, inserted_by_company, max_rows=settings.mail_max_rows
+            )
+            send_html_mail(
+                subject=(
+                    f"ATS Mileage | {period} | {len(profiles)} şirket | "
+                    f"{summary['inserted']} kayıt"
+                    + (f" | {summary['errors']} HATA" if summary["errors"] else "")
+                ),
+                html_body=html,
+                attachments=attachments,
+            )
+    _finish_metrics(settings, summary, started)
+
+    log.info(
+        "Multi-company job completed | Inserted=%d Skipped=%d Errors=%d",
+        summary["inserted"],
+        summary["skipped"],
+        summary["errors"],
     )
 
     return summary
 
 
+def run_db_init(settings: Settings, *, unique: bool = False, report_only: bool = False) -> dict:
+    """
+    Create/validate the dedup indexes and report index usage.
+
+    Args:
+        settings: Application configuration settings
+        unique: Also create the filtered unique index on (DeviceId, [Date])
+        report_only: Only report, do not create anything
+
+    Returns:
+        Dictionary with "actions" (index checks) and "indexes" (usage report)
+    """
+    with get_pool(settings).connection() as db:
+        actions = [] if report_only else db.ensure_indexes(unique=unique)
+        if settings.db_write_mode == "bulk" and not report_only:
+            db.ensure_bulk_stage()
+            actions.append(f"ok {BULK_STAGE_TABLE}")
+        if settings.validation == "quarantine" and not report_only:
+            db.ensure_quarantine_table()
+            actions.append(f"ok {QUARANTINE_TABLE}")
+        db.commit()
+        indexes = db.index_report()
+
+    return {"actions": actions, "indexes": indexes}
+
+
 def run_yesterday(settings: Settings) -> dict:
     """
     Run mileage synchronization job for yesterday's date.
@@ -178,5 +1318,5 @@ def run_yesterday(settings: Settings) -> dict:
         Dictionary with job summary (same format as run_for_date)
     """
     yesterday = datetime.now() - timedelta(days=1)
-    print(f"DEBUG JOB: Running for yesterday ({yesterday.strftime('%Y-%m-%d')})")
+    log.debug("Running for yesterday (%s)", yesterday.strftime("%Y-%m-%d"))
     return run_for_date(yesterday, settings)
@@ -1,84 +1,185 @@
 """
 Logger module for ATS Mileage Sync application.
 
-This module provides logging functionality with file output and optional email notifications.
-It includes configuration for SMTP mail settings and public API functions for different log levels.
+All modules log through child loggers of ``ATS_MILEAGE`` (see get_logger),
+so messages are level-gated before any formatting happens. setup_logging
+attaches a QueueHandler; the file and console handlers run on a
+QueueListener thread, keeping file I/O off the job threads. Output is
+plain text or one JSON object per line, and levels can be set per module.
+It also keeps the legacy log_info/log_error/log_debug helpers, including
+the optional error e-mail (sent asynchronously by src.mail_client).
 """
 
+import atexit
+import json
 import logging
 import os
-import smtplib
-from email.message import EmailMessage
+import queue
+import sys
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING
 
-from dotenv import load_dotenv
-load_dotenv()
+if TYPE_CHECKING:
+    from logging.handlers import QueueListener
 
 
 # =========================
-# Mail Logger Config
+# Logger Setup
 # =========================
-MAIL_ENABLED = os.getenv("MAIL_LOG_ENABLED", "false").lower() in ("1", "true", "yes")
+ROOT_LOGGER = "ATS_MILEAGE"
+LOG_FORMAT = "%(asctime)s | %(levelname)s | %(name)s | %(message)s"
+CONSOLE_FORMAT = "%(levelname)s %(name)s: %(message)s"
 
-SMTP_HOST = os.getenv("SMTP_HOST")
-SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
-SMTP_USER = os.getenv("SMTP_USER")
-SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+logger = logging.getLogger(ROOT_LOGGER)
+log = logging.getLogger(f"{ROOT_LOGGER}.logger")
 
-MAIL_FROM = os.getenv("MAIL_FROM")
-MAIL_TO = os.getenv("MAIL_TO")  # comma-separated list allowed
+_listener: "QueueListener | None" = None
+_atexit_registered = False
 
 
-# =========================
-# File Logger Setup
-# =========================
-logger = logging.getLogger("ATS_MILEAGE")
-logger.setLevel(logging.DEBUG)
+def get_logger(name: str) -> logging.Logger:
+    """
+    Return the logger of an application module.
 
-handler = logging.FileHandler("ats_mileage.log", encoding="utf-8")
-formatter = logging.Formatter(
-    "%(asctime)s | %(levelname)s | %(message)s"
-)
-handler.setFormatter(formatter)
+    Args:
+        name: Short module name, e.g. "parser" -> ``ATS_MILEAGE.parser``
+    """
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
 
-if not logger.handlers:
-    logger.addHandler(handler)
 
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line."""
 
-# =========================
-# Mail Sender Function
-# =========================
-def _send_mail(subject: str, body: str):
-    if not MAIL_ENABLED:
-        print(f"DEBUG MAIL: Mail disabled, skipping email for subject: {subject}")
-        return
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def parse_levels(spec: str) -> dict[str, int]:
+    """
+    Parse a per-module level spec such as ``"parser=WARNING,db=DEBUG"``.
+
+    Returns:
+        Mapping of short module name to logging level
+
+    Raises:
+        ValueError: If an entry is malformed or names an unknown level
+    """
+    levels = {}
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, sep, level = entry.partition("=")
+        value = logging.getLevelName(level.strip().upper())
+        if not sep or not name.strip() or not isinstance(value, int):
+            raise ValueError(f"Invalid log level entry: {entry!r}")
+        levels[name.strip()] = value
+    return levels
+
+
+def setup_logging(
+    level: str = "INFO",
+    *,
+    module_levels: str = "",
+    log_file: str | None = "ats_mileage.log",
+    json_format: bool = False,
+    console: bool = True,
+) -> None:
+    """
+    Configure the application loggers.
 
-    if not all([SMTP_HOST, SMTP_USER, SMTP_PASSWORD, MAIL_FROM, MAIL_TO]):
-        print("❌ DEBUG MAIL ERROR: Missing SMTP env vars")
-        logger.error("MAIL CONFIG ERROR | Missing SMTP env vars")
+    Safe to call more than once; the previous listener is stopped and its
+    handlers are replaced.
+
+    Args:
+        level: Default level for all modules (e.g. "INFO", "DEBUG")
+        module_levels: Per-module overrides, see parse_levels
+        log_file: Log file path, or None/"" to disable file output
+        json_format: Emit one JSON object per line instead of plain text
+        console: Also log to stderr
+
+    Raises:
+        ValueError: If a level name is unknown
+    """
+    global _listener, _atexit_registered
+
+    root_level = logging.getLevelName(level.upper())
+    if not isinstance(root_level, int):
+        raise ValueError(f"Invalid log level: {level!r}")
+    overrides = parse_levels(module_levels)
+
+    shutdown_logging()
+
+    logger.setLevel(root_level)
+    logger.propagate = False
+    for name, module_level in overrides.items():
+        get_logger(name).setLevel(module_level)
+
+    handlers: list[logging.Handler] = []
+    if log_file:
+        file_handler = logging.FileHandler(log_file, encoding="utf-8")
+        file_handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(LOG_FORMAT))
+        handlers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler(sys.stderr)
+        console_handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(CONSOLE_FORMAT))
+        handlers.append(console_handler)
+
+    if not handlers:
+        logger.addHandler(logging.NullHandler())
         return
 
-    print(f"DEBUG MAIL: Connecting to SMTP {SMTP_HOST}:{SMTP_PORT}")
+    # logging.handlers pulls in socket and pickle; only load it when needed
+    from logging.handlers import QueueHandler, QueueListener
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    logger.addHandler(QueueHandler(log_queue))
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+    if not _atexit_registered:
+        atexit.register(shutdown_logging)
+        _atexit_registered = True
 
-    msg = EmailMessage()
-    msg["From"] = MAIL_FROM
-    msg["To"] = [x.strip() for x in MAIL_TO.split(",")]
-    msg["Subject"] = subject
-    msg.set_content(body)
 
-    try:
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30) as server:
-            server.set_debuglevel(1)  # 🔥 çok önemli
-            server.ehlo()
-            server.starttls()
-            server.ehlo()
-            server.login(SMTP_USER, SMTP_PASSWORD)
-            server.send_message(msg)
+def shutdown_logging() -> None:
+    """Flush pending records, stop the listener thread and detach handlers."""
+    global _listener
 
-        print("✅ DEBUG MAIL: Email sent successfully")
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
 
-    except Exception as e:
-        print(f"❌ DEBUG MAIL ERROR: {e}")
-        logger.error(f"MAIL SEND ERROR | {str(e)}")
+    for handler in logger.handlers[:]:
+        logger.removeHandler(handler)
+        handler.close()
+
+
+# =========================
+# Error Mail
+# =========================
+def _send_mail(subject: str, body: str):
+    """Queue an error mail through the shared mailer (see src/mail_client.py)."""
+    # Imported here: mail_client itself logs through this module
+    from .config import load_env
+    from .mail_client import send_text_mail
+
+    load_env()
+    if os.getenv("MAIL_LOG_ENABLED", "false").lower() not in ("1", "true", "yes"):
+        log.debug("Mail disabled, skipping email for subject: %s", subject)
+        return
+    send_text_mail(subject, body)
 
 
 # =========================
@@ -88,24 +189,20 @@ def log_info(message: str):
     """
     Log an informational message.
 
-    Logs the message to file and sends an email notification.
-
     Args:
         message: The informational message to log
     """
-    print(f"DEBUG LOG_INFO: {message}")
     logger.info(message)
 
 def log_error(message: str):
     """
     Log an error message.
 
-    Logs the message to file and sends an email notification.
+    Logs the message and sends an email notification (if MAIL_LOG_ENABLED).
 
     Args:
         message: The error message to log
     """
-    print(f"DEBUG LOG_ERROR: {message}")
     logger.error(message)
     _send_mail(
         subject="ATS Mileage | ERROR",
@@ -117,11 +214,9 @@ def log_debug(message: str):
     """
     Log a debug message.
 
-    Logs the message to file only (no email notification for debug messages).
+    Debug messages never trigger an email notification.
 
     Args:
         message: The debug message to log
     """
-    print(f"DEBUG LOG_DEBUG: {message}")
     logger.debug(message)
-    # Debug messages typically don't need email notifications
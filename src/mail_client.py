@@ -1,30 +1,301 @@
+"""
+Mail delivery for ATS Mileage Sync.
+
+All mail (the summary mails of the job and the error mails of
+logger.log_error) goes through one process-wide Mailer. Messages are queued
+and sent by a background thread over a single SMTP connection that is
+kept open between messages and closed after MAIL_IDLE_SEC of inactivity.
+Failed sends are retried with exponential backoff, reconnecting first, so
+a slow or flaky SMTP server never holds up the job. Pending mail is flushed
+at interpreter exit, bounded by MAIL_FLUSH_TIMEOUT_SEC.
+"""
+
+import atexit
 import os
-import smtplib
-from email.mime.text import MIMEText
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Iterable
+
+from .config import load_env
+from .logger import get_logger
+from .metrics import metrics
+
+if TYPE_CHECKING:
+    import smtplib
+    from email.message import EmailMessage
+
+log = get_logger("mail")
+
+_TRUE = ("1", "true", "yes", "y")
+
+
+@dataclass(frozen=True, slots=True)
+class Attachment:
+    """A file attached to a mail."""
+    filename: str
+    data: bytes
+    mime_type: str = "application/gzip"
+
+
+@dataclass(frozen=True)
+class SmtpConfig:
+    """SMTP transport settings, read from the environment."""
+    host: str
+    port: int
+    user: str | None
+    password: str | None
+    mail_from: str | None
+    mail_to: tuple[str, ...]
+    starttls: bool = True
+    timeout_sec: float = 30.0
+    retries: int = 3
+    backoff_sec: float = 2.0
+    idle_sec: float = 60.0
+    flush_timeout_sec: float = 30.0
+
+    @classmethod
+    def from_env(cls) -> "SmtpConfig":
+        load_env()
+        return cls(
+            host=os.getenv("SMTP_HOST", "smtp.gmail.com"),
+            port=int(os.getenv("SMTP_PORT", "587")),
+            user=os.getenv("SMTP_USER"),
+            password=os.getenv("SMTP_PASSWORD"),
+            mail_from=os.getenv("MAIL_FROM"),
+            mail_to=tuple(x.strip() for x in os.getenv("MAIL_TO", "").split(",") if x.strip()),  # virgüllü olabilir
+            starttls=os.getenv("SMTP_STARTTLS", "true").lower() in _TRUE,
+            timeout_sec=float(os.getenv("SMTP_TIMEOUT_SEC", "30")),
+            retries=int(os.getenv("MAIL_RETRIES", "3")),
+            backoff_sec=float(os.getenv("MAIL_BACKOFF_SEC", "2")),
+            idle_sec=float(os.getenv("MAIL_IDLE_SEC", "60")),
+            flush_timeout_sec=float(os.getenv("MAIL_FLUSH_TIMEOUT_SEC", "30")),
+        )
+
+    @property
+    def complete(self) -> bool:
+        """True when everything needed to send is configured."""
+        return all([self.host, self.user, self.password, self.mail_from, self.mail_to])
+
+
+_STOP = object()
+
+
+class Mailer:
+    """
+    Background sender with a reusable SMTP connection and retry.
+
+    submit() only builds the message and queues it; the worker thread is
+    started on first use.
+    """
+
+    def __init__(self, config: SmtpConfig):
+        self.config = config
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._smtp: "smtplib.SMTP | None" = None
+        self._pending = 0
+        self._idle = threading.Condition(self._lock)
+
+    def submit(
+        self,
+        subject: str,
+        body: str,
+        *,
+        subtype: str = "html",
+        attachments: Iterable[Attachment] = (),
+    ) -> Future:
+        """
+        Queue a mail for delivery.
+
+        Args:
+            subject: Mail subject
+            body: Mail body
+            subtype: Body subtype, "html" or "plain"
+            attachments: Files to attach
+
+        Returns:
+            Future resolved with None once the mail is sent, or with the last
+            exception when every attempt failed
+        """
+        future: Future = Future()
+        message = self._build(subject, body, subtype, attachments)
+        with self._lock:
+            self._pending += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="mail-sender", daemon=True)
+                self._thread.start()
+        self._queue.put((message, future))
+        return future
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        Wait until all queued mail has been handled.
+
+        Returns:
+            False if mail was still pending when the timeout expired
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self, timeout: float | None = None) -> None:
+        """Flush, stop the worker thread and close the SMTP connection."""
+        if not self.flush(timeout):
+            log.warning("Mail queue not drained within %ss, %d mail(s) dropped", timeout, self._pending)
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def _build(self, subject: str, body: str, subtype: str, attachments: Iterable[Attachment]) -> "EmailMessage":
+        from email.message import EmailMessage
+
+        msg = EmailMessage()
+        msg["From"] = self.config.mail_from
+        msg["To"] = ", ".join(self.config.mail_to)
+        msg["Subject"] = subject
+        msg.set_content(body, subtype=subtype, charset="utf-8")
+        for attachment in attachments:
+            maintype, _, subtype = attachment.mime_type.partition("/")
+            msg.add_attachment(attachment.data, maintype=maintype, subtype=subtype, filename=attachment.filename)
+        return msg
+
+    def _run(self) -> None:
+        while True:
+            try:
+                item = self._queue.get(timeout=self.config.idle_sec)
+            except queue.Empty:
+                self._disconnect()
+                continue
+            if item is _STOP:
+                self._disconnect()
+                return
+
+            message, future = item
+            try:
+                self._deliver(message)
+            except Exception as e:
+                metrics.inc("mail_failed_total")
+                log.error("MAIL SEND ERROR | %s | %s", message["Subject"], e)
+                future.set_exception(e)
+            else:
+                metrics.inc("mail_sent_total")
+                log.info("Mail sent: %s", message["Subject"])
+                future.set_result(None)
+            finally:
+                with self._idle:
+                    self._pending -= 1
+                    self._idle.notify_all()
+
+    def _deliver(self, message: "EmailMessage") -> None:
+        import smtplib
+
+        attempts = self.config.retries + 1
+        for attempt in range(1, attempts + 1):
+            started = time.perf_counter()
+            try:
+                if self._smtp is None:
+                    self._connect()
+                self._smtp.send_message(message)
+                metrics.observe("mail_send_seconds", time.perf_counter() - started)
+                return
+            except (smtplib.SMTPAuthenticationError, smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused):
+                self._disconnect()
+                raise
+            except (smtplib.SMTPException, OSError) as e:
+                # Stale or broken connection: drop it and reconnect on the next attempt
+                self._disconnect()
+                if attempt == attempts:
+                    raise
+                delay = self.config.backoff_sec * 2 ** (attempt - 1)
+                log.warning("Mail attempt %d/%d failed (%s), retrying in %.1fs", attempt, attempts, e, delay)
+                metrics.inc("mail_retries_total")
+                time.sleep(delay)
+
+    def _connect(self) -> None:
+        import smtplib
+
+        log.debug("Connecting to SMTP %s:%s", self.config.host, self.config.port)
+        smtp = smtplib.SMTP(self.config.host, self.config.port, timeout=self.config.timeout_sec)
+        try:
+            smtp.ehlo()
+            if self.config.starttls:
+                smtp.starttls()
+                smtp.ehlo()
+            smtp.login(self.config.user, self.config.password)
+        except Exception:
+            smtp.close()
+            raise
+        metrics.inc("mail_connections_total")
+        self._smtp = smtp
+
+    def _disconnect(self) -> None:
+        smtp, self._smtp = self._smtp, None
+        if smtp is None:
+            return
+        try:
+            smtp.quit()
+        except Exception:
+            smtp.close()
+
+
+_mailer: Mailer | None = None
+_mailer_lock = threading.Lock()
+
+
+def get_mailer() -> Mailer | None:
+    """
+    Return the process-wide Mailer, created on first use.
+
+    Returns:
+        None when the SMTP configuration is incomplete
+    """
+    global _mailer
+    with _mailer_lock:
+        if _mailer is None:
+            config = SmtpConfig.from_env()
+            if not config.complete:
+                return None
+            _mailer = Mailer(config)
+            atexit.register(shutdown_mail)
+        return _mailer
+
 
-SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
-SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
-SMTP_USER = os.getenv("SMTP_USER")
-SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+def shutdown_mail(timeout: float | None = None) -> None:
+    """Deliver pending mail (bounded by MAIL_FLUSH_TIMEOUT_SEC) and close the connection."""
+    global _mailer
+    with _mailer_lock:
+        mailer, _mailer = _mailer, None
+    if mailer is not None:
+        mailer.close(mailer.config.flush_timeout_sec if timeout is None else timeout)
 
-MAIL_FROM = os.getenv("MAIL_FROM")
-MAIL_TO = os.getenv("MAIL_TO")  # virgüllü olabilir
 
+def send_html_mail(subject: str, html_body: str, *, attachments: Iterable[Attachment] = ()) -> Future | None:
+    """
+    Queue an HTML mail to MAIL_TO.
 
-def send_html_mail(subject: str, html_body: str):
-    if not all([SMTP_USER, SMTP_PASSWORD, MAIL_FROM, MAIL_TO]):
-        print("❌ MAIL CONFIG ERROR: Missing SMTP env vars")
-        return
+    Returns:
+        Future of the delivery, or None if mail is not configured
+    """
+    mailer = get_mailer()
+    if mailer is None:
+        log.error("MAIL CONFIG ERROR: Missing SMTP env vars")
+        return None
+    return mailer.submit(subject, html_body, attachments=attachments)
 
-    msg = MIMEText(html_body, "html", "utf-8")
-    msg["From"] = MAIL_FROM
-    msg["To"] = MAIL_TO
-    msg["Subject"] = subject
 
-    server = smtplib.SMTP(SMTP_HOST, SMTP_PORT)
-    server.starttls()
-    server.login(SMTP_USER, SMTP_PASSWORD)
-    server.sendmail(MAIL_FROM, MAIL_TO.split(","), msg.as_string())
-    server.quit()
+def send_text_mail(subject: str, body: str) -> Future | None:
+    """
+    Queue a plain-text mail to MAIL_TO.
 
-    print("✅ SUMMARY MAIL SENT")
+    Returns:
+        Future of the delivery, or None if mail is not configured
+    """
+    mailer = get_mailer()
+    if mailer is None:
+        log.error("MAIL CONFIG ERROR: Missing SMTP env vars")
+        return None
+    return mailer.submit(subject, body, subtype="plain")
@@ -1,35 +1,236 @@
 import argparse
-from datetime import datetime
-from .config import Settings
-from .job import run_yesterday, run_for_date
-from .logger import log_info
+import os
+from contextlib import nullcontext
+from dataclasses import replace
+from datetime import datetime, timedelta
+from .config import get_settings, load_company_profiles
+from .logger import get_logger, setup_logging
+from .state import RunLock
+from . import metrics
+
+# src.job (and with it lxml, requests and pyodbc) is imported only once a
+# command actually runs, so --help and config-check start fast
+
+log = get_logger("main")
+
+def _profiler(args, settings):
+    """Return the --profile Profiler (reports go next to the log file), or None."""
+    if not args.profile:
+        return None
+    from .profiling import Profiler
+
+    output_dir = os.path.dirname(os.path.abspath(settings.log_file)) if settings.log_file else os.getcwd()
+    return Profiler(output_dir, top_n=args.profile_top)
+
+def _parse_day(parser, value, option):
+    """Parse a YYYY-MM-DD option value, exiting with a usage error if it is malformed."""
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        parser.error(f"{option} için geçersiz tarih: {value} (beklenen biçim: YYYY-MM-DD)")
 
 def main():
-    #log_info("Starting ATS Mileage Sync")
-    print("DEBUG: Starting ATS Mileage Sync")
     print("ATS Mileage Sync")
-    
+
     parser = argparse.ArgumentParser()
     parser.add_argument("--date", help="YYYY-MM-DD (bu gün için km çekip DB'ye yazar)")
+    parser.add_argument("--from", dest="date_from", help="YYYY-MM-DD (aralık başlangıcı, --to ile birlikte)")
+    parser.add_argument("--to", dest="date_to", help="YYYY-MM-DD (aralık sonu, dahil)")
+    cache_group = parser.add_mutually_exclusive_group()
+    cache_group.add_argument("--use-cache", action="store_true", help="SOAP yanıtlarını varsa yerel önbellekten oku")
+    cache_group.add_argument("--refresh", action="store_true", help="SOAP'tan yeniden çek ve önbelleği güncelle")
+    parser.add_argument("--no-resume", action="store_true", help="Kayıtlı checkpoint'i yok say, günü baştan işle")
+    sync_group = parser.add_mutually_exclusive_group()
+    sync_group.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Sadece son senkronizasyondan sonraki pencereyi çek, km'si değişmeyen cihazları atla",
+    )
+    sync_group.add_argument("--full", action="store_true", help="INCREMENTAL ayarını yok say, tüm günü çek")
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Aşamaları cProfile/tracemalloc ile profille; raporları log dosyasının yanına yaz",
+    )
+    parser.add_argument("--profile-top", type=int, default=25, help="Profil raporundaki satır sayısı (varsayılan: 25)")
+    parser.add_argument(
+        "--companies",
+        metavar="FILE",
+        help="Şirket profilleri (JSON); her şirketi ayrı süreçte çek, tek mail gönder (varsayılan: COMPANIES_FILE)",
+    )
+
+    commands = parser.add_subparsers(dest="command")
+    db_init = commands.add_parser("db-init", help="dbo.arac_km_log indekslerini oluştur/doğrula ve kullanımını raporla")
+    db_init.add_argument("--unique", action="store_true", help="(DeviceId, [Date]) üzerinde filtreli unique indeks de oluştur")
+    db_init.add_argument("--report-only", action="store_true", help="Hiçbir şey oluşturma, sadece raporla")
+    commands.add_parser("config-check", help="Gerekli ortam değişkenlerini doğrula ve çık (bağlantı kurmaz)")
+    serve = commands.add_parser(
+        "serve", help="Sürekli çalış: bağlantıları açık tut, senkronizasyonu zamanlamaya göre çalıştır"
+    )
+    serve.add_argument("--schedule", help="Günlük (dünkü) senkronizasyon için cron ifadesi (varsayılan: SERVE_SCHEDULE)")
+    serve.add_argument(
+        "--intraday-minutes",
+        type=int,
+        help="Bugünü her N dakikada artımlı senkronize et, 0: kapalı (varsayılan: SERVE_INTRADAY_MINUTES)",
+    )
+    replay = commands.add_parser(
+        "replay", help="Kayıtlı SOAP yanıtlarını (XML) TNB Mobil'e gitmeden işle ve aşama sürelerini raporla"
+    )
+    replay.add_argument("--xml", nargs="+", required=True, metavar="FILE", help="Yanıt dosyaları (.xml, .xml.gz, .xml.zst; glob olabilir)")
+    replay.add_argument(
+        "--backend",
+        choices=("memory", "sqlite", "mssql"),
+        default="memory",
+        help="Yazılacak veritabanı: memory (bellekte), sqlite veya mssql (varsayılan: memory)",
+    )
+    replay.add_argument("--sqlite-path", default=":memory:", help="sqlite backend için veritabanı dosyası (varsayılan: bellekte)")
+    replay.add_argument("--date", dest="replay_date", help="YYYY-MM-DD (adında tarih olmayan dosyalar için)")
+    replay.add_argument("--commit", action="store_true", help="mssql backend'de değişiklikleri geri almak yerine commit et")
+
     args = parser.parse_args()
-    print(f"DEBUG: Parsed arguments - date: {args.date}")
 
-    settings = Settings()
-    #log_info("Settings loaded")
-    print("DEBUG: Settings loaded successfully")
+    if (args.date_from or args.date_to) and not (args.date_from and args.date_to):
+        parser.error("--from ve --to birlikte kullanılmalıdır")
+    if args.date and args.date_from:
+        parser.error("--date, --from/--to ile birlikte kullanılamaz")
 
+    # Dates are checked once here, so a typo never reaches a run as a traceback
+    start = end = None
     if args.date:
-        target = datetime.strptime(args.date, "%Y-%m-%d")
-        #log_info(f"Running for specific date: {target.date()}")
-        print(f"DEBUG: Running for specific date: {target.date()}")
-        summary = run_for_date(target, settings)
+        start = end = _parse_day(parser, args.date, "--date")
+    elif args.date_from:
+        start = _parse_day(parser, args.date_from, "--from")
+        end = _parse_day(parser, args.date_to, "--to")
+        if end < start:
+            parser.error("--to, --from tarihinden önce olamaz")
+    if args.command == "replay" and args.replay_date:
+        _parse_day(parser, args.replay_date, "--date")
+
+    settings = get_settings()
+    if args.use_cache:
+        settings = replace(settings, soap_cache_mode="use")
+    elif args.refresh:
+        settings = replace(settings, soap_cache_mode="refresh")
+    if args.no_resume:
+        settings = replace(settings, resume_checkpoints=False)
+    if args.incremental or args.full:
+        settings = replace(settings, incremental=args.incremental)
+
+    setup_logging(
+        settings.log_level,
+        module_levels=settings.log_levels,
+        log_file=settings.log_file,
+        json_format=settings.log_json,
+        console=settings.log_console,
+    )
+    metrics.configure(settings.metrics_enabled)
+    log.info("Starting ATS Mileage Sync")
+    log.debug("Parsed arguments - date: %s, from: %s, to: %s", args.date, args.date_from, args.date_to)
+    settings.log_summary()
+
+    # Multi-company runs take the SOAP_* values from the profiles file
+    companies_file = args.companies or settings.companies_file
+    profiles = None
+    if companies_file and args.command in (None, "config-check"):
+        try:
+            profiles = load_company_profiles(companies_file, settings)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+    elif args.companies:
+        parser.error("--companies sadece senkronizasyon ve config-check ile kullanılabilir")
+
+    # db-init only talks to the database; everything else needs SOAP too.
+    # A replay needs MSSQL only when it writes there.
+    if args.command == "replay":
+        sections = ("mssql",) if args.backend == "mssql" else None
     else:
-        #log_info("Running for yesterday")
-        print("DEBUG: Running for yesterday")
-        summary = run_yesterday(settings)
+        sections = ("mssql",) if args.command == "db-init" or profiles else ()
+    if sections is not None:
+        try:
+            settings.validate(*sections)
+        except RuntimeError as e:
+            parser.error(str(e))
+
+    if args.command == "config-check":
+        print("Konfigürasyon geçerli")
+        return
+
+    from .job import run_db_init, run_yesterday, run_for_companies, run_for_date, run_for_range
+
+    if args.command == "db-init":
+        result = run_db_init(settings, unique=args.unique, report_only=args.report_only)
+        for action in result["actions"]:
+            print(action)
+        print(f"{'index':<40} {'seeks':>10} {'scans':>10} {'lookups':>10} {'updates':>10}")
+        for idx in result["indexes"]:
+            print(
+                f"{idx['name'] or '(heap)':<40} {idx['user_seeks']:>10} {idx['user_scans']:>10} "
+                f"{idx['user_lookups']:>10} {idx['user_updates']:>10}"
+            )
+        return
+
+    if args.command == "replay":
+        from .replay import expand_paths, format_report, run_replay
+
+        try:
+            paths = expand_paths(args.xml)
+        except ValueError as e:
+            parser.error(str(e))
+        # The timing report is built from the job metrics
+        metrics.configure(True)
+        with _profiler(args, settings) or nullcontext():
+            try:
+                summary = run_replay(
+                    paths,
+                    settings,
+                    backend=args.backend,
+                    date_str=args.replay_date,
+                    sqlite_path=args.sqlite_path,
+                    commit=True if args.commit else None,
+                )
+            except ValueError as e:
+                parser.error(str(e))
+        print(format_report(summary))
+        return
+
+    lock = RunLock(settings.lock_file) if settings.lock_file else None
+
+    if args.command == "serve":
+        from .daemon import Daemon
+        from .schedule import CronSchedule
+
+        try:
+            schedule = CronSchedule(args.schedule or settings.serve_schedule)
+        except ValueError as e:
+            parser.error(str(e))
+        intraday = settings.serve_intraday_minutes if args.intraday_minutes is None else args.intraday_minutes
+        Daemon(settings, schedule=schedule, intraday_minutes=intraday, lock=lock).run()
+        return
+
+    if lock is not None and not lock.acquire():
+        parser.exit(1, f"Başka bir çalıştırma devam ediyor (lock: {lock.path}, pid {lock.owner()})\n")
+
+    profiler = _profiler(args, settings)
+    with profiler or nullcontext():
+        if profiles:
+            if start is None:
+                start = end = datetime.now() - timedelta(days=1)
+            log.debug("Running %d companies for %s - %s", len(profiles), start.date(), end.date())
+            summary = run_for_companies(start, end, settings, profiles)
+        elif args.date_from:
+            log.debug("Running for range: %s - %s", start.date(), end.date())
+            summary = run_for_range(start, end, settings)
+        elif args.date:
+            log.debug("Running for specific date: %s", start.date())
+            summary = run_for_date(start, settings)
+        else:
+            log.debug("Running for yesterday")
+            summary = run_yesterday(settings)
+
+    if profiler is not None:
+        summary["profile"] = profiler.summary()
 
-    #log_info(f"Job completed. Summary: {summary}")
-    print(f"DEBUG: Job completed with summary: {summary}")
+    log.info("Job completed with summary: %s", summary)
     print(summary)
 
 if __name__ == "__main__":
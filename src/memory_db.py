@@ -0,0 +1,128 @@
+"""
+In-memory stand-in for ``src.db.MsSql``.
+
+Keeps ``dbo.arac_km_log`` as Python dicts with the same transaction
+semantics (rows become visible to later runs on commit, rollback drops
+them), so the replay mode can time parsing, validation and the dedup and
+insert logic with no database cost at all. The bcp write mode behaves like
+executemany here; use the SQLite or MSSQL backend to measure the writers
+themselves.
+"""
+
+from collections.abc import Iterator
+from datetime import date, timedelta
+
+from .logger import get_logger
+from .metrics import metrics
+
+# Same logger as src.db, so per-row DEBUG output costs the same as on MsSql
+log = get_logger("db")
+
+
+class MemoryKmLog:
+    """
+    Dict-backed adapter exposing the MsSql write API.
+
+    Attributes:
+        rows: Committed ``(device_id, license_plate, date_str, mileage)`` rows
+        quarantined: Committed ``(device_id, license_plate, date_str, mileage, previous, reason)`` rows
+    """
+
+    def __init__(self):
+        self.rows: list[tuple[str, str | None, str, int | None]] = []
+        self.quarantined: list[tuple] = []
+        # (device_id, date_str) of committed rows
+        self._keys: set[tuple[str, str]] = set()
+        self._pending: list[tuple[str, str | None, str, int | None]] = []
+        self._pending_keys: set[tuple[str, str]] = set()
+        self._pending_deletes: set[tuple[str, str]] = set()
+        self._pending_quarantine: list[tuple] = []
+
+    def _exists(self, key: tuple[str, str]) -> bool:
+        return (key in self._keys and key not in self._pending_deletes) or key in self._pending_keys
+
+    def insert_km_log(self, device_id, license_plate, date_str, mileage):
+        self._pending.append((device_id, license_plate, date_str, mileage))
+        self._pending_keys.add((device_id, date_str))
+        log.debug("Executed INSERT for Plate=%s, Date=%s, KM=%s", license_plate, date_str, mileage)
+
+    def exists_for_date(self, device_id: str, date_str: str) -> bool:
+        return self._exists((device_id, date_str))
+
+    def delete_km_logs(self, device_ids: list[str], date_str: str) -> None:
+        keys = {(device_id, date_str) for device_id in device_ids}
+        self._pending = [row for row in self._pending if (row[0], row[2]) not in keys]
+        self._pending_keys -= keys
+        self._pending_deletes |= keys
+
+    def bulk_insert_km_logs(self, batch, date_str: str, *, deduplicate: bool = True) -> list[bool]:
+        flags = []
+        for device_id, plate, mileage in batch.rows():
+            key = (device_id, date_str)
+            if deduplicate and self._exists(key):
+                flags.append(False)
+                continue
+            self._pending.append((device_id, plate, date_str, mileage))
+            self._pending_keys.add(key)
+            flags.append(True)
+        return flags
+
+    def bulk_copy_km_logs(self, batch, date_str: str, *, deduplicate: bool = True, **_bcp_options) -> list[bool]:
+        return self.bulk_insert_km_logs(batch, date_str, deduplicate=deduplicate)
+
+    def ensure_bulk_stage(self) -> None:
+        pass
+
+    def ensure_quarantine_table(self) -> None:
+        pass
+
+    def quarantine_km_logs(self, batch, date_str: str, reasons, previous) -> None:
+        self._pending_quarantine.extend(
+            (device_id, plate, date_str, mileage, prev, reason)
+            for (device_id, plate, mileage), reason, prev in zip(batch.rows(), reasons, previous)
+        )
+
+    def iter_previous_mileages(
+        self, date_str: str, lookback_days: int, *, chunk_size: int = 50_000
+    ) -> Iterator[tuple[str, int, int]]:
+        day = date.fromisoformat(date_str)
+        first = (day - timedelta(days=lookback_days)).isoformat()
+        latest: dict[str, tuple[str, int]] = {}
+        for device_id, _plate, row_date, mileage in self.rows:
+            if mileage is None or not first <= row_date < date_str:
+                continue
+            seen = latest.get(device_id)
+            if seen is None or row_date > seen[0]:
+                latest[device_id] = (row_date, mileage)
+        for device_id, (row_date, mileage) in latest.items():
+            yield device_id, mileage, (day - date.fromisoformat(row_date)).days
+
+    def iter_dedup_keys(self, start_date: str, end_date: str, *, chunk_size: int = 50_000):
+        for device_id, date_str in self._keys:
+            if start_date <= date_str <= end_date:
+                yield device_id, date_str
+
+    def count_dedup_keys(self, start_date: str, end_date: str) -> int:
+        return sum(1 for _ in self.iter_dedup_keys(start_date, end_date))
+
+    def commit(self):
+        with metrics.timer("db_commit"):
+            if self._pending_deletes:
+                self.rows = [row for row in self.rows if (row[0], row[2]) not in self._pending_deletes]
+                self._keys -= self._pending_deletes
+            self.rows.extend(self._pending)
+            self._keys |= self._pending_keys
+            self.quarantined.extend(self._pending_quarantine)
+            self.rollback()
+
+    def rollback(self):
+        self._pending = []
+        self._pending_keys = set()
+        self._pending_deletes = set()
+        self._pending_quarantine = []
+
+    def close(self):
+        self.rollback()
+
+    def ping(self) -> bool:
+        return True
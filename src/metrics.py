@@ -0,0 +1,233 @@
+"""
+Metrics module for ATS Mileage Sync.
+
+A small, process-wide registry of counters, gauges and histograms used to
+instrument the SOAP, parse, dedup, DB and mail stages. Stage durations are
+recorded with the ``timer`` context manager / ``timed`` decorator into
+``<name>_seconds`` histograms. A snapshot goes into the job summary and
+the summary mail, and can be written as a Prometheus textfile (for the
+node_exporter textfile collector) or as JSON after each run.
+
+When disabled every call returns after a single attribute check, so the
+instrumentation can stay in place in production.
+"""
+
+import functools
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+
+# Upper bounds (seconds) of the duration histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+EXPORT_FORMATS = ("prometheus", "json")
+
+_NULL_TIMER = nullcontext()
+
+
+class Histogram:
+    """Bucketed distribution of observed values (Prometheus semantics)."""
+
+    __slots__ = ("bounds", "buckets", "count", "sum", "min", "max")
+
+    def __init__(self, bounds: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)  # last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def observe(self, value: float) -> None:
+        self.buckets[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by linear interpolation inside its bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for idx, n in enumerate(self.buckets):
+            upper = self.bounds[idx] if idx < len(self.bounds) else self.max
+            if n and seen + n >= rank:
+                estimate = lower + (upper - lower) * (rank - seen) / n
+                return min(max(estimate, self.min), self.max)
+            seen += n
+            lower = upper
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "min": round(self.min, 6) if self.count else 0.0,
+            "max": round(self.max, 6) if self.count else 0.0,
+            "p50": round(self.quantile(0.5), 6),
+            "p95": round(self.quantile(0.95), 6),
+        }
+
+
+class Metrics:
+    """
+    Thread-safe registry of counters, gauges and histograms.
+
+    Counter names end in ``_total`` by convention; timers record into
+    ``<name>_seconds`` histograms.
+    """
+
+    def __init__(self, *, enabled: bool = True, prefix: str = "ats_mileage"):
+        """
+        Args:
+            enabled: Record anything at all
+            prefix: Metric name prefix used in the Prometheus export
+        """
+        self.enabled = enabled
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.counters: dict[str, float] = {}
+        self.gauges: dict[str, float] = {}
+        self.histograms: dict[str, Histogram] = {}
+
+    def reset(self) -> None:
+        """Drop all recorded values (called at the start of every run)."""
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+    def inc(self, name: str, value: float = 1) -> None:
+        """Increase a counter."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """Set a gauge to an absolute value."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        """Add an observation to a histogram."""
+        if not self.enabled:
+            return
+        with self._lock:
+            hist = self.histograms.get(name)
+            if hist is None:
+                hist = self.histograms[name] = Histogram()
+            hist.observe(value)
+
+    def timer(self, name: str):
+        """
+        Context manager that records its duration into ``<name>_seconds``.
+
+        Example:
+            with metrics.timer("db_write"):
+                db.bulk_insert_km_logs(batch, date_str)
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return self._timer(name)
+
+    @contextmanager
+    def _timer(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(f"{name}_seconds", time.perf_counter() - started)
+
+    def timed(self, name: str):
+        """Decorator form of ``timer``."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def snapshot(self) -> dict:
+        """
+        Return the recorded values as plain data.
+
+        Returns:
+            ``{"counters": {...}, "gauges": {...}, "histograms": {name: {...}}}``,
+            or an empty dict when disabled
+        """
+        if not self.enabled:
+            return {}
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "histograms": {name: hist.to_dict() for name, hist in self.histograms.items()},
+            }
+
+    def to_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                lines += [f"# TYPE {self.prefix}_{name} counter", f"{self.prefix}_{name} {value:g}"]
+            for name, value in sorted(self.gauges.items()):
+                lines += [f"# TYPE {self.prefix}_{name} gauge", f"{self.prefix}_{name} {value:g}"]
+            for name, hist in sorted(self.histograms.items()):
+                full = f"{self.prefix}_{name}"
+                lines.append(f"# TYPE {full} histogram")
+                cumulative = 0
+                for bound, n in zip((*hist.bounds, "+Inf"), hist.buckets):
+                    cumulative += n
+                    le = bound if isinstance(bound, str) else f"{bound:g}"
+                    lines.append(f'{full}_bucket{{le="{le}"}} {cumulative}')
+                lines += [f"{full}_sum {hist.sum:.6f}", f"{full}_count {hist.count}"]
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str, fmt: str = "prometheus") -> None:
+        """
+        Write the metrics to a file, atomically replacing the previous one.
+
+        Args:
+            path: Target file (use a ``.prom`` name for node_exporter)
+            fmt: "prometheus" or "json"
+
+        Raises:
+            ValueError: If fmt is unknown
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported metrics format: {fmt}")
+        if not self.enabled:
+            return
+
+        body = self.to_prometheus() if fmt == "prometheus" else json.dumps(self.snapshot(), indent=2)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                fh.write(body)
+            os.replace(tmp, path)
+        except Exception:
+            os.remove(tmp)
+            raise
+
+
+# Process-wide registry used by all modules
+metrics = Metrics(enabled=True)
+
+
+def configure(enabled: bool) -> Metrics:
+    """Enable or disable the process-wide registry."""
+    metrics.enabled = enabled
+    return metrics
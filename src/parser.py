@@ -5,13 +5,31 @@ This module parses SOAP XML responses from mileage reporting services
 and extracts structured mileage record data for database insertion.
 """
 
+import logging
+import sys
+import time
+from array import array
+from collections.abc import Iterable, Iterator
 from dataclasses import dataclass
 from lxml import etree
 
-DEBUG = True  # Set to False in production
+from .logger import get_logger
+from .metrics import metrics
 
+log = get_logger("parser")
 
-@dataclass
+# Accepted element names per field, in priority order
+FIELD_ALIASES: dict[str, tuple[str, ...]] = {
+    "device_id": ("DeviceId", "DeviceID"),
+    "license_plate": ("License_Plate", "LicensePlate"),
+    "mileage": ("Mileage", "KM", "Km"),
+}
+
+# Compiled once; evaluating a compiled XPath skips re-parsing the expression
+_MILEAGE_ITEMS_XPATH = etree.XPath("//*[local-name()='MileageL']")
+
+
+@dataclass(slots=True)
 class MileageRecord:
     """
     Represents a single mileage record from the SOAP response.
@@ -19,14 +37,279 @@ class MileageRecord:
     Attributes:
         device_id: Unique identifier for the GPS/tracking device
         license_plate: Vehicle license plate number (optional)
-        mileage: Mileage reading in kilometers (optional)
+        mileage: Odometer reading in kilometers at the end of the reported
+            window (optional); never a distance driven within the window
     """
     device_id: str
     license_plate: str | None
     mileage: int | None
 
 
-def parse_mileage_response(xml_text: str) -> list[MileageRecord]:
+class MileageBatch:
+    """
+    Compact columnar container for parsed mileage records.
+
+    Stores one column per field instead of one object per record: interned
+    device/plate strings in lists, mileage in an ``array('q')`` with a
+    parallel null mask. This is what the parser produces, what the DB layer
+    binds from and what the summary mail renders.
+
+    Iterating or indexing yields MileageRecord views, so code written for
+    ``list[MileageRecord]`` keeps working.
+
+    Attributes:
+        device_ids: Device identifier per row (never empty)
+        plates: License plate per row, None if missing
+        mileages: Mileage per row (0 where the mask is unset)
+        mileage_mask: 1 if the row has a mileage value, 0 for NULL
+    """
+
+    __slots__ = ("device_ids", "plates", "mileages", "mileage_mask")
+
+    _MIN_MILEAGE = -(2 ** 63)
+    _MAX_MILEAGE = 2 ** 63 - 1
+
+    def __init__(self):
+        self.device_ids: list[str] = []
+        self.plates: list[str | None] = []
+        self.mileages = array("q")
+        self.mileage_mask = bytearray()
+
+    @classmethod
+    def from_records(cls, records: Iterable[MileageRecord]) -> "MileageBatch":
+        """Build a batch from MileageRecord-like objects."""
+        batch = cls()
+        for r in records:
+            batch.append(r.device_id, r.license_plate, r.mileage)
+        return batch
+
+    def append(self, device_id: str, license_plate: str | None, mileage: int | None) -> None:
+        """
+        Append one row.
+
+        Mileage values outside the signed 64-bit range are stored as NULL.
+
+        Raises:
+            ValueError: If device_id is empty
+        """
+        if not device_id:
+            raise ValueError("device_id is required")
+
+        self.device_ids.append(sys.intern(device_id))
+        self.plates.append(sys.intern(license_plate) if license_plate else None)
+        if mileage is not None and self._MIN_MILEAGE <= mileage <= self._MAX_MILEAGE:
+            self.mileages.append(mileage)
+            self.mileage_mask.append(1)
+        else:
+            self.mileages.append(0)
+            self.mileage_mask.append(0)
+
+    def extend(self, other: "MileageBatch") -> None:
+        """Append all rows of another batch."""
+        self.device_ids.extend(other.device_ids)
+        self.plates.extend(other.plates)
+        self.mileages.extend(other.mileages)
+        self.mileage_mask.extend(other.mileage_mask)
+
+    def mileage(self, idx: int) -> int | None:
+        """Mileage of row ``idx``, or None if it is NULL."""
+        return self.mileages[idx] if self.mileage_mask[idx] else None
+
+    def rows(self) -> Iterator[tuple[str, str | None, int | None]]:
+        """Yield ``(device_id, license_plate, mileage)`` tuples, e.g. for parameter binding."""
+        for device_id, plate, mileage, present in zip(
+            self.device_ids, self.plates, self.mileages, self.mileage_mask
+        ):
+            yield device_id, plate, mileage if present else None
+
+    def take(self, indices: Iterable[int]) -> "MileageBatch":
+        """Return a new batch with the given rows, in the given order."""
+        batch = MileageBatch()
+        for idx in indices:
+            batch.device_ids.append(self.device_ids[idx])
+            batch.plates.append(self.plates[idx])
+            batch.mileages.append(self.mileages[idx])
+            batch.mileage_mask.append(self.mileage_mask[idx])
+        return batch
+
+    def compress(self, flags: Iterable[bool]) -> "MileageBatch":
+        """Return a new batch with the rows whose flag is true."""
+        return self.take(idx for idx, keep in enumerate(flags) if keep)
+
+    def chunks(self, size: int) -> Iterator["MileageBatch"]:
+        """
+        Split into consecutive batches of at most ``size`` rows.
+
+        Args:
+            size: Maximum rows per chunk; values below 1 are treated as 1
+        """
+        size = max(1, size)
+        for start in range(0, len(self), size):
+            batch = MileageBatch()
+            batch.device_ids = self.device_ids[start:start + size]
+            batch.plates = self.plates[start:start + size]
+            batch.mileages = self.mileages[start:start + size]
+            batch.mileage_mask = self.mileage_mask[start:start + size]
+            yield batch
+
+    def __len__(self) -> int:
+        return len(self.device_ids)
+
+    def __iter__(self) -> Iterator[MileageRecord]:
+        for device_id, plate, mileage in self.rows():
+            yield MileageRecord(device_id=device_id, license_plate=plate, mileage=mileage)
+
+    def __getitem__(self, idx: int) -> MileageRecord:
+        return MileageRecord(
+            device_id=self.device_ids[idx],
+            license_plate=self.plates[idx],
+            mileage=self.mileage(idx),
+        )
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, MileageBatch):
+            return NotImplemented
+        return list(self.rows()) == list(other.rows())
+
+    def __repr__(self) -> str:
+        return f"MileageBatch(rows={len(self)})"
+
+
+class FieldExtractor:
+    """
+    Extracts several text fields from an XML element in a single pass.
+
+    Each descendant's local name is looked up in a precomputed alias table,
+    so a record costs one subtree walk instead of one XPath compilation and
+    scan per alias. For every field the aliases are tried in priority order;
+    only the first element of each alias is considered and the first one
+    with non-empty text wins (same rules as the former per-alias XPath
+    lookups).
+
+    Attributes:
+        fields: Field names in the order extract() returns them
+    """
+
+    def __init__(self, aliases: dict[str, tuple[str, ...]]):
+        """
+        Build the lookup tables.
+
+        Args:
+            aliases: Mapping of field name to accepted element local names
+        """
+        self.fields = tuple(aliases)
+        self._ranks = tuple(len(names) for names in aliases.values())
+        self._lookup: dict[str, tuple[int, int]] = {}
+        for field_idx, names in enumerate(aliases.values()):
+            for rank, name in enumerate(names):
+                self._lookup.setdefault(name, (field_idx, rank))
+
+        # Precompiled equivalents of the alias lookups, for extract_xpath()
+        self._xpaths = tuple(
+            tuple(etree.XPath(f".//*[local-name()='{name}']") for name in names)
+            for names in aliases.values()
+        )
+
+    def extract(self, item: etree._Element) -> tuple[str | None, ...]:
+        """
+        Walk the descendants of ``item`` once and return the field texts.
+
+        Args:
+            item: Parent XML element (e.g. a MileageL element)
+
+        Returns:
+            Stripped text per field (in ``fields`` order), None if not found
+        """
+        lookup = self._lookup
+        found: dict[tuple[int, int], str | None] = {}
+
+        for el in item.iterdescendants():
+            tag = el.tag
+            if not isinstance(tag, str):
+                continue  # comments / processing instructions
+            key = lookup.get(tag[tag.rfind("}") + 1:])
+            if key is not None and key not in found:
+                found[key] = el.text
+
+        result = []
+        for field_idx, ranks in enumerate(self._ranks):
+            value = None
+            for rank in range(ranks):
+                text = found.get((field_idx, rank))
+                if text and text.strip():
+                    value = text.strip()
+                    break
+            result.append(value)
+        return tuple(result)
+
+    def extract_xpath(self, item: etree._Element) -> tuple[str | None, ...]:
+        """
+        Same result as extract(), evaluated with the precompiled XPath objects.
+
+        Useful when only a handful of fields are needed from very large
+        subtrees, where per-alias indexed lookups beat a full walk.
+
+        Args:
+            item: Parent XML element
+
+        Returns:
+            Stripped text per field (in ``fields`` order), None if not found
+        """
+        result = []
+        for xpaths in self._xpaths:
+            value = None
+            for xpath in xpaths:
+                nodes = xpath(item)
+                if nodes:
+                    text = nodes[0].text
+                    if text and text.strip():
+                        value = text.strip()
+                        break
+            result.append(value)
+        return tuple(result)
+
+
+_EXTRACTOR = FieldExtractor(FIELD_ALIASES)
+
+
+class UnchangedFilter:
+    """
+    Parse-time filter of the incremental sync mode.
+
+    Drops records whose mileage equals the device's previous reading, so
+    they are never collected into batches or sent to the DB. Records with
+    a NULL mileage are always kept.
+
+    Attributes:
+        skipped: Number of records dropped so far
+    """
+
+    __slots__ = ("previous", "skipped")
+
+    def __init__(self, previous: dict[str, int]):
+        """
+        Args:
+            previous: Previous reading per device
+        """
+        self.previous = previous
+        self.skipped = 0
+
+    def __call__(self, device_id: str, mileage: int | None) -> bool:
+        """Return True if the record should be dropped."""
+        if mileage is not None and self.previous.get(device_id) == mileage:
+            self.skipped += 1
+            return True
+        return False
+
+    def apply(self, batch: MileageBatch) -> MileageBatch:
+        """Return the rows of an already parsed batch that are kept."""
+        before = self.skipped
+        kept = batch.compress([not self(device_id, mileage) for device_id, _plate, mileage in batch.rows()])
+        metrics.inc("records_unchanged_total", self.skipped - before)
+        return kept
+
+
+def parse_mileage_response(xml_text: str, *, skip: UnchangedFilter | None = None) -> MileageBatch:
     """
     Parse SOAP XML response and extract mileage records.
 
@@ -35,87 +318,187 @@ def parse_mileage_response(xml_text: str) -> list[MileageRecord]:
 
     Args:
         xml_text: Raw XML response string from SOAP service
+        skip: Incremental-mode filter; matching records are left out
 
     Returns:
-        List of MileageRecord objects containing parsed data
+        MileageBatch containing parsed data
     """
-    if DEBUG:
-        print("DEBUG PARSER: Starting XML parsing")
-        print(f"DEBUG PARSER: XML length = {len(xml_text)}")
+    log.debug("Starting XML parsing (%d chars)", len(xml_text))
+    started = time.perf_counter()
 
     root = etree.fromstring(xml_text.encode("utf-8"))
 
     # Find MileageL records within SOAP response
-    items = root.xpath("//*[local-name()='MileageL']")
+    items = _MILEAGE_ITEMS_XPATH(root)
 
-    if DEBUG:
-        print(f"DEBUG PARSER: Found {len(items)} MileageL items")
+    log.debug("Found %d MileageL items", len(items))
 
-    records: list[MileageRecord] = []
+    records = MileageBatch()
+    trace = log.isEnabledFor(logging.DEBUG)
 
+    unchanged = 0
     for idx, item in enumerate(items, start=1):
-        # Extract data fields from XML
-        device_id = _first_text(item, ["DeviceId", "DeviceID"])
-        plate = _first_text(item, ["License_Plate", "LicensePlate"])
-        mileage_txt = _first_text(item, ["Mileage", "KM", "Km"])
-
-        if DEBUG:
-            print(
-                f"DEBUG PARSER [{idx}]: "
-                f"DeviceId={device_id} | "
-                f"Plate={plate} | "
-                f"MileageRaw={mileage_txt}"
-            )
-
-        # Parse mileage value
-        mileage = None
-        if mileage_txt:
-            try:
-                mileage = int(mileage_txt.strip())
-            except Exception as e:
-                if DEBUG:
-                    print(
-                        f"DEBUG PARSER [{idx}]: "
-                        f"Mileage parse failed ({mileage_txt}) | {e}"
-                    )
-
-        # Only create record if device_id exists (required field)
-        if device_id:
-            records.append(
-                MileageRecord(
-                    device_id=device_id,
-                    license_plate=plate,
-                    mileage=mileage
-                )
-            )
-        else:
-            if DEBUG:
-                print(f"DEBUG PARSER [{idx}]: SKIPPED (DeviceId missing)")
+        fields = _fields_from_item(item, idx, trace)
+        if fields is None:
+            continue
+        if skip is not None and skip(fields[0], fields[2]):
+            unchanged += 1
+            continue
+        records.append(*fields)
 
-    if DEBUG:
-        print(f"DEBUG PARSER: Parsing complete. Total records = {len(records)}")
+    metrics.observe("parse_seconds", time.perf_counter() - started)
+    metrics.inc("records_parsed_total", len(records))
+    if skip is not None:
+        metrics.inc("records_unchanged_total", unchanged)
+    log.debug("Parsing complete. Total records = %d", len(records))
 
     return records
 
 
-def _first_text(parent: etree._Element, names: list[str]) -> str | None:
+def iter_mileage_records(chunks: Iterable[bytes]) -> Iterator[MileageRecord]:
+    """
+    Incrementally parse a SOAP XML response and yield mileage records.
+
+    Streaming counterpart of parse_mileage_response: chunks are pushed into
+    an lxml pull parser, each completed MileageL element is converted and
+    then cleared together with its already-processed siblings, so memory
+    stays bounded by the chunk size and a single record.
+
+    Args:
+        chunks: Raw XML response body as an iterable of byte chunks
+
+    Yields:
+        MileageRecord objects in document order
     """
-    Extract text content from the first matching XML element.
+    for device_id, plate, mileage in _iter_fields(chunks):
+        yield MileageRecord(device_id=device_id, license_plate=plate, mileage=mileage)
+
 
-    Searches for elements with the given names and returns the text content
-    of the first element found that contains non-empty text.
+def iter_mileage_batches(
+    chunks: Iterable[bytes],
+    batch_size: int,
+    *,
+    skip: UnchangedFilter | None = None,
+) -> Iterator[MileageBatch]:
+    """
+    Incrementally parse a SOAP XML response into fixed-size MileageBatches.
 
     Args:
-        parent: Parent XML element to search within
-        names: List of possible element names to search for
+        chunks: Raw XML response body as an iterable of byte chunks
+        batch_size: Maximum rows per yielded batch; values below 1 are treated as 1
+        skip: Incremental-mode filter; matching records are left out
+
+    Yields:
+        MileageBatch objects in document order
+    """
+    batch_size = max(1, batch_size)
+    batch = MileageBatch()
+    for fields in _iter_fields(chunks, skip):
+        batch.append(*fields)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = MileageBatch()
+    if batch:
+        yield batch
+
+
+def _iter_fields(
+    chunks: Iterable[bytes], skip: UnchangedFilter | None = None
+) -> Iterator[tuple[str, str | None, int | None]]:
+    """
+    Drive the pull parser and yield converted fields of each MileageL element.
+
+    Args:
+        chunks: Raw XML response body as an iterable of byte chunks
+        skip: Incremental-mode filter; matching records are not yielded
+
+    Yields:
+        ``(device_id, license_plate, mileage)`` tuples in document order
+    """
+    log.debug("Starting streaming XML parsing")
+
+    pull = etree.XMLPullParser(events=("end",), tag="{*}MileageL")
+    trace = log.isEnabledFor(logging.DEBUG)
+    # Parse time excludes the consumer's time between yields; only measured when metrics are on
+    clock = time.perf_counter if metrics.enabled else None
+    busy = 0.0
+    idx = 0
+    total = 0
+    unchanged = 0
+
+    def _drain() -> Iterator[tuple[str, str | None, int | None]]:
+        nonlocal idx, total, unchanged, busy
+        for _event, item in pull.read_events():
+            started = clock() if clock else 0.0
+            idx += 1
+            fields = _fields_from_item(item, idx, trace)
+
+            # Release the processed subtree and everything before it
+            item.clear()
+            parent = item.getparent()
+            if parent is not None:
+                while item.getprevious() is not None:
+                    del parent[0]
+
+            if fields is not None and skip is not None and skip(fields[0], fields[2]):
+                unchanged += 1
+                fields = None
+
+            if clock:
+                busy += clock() - started
+            if fields is not None:
+                total += 1
+                yield fields
+
+    for chunk in chunks:
+        started = clock() if clock else 0.0
+        pull.feed(chunk)
+        if clock:
+            busy += clock() - started
+        yield from _drain()
+
+    pull.close()
+    yield from _drain()
+
+    metrics.observe("parse_seconds", busy)
+    metrics.inc("records_parsed_total", total)
+    if skip is not None:
+        metrics.inc("records_unchanged_total", unchanged)
+    log.debug("Streaming parsing complete. Total records = %d", total)
+
+
+def _fields_from_item(
+    item: etree._Element, idx: int, trace: bool = False
+) -> tuple[str, str | None, int | None] | None:
+    """
+    Extract and convert the fields of a single MileageL element.
+
+    Args:
+        item: MileageL XML element
+        idx: 1-based position of the element, used in log messages
+        trace: Log every record at DEBUG level (checked once per parse by the caller)
 
     Returns:
-        Text content of the first matching element, or None if not found
-    """
-    for n in names:
-        nodes = parent.xpath(f".//*[local-name()='{n}']")
-        if nodes:
-            text = nodes[0].text
-            if text and text.strip():
-                return text.strip()
-    return None
+        ``(device_id, license_plate, mileage)``, or None if the element has no DeviceId
+    """
+    # Extract data fields from XML
+    device_id, plate, mileage_txt = _EXTRACTOR.extract(item)
+
+    if trace:
+        log.debug("[%d] DeviceId=%s | Plate=%s | MileageRaw=%s", idx, device_id, plate, mileage_txt)
+
+    # Parse mileage value
+    mileage = None
+    if mileage_txt:
+        try:
+            mileage = int(mileage_txt.strip())
+        except ValueError as e:
+            metrics.inc("records_bad_mileage_total")
+            log.debug("[%d] Mileage parse failed (%s) | %s", idx, mileage_txt, e)
+
+    # Only create record if device_id exists (required field)
+    if not device_id:
+        log.debug("[%d] SKIPPED (DeviceId missing)", idx)
+        return None
+
+    return device_id, plate, mileage
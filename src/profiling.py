@@ -0,0 +1,262 @@
+"""
+Profiling hooks for ATS Mileage Sync (``--profile``).
+
+While a Profiler is active, the pipeline stages wrapped in profile_stage
+(dedup load, fetch, parse, write, commit, mail) are recorded with:
+
+* a cProfile per stage, written as ``<prefix>-<stage>.prof`` (snakeviz,
+  ``python -m pstats``)
+* tracemalloc: the peak traced memory of every stage and the top-N live
+  allocations at the end of its most memory-hungry occurrence
+* a sampling profiler that collects the stacks of all threads into a
+  flamegraph-compatible collapsed-stack file (``<prefix>.collapsed``,
+  for flamegraph.pl or speedscope)
+
+plus a plain-text report naming the peak-memory stage. Without an active
+Profiler profile_stage is a shared no-op context manager.
+
+Only one cProfile can be enabled at a time (Python 3.12+ enforces this
+process-wide), so when stages overlap on several threads (range runs)
+the overlapping occurrences are covered by the sampler only. Stage peaks
+are approximate when stages run concurrently, since tracemalloc tracks a
+single process-wide peak.
+"""
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from datetime import datetime
+
+from .logger import get_logger
+
+log = get_logger("profiling")
+
+_active: "Profiler | None" = None
+_NULL_STAGE = nullcontext()
+_CPROFILE_LOCK = threading.Lock()
+
+
+def profile_stage(name: str):
+    """
+    Context manager marking a pipeline stage for the active Profiler.
+
+    Args:
+        name: Stage name, used in file names and reports
+    """
+    profiler = _active
+    if profiler is None:
+        return _NULL_STAGE
+    return profiler.stage(name)
+
+
+@dataclass(slots=True)
+class StageStats:
+    """Aggregated measurements of one stage over all its occurrences."""
+    name: str
+    count: int = 0
+    wall_sec: float = 0.0
+    peak_bytes: int = 0
+    snapshot: tracemalloc.Snapshot | None = None
+
+
+class Profiler:
+    """
+    Collects per-stage CPU and memory profiles for one run.
+
+    Use as a context manager around the job; reports are written on exit.
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        *,
+        top_n: int = 25,
+        sample_interval: float = 0.005,
+        trace_frames: int = 1,
+    ):
+        """
+        Args:
+            output_dir: Directory for the report files (created if missing)
+            top_n: Rows in the function and allocation tables of the report
+            sample_interval: Seconds between stack samples
+            trace_frames: Frames stored per allocation by tracemalloc
+        """
+        self.output_dir = output_dir
+        self.top_n = top_n
+        self.sample_interval = sample_interval
+        self.trace_frames = trace_frames
+        self.prefix = os.path.join(output_dir, f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+        self.stages: dict[str, StageStats] = {}
+        self.files: list[str] = []
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profiles: dict[str, list[cProfile.Profile]] = {}
+        self._thread_stage: dict[int, str] = {}
+        self._samples: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._sampler: threading.Thread | None = None
+        self._started = 0.0
+
+    def __enter__(self) -> "Profiler":
+        global _active
+        os.makedirs(self.output_dir, exist_ok=True)
+        tracemalloc.start(self.trace_frames)
+        self._started = time.perf_counter()
+        self._sampler = threading.Thread(target=self._sample, name="profiler-sampler", daemon=True)
+        self._sampler.start()
+        _active = self
+        return self
+
+    def __exit__(self, *exc) -> None:
+        global _active
+        _active = None
+        self._stop.set()
+        self._sampler.join()
+        try:
+            self._write_reports(time.perf_counter() - self._started)
+        finally:
+            tracemalloc.stop()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Profile one occurrence of a stage on the current thread."""
+        tid = threading.get_ident()
+        outer = getattr(self._local, "stage", None)
+        self._local.stage = name
+        self._thread_stage[tid] = name
+
+        # Nested stages are attributed to the outer stage's cProfile and peak
+        profile = None
+        if outer is None and _CPROFILE_LOCK.acquire(blocking=False):
+            profile = cProfile.Profile()
+        if outer is None:
+            tracemalloc.reset_peak()
+        started = time.perf_counter()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+                _CPROFILE_LOCK.release()
+            wall = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1]
+
+            self._local.stage = outer
+            if outer is None:
+                self._thread_stage.pop(tid, None)
+            else:
+                self._thread_stage[tid] = outer
+
+            with self._lock:
+                stats = self.stages.get(name)
+                if stats is None:
+                    stats = self.stages[name] = StageStats(name)
+                stats.count += 1
+                stats.wall_sec += wall
+                if profile is not None:
+                    self._profiles.setdefault(name, []).append(profile)
+                if peak > stats.peak_bytes:
+                    stats.peak_bytes = peak
+                    stats.snapshot = tracemalloc.take_snapshot()
+
+    def _sample(self) -> None:
+        """Sampler thread: count the current stack of every other thread."""
+        own = threading.get_ident()
+        while not self._stop.wait(self.sample_interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                root = self._thread_stage.get(tid) or names.get(tid, "thread")
+                self._samples[";".join([root, *reversed(stack)])] += 1
+
+    @property
+    def peak_stage(self) -> StageStats | None:
+        """The stage with the highest traced memory peak."""
+        return max(self.stages.values(), key=lambda s: s.peak_bytes, default=None)
+
+    def summary(self) -> dict:
+        """Stage measurements, peak stage and written files as plain data."""
+        peak = self.peak_stage
+        return {
+            "stages": {
+                s.name: {
+                    "count": s.count,
+                    "wall_sec": round(s.wall_sec, 3),
+                    "peak_mb": round(s.peak_bytes / (1024 * 1024), 1),
+                }
+                for s in self.stages.values()
+            },
+            "peak_stage": peak.name if peak else None,
+            "files": list(self.files),
+        }
+
+    def _write_reports(self, total_sec: float) -> None:
+        for name, profiles in self._profiles.items():
+            stats = pstats.Stats(profiles[0])
+            for profile in profiles[1:]:
+                stats.add(profile)
+            path = f"{self.prefix}-{name}.prof"
+            stats.dump_stats(path)
+            self.files.append(path)
+
+        path = f"{self.prefix}.collapsed"
+        with open(path, "w", encoding="utf-8") as fh:
+            for stack, count in sorted(self._samples.items()):
+                fh.write(f"{stack} {count}\n")
+        self.files.append(path)
+
+        path = f"{self.prefix}-report.txt"
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write(self._render_report(total_sec))
+        self.files.append(path)
+
+        peak = self.peak_stage
+        if peak is not None:
+            log.info("Peak-memory stage: %s (%.1f MB)", peak.name, peak.peak_bytes / (1024 * 1024))
+        log.info("Profile written to %s-*", self.prefix)
+
+    def _render_report(self, total_sec: float) -> str:
+        out = io.StringIO()
+        out.write(f"ATS Mileage Sync profile  total={total_sec:.3f}s\n\n")
+        out.write(f"{'stage':<16} {'count':>6} {'wall s':>9} {'peak MB':>9}\n")
+        for s in sorted(self.stages.values(), key=lambda s: s.wall_sec, reverse=True):
+            out.write(f"{s.name:<16} {s.count:>6} {s.wall_sec:>9.3f} {s.peak_bytes / (1024 * 1024):>9.1f}\n")
+
+        peak = self.peak_stage
+        if peak is not None:
+            out.write(f"\nPeak-memory stage: {peak.name} ({peak.peak_bytes / (1024 * 1024):.1f} MB)\n")
+
+        for s in self.stages.values():
+            out.write(f"\n=== {s.name} ===\n")
+            profiles = self._profiles.get(s.name)
+            if profiles:
+                stats = pstats.Stats(profiles[0], stream=out)
+                for profile in profiles[1:]:
+                    stats.add(profile)
+                stats.sort_stats("cumulative").print_stats(self.top_n)
+            if s.snapshot is not None:
+                snapshot = s.snapshot.filter_traces((
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+                ))
+                out.write(f"Top {self.top_n} live allocations at the end of the peak occurrence:\n")
+                for stat in snapshot.statistics("lineno")[: self.top_n]:
+                    out.write(f"  {stat}\n")
+        return out.getvalue()
@@ -0,0 +1,239 @@
+"""
+Offline replay mode for ATS Mileage Sync.
+
+``python -m src.main replay --xml responses/*.xml.gz`` feeds saved
+wsMileageReport responses through the same parse, validation, dedup and
+insert path as a sync run, without calling TNB Mobil, and prints the
+per-stage timings of the job's ``*_seconds`` metrics. This gives a
+reproducible harness for comparing parser and writer changes on
+production-shaped payloads.
+
+The database is pluggable:
+
+- ``memory``: dict-backed adapter (src.memory_db), measures the pipeline alone
+- ``sqlite``: SQLite adapter (src.sqlite_db), in memory or in a file
+- ``mssql``: the real MsSql from the MSSQL_* settings; every file is
+  rolled back unless ``commit`` is set
+
+Files may be plain XML or gzip/zstd compressed (``.gz``/``.zst``, e.g.
+SOAP cache entries). The day a file is written under is taken from a
+YYYY-MM-DD in its name, or from ``--date``. Files are replayed in the
+given order on one connection, so a later file is deduplicated and
+validated against the rows an earlier one inserted. Archive sinks
+(ARCHIVE_SINKS) are written and committed along with the backend.
+Checkpoints, high-water marks and mails are never touched.
+"""
+
+import glob
+import gzip
+import re
+import time
+from collections.abc import Iterator
+from typing import BinaryIO
+
+from .config import Settings
+from .db import MsSql
+from .job import add_anomalies, write_pipeline
+from .logger import get_logger
+from .memory_db import MemoryKmLog
+from .metrics import metrics
+from .parser import MileageBatch, iter_mileage_batches, parse_mileage_response
+from .profiling import profile_stage
+from .sinks import Archive
+from .sqlite_db import SqliteKmLog
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+BACKENDS = ("memory", "sqlite", "mssql")
+
+_DATE_RE = re.compile(r"(\d{4}-\d{2}-\d{2})")
+_CHUNK_SIZE = 64 * 1024
+
+log = get_logger("replay")
+
+
+def open_backend(name: str, settings: Settings, *, sqlite_path: str = ":memory:"):
+    """
+    Open the database a replay writes to.
+
+    Args:
+        name: One of BACKENDS
+        settings: Application configuration settings (MSSQL_* for ``mssql``)
+        sqlite_path: Database file of the ``sqlite`` backend
+
+    Raises:
+        ValueError: If the backend is unknown
+    """
+    if name == "memory":
+        return MemoryKmLog()
+    if name == "sqlite":
+        return SqliteKmLog(sqlite_path)
+    if name == "mssql":
+        return MsSql.from_settings(settings)
+    raise ValueError(f"Unsupported replay backend: {name}")
+
+
+def expand_paths(patterns: list[str]) -> list[str]:
+    """
+    Expand glob patterns the shell left alone (e.g. on Windows), keeping order.
+
+    Raises:
+        ValueError: If a pattern matches no file
+    """
+    paths = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern))
+            if not matches:
+                raise ValueError(f"No files match {pattern}")
+            paths.extend(matches)
+        else:
+            paths.append(pattern)
+    return paths
+
+
+def replay_date(path: str, default: str | None = None) -> str:
+    """
+    Return the day a file is replayed under.
+
+    Raises:
+        ValueError: If the name has no YYYY-MM-DD and no default is given
+    """
+    match = _DATE_RE.search(path.replace("\\", "/").rsplit("/", 1)[-1])
+    if match:
+        return match.group(1)
+    if default:
+        return default
+    raise ValueError(f"No YYYY-MM-DD in {path}; pass --date")
+
+
+def _open_xml(path: str) -> BinaryIO:
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"{path} is zstd compressed, install zstandard to read it")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb")
+
+
+def _iter_chunks(path: str) -> Iterator[bytes]:
+    with _open_xml(path) as fh:
+        while chunk := fh.read(_CHUNK_SIZE):
+            yield chunk
+
+
+def _read_batches(path: str, settings: Settings) -> Iterator[MileageBatch]:
+    """Parse a saved response the way a sync run parses the SOAP body."""
+    if settings.soap_streaming:
+        # Read and parse happen lazily, inside the caller's "write" stage
+        return iter_mileage_batches(_iter_chunks(path), settings.parse_batch_size)
+
+    with metrics.timer("xml_read"), profile_stage("read"):
+        with _open_xml(path) as fh:
+            xml = fh.read().decode("utf-8")
+    with profile_stage("parse"):
+        batch = parse_mileage_response(xml)
+    return batch.chunks(settings.parse_batch_size)
+
+
+def run_replay(
+    paths: list[str],
+    settings: Settings,
+    *,
+    backend: str = "memory",
+    date_str: str | None = None,
+    sqlite_path: str = ":memory:",
+    commit: bool | None = None,
+) -> dict:
+    """
+    Replay saved SOAP responses through the write pipeline.
+
+    Args:
+        paths: Response files, replayed in this order
+        settings: Application configuration settings (write mode, dedup,
+            validation, batch sizes, streaming)
+        backend: One of BACKENDS
+        date_str: Day for files without a YYYY-MM-DD in their name
+        sqlite_path: Database file of the ``sqlite`` backend
+        commit: Commit every file; by default only the memory and sqlite
+            backends commit, mssql is rolled back
+
+    Returns:
+        Dictionary with run totals, a "files" list of per-file summaries
+        and a "stages" map of stage -> {count, p50, p95, total} seconds
+
+    Raises:
+        ValueError: If the backend is unknown or a file has no date
+    """
+    dates = [replay_date(path, date_str) for path in paths]
+    if commit is None:
+        commit = backend != "mssql"
+
+    metrics.reset()
+    archive = Archive.from_settings(settings)
+    db = open_backend(backend, settings, sqlite_path=sqlite_path)
+    log.info("Replaying %d files into %s (%s)", len(paths), backend, "commit" if commit else "rollback")
+
+    summary = {"backend": backend, "files": [], "inserted": 0, "skipped": 0, "errors": 0}
+    started = time.perf_counter()
+    try:
+        for path, day in zip(paths, dates):
+            part = {"file": path, "date": day, "inserted": 0, "skipped": 0, "errors": 0}
+            try:
+                write_pipeline(db, _read_batches(path, settings), day, settings, part, archive=archive, commit=commit)
+            except Exception as e:
+                part["errors"] += 1
+                log.exception("Replay of %s failed: %s", path, e)
+
+            log.info("%s (%s) | Inserted=%d Skipped=%d", path, day, part["inserted"], part["skipped"])
+            summary["files"].append(part)
+            for key in ("inserted", "skipped", "errors"):
+                summary[key] += part[key]
+    finally:
+        if archive is not None:
+            archive.close()
+        db.close()
+
+    add_anomalies(summary, summary["files"])
+
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    summary["records"] = int(metrics.counters.get("records_parsed_total", 0))
+    summary["stages"] = {
+        name.removesuffix("_seconds"): {
+            "count": hist.count,
+            "p50": round(hist.quantile(0.5), 6),
+            "p95": round(hist.quantile(0.95), 6),
+            "total": round(hist.sum, 6),
+        }
+        for name, hist in sorted(metrics.histograms.items())
+        if name.endswith("_seconds")
+    }
+    return summary
+
+
+def format_report(summary: dict) -> str:
+    """Render a run_replay summary as the plain-text timing report."""
+    seconds = summary["seconds"]
+    rate = summary["records"] / seconds if seconds else 0.0
+    lines = [
+        f"{'file':<40} {'date':<10} {'inserted':>9} {'skipped':>8} {'errors':>6}",
+        *(
+            f"{part['file'][-40:]:<40} {part['date']:<10} {part['inserted']:>9} "
+            f"{part['skipped']:>8} {part['errors']:>6}"
+            for part in summary["files"]
+        ),
+        "",
+        f"backend={summary['backend']} records={summary['records']} seconds={seconds:.3f} "
+        f"rec/s={rate:.0f} quarantined={summary.get('quarantined', 0)}",
+        "",
+        f"{'stage':<18} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'total ms':>9}",
+    ]
+    for stage, s in sorted(summary["stages"].items(), key=lambda item: item[1]["total"], reverse=True):
+        lines.append(
+            f"{stage:<18} {s['count']:>6} {s['p50'] * 1000:>9.2f} {s['p95'] * 1000:>9.2f} {s['total'] * 1000:>9.1f}"
+        )
+    return "\n".join(lines)
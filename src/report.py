@@ -0,0 +1,305 @@
+"""
+Summary mail rendering for ATS Mileage Sync.
+
+Builds the HTML bodies of the daily, range and error mails. Tables are
+formatted into a list and joined once, so rendering stays linear in the
+fleet size (the previous ``rows += ...`` loop relied on CPython's in-place
+concatenation shortcut and turned quadratic under a profiler). Above
+``max_rows`` records the table is left out of the HTML and the records
+are attached as a gzip-compressed CSV instead, keeping the mail small
+enough for mail servers and clients.
+"""
+
+import csv
+import gzip
+import io
+from collections.abc import Iterable
+from html import escape
+
+from .mail_client import Attachment
+from .parser import MileageBatch
+
+_TABLE_OPEN = '<table border="1" cellpadding="6" cellspacing="0">'
+# Cell and row separators while rendering; control characters cannot occur in XML text
+_CELL = "\x00"
+_ROW = "\x01"
+
+
+def _table(headers: Iterable[str], rows: Iterable[tuple], columns: Iterable[int] | None = None) -> str:
+    """
+    Render an HTML table.
+
+    All cells are formatted into one string with separator characters,
+    escaped in a single pass and only then turned into markup, which keeps
+    large tables linear and cheap.
+
+    Args:
+        headers: Column titles
+        rows: Row tuples
+        columns: Indexes into each row, in display order (default: all, in order)
+    """
+    headers = tuple(headers)
+    columns = range(len(headers)) if columns is None else columns
+    fmt = _CELL.join(f"{{{idx}}}" for idx in columns).format
+    cells = [fmt(*row) for row in rows]
+
+    parts = [_TABLE_OPEN, "<tr>", *(f"<th>{h}</th>" for h in headers), "</tr>\n"]
+    if cells:
+        body = escape(_ROW.join(cells), quote=False)
+        parts += ["<tr><td>", body.replace(_CELL, "</td><td>").replace(_ROW, "</td></tr>\n<tr><td>"), "</td></tr>\n"]
+    parts.append("</table>")
+    return "".join(parts)
+
+
+def csv_attachment(filename: str, headers: Iterable[str], rows: Iterable[tuple]) -> Attachment:
+    """
+    Write rows as a gzip-compressed CSV attachment.
+
+    The CSV is streamed through the compressor, so only the compressed
+    bytes are held in memory. UTF-8 with BOM, so Excel shows Turkish
+    characters correctly.
+    """
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode="wb", compresslevel=6, mtime=0) as gz:
+        with io.TextIOWrapper(gz, encoding="utf-8-sig", newline="") as text:
+            writer = csv.writer(text)
+            writer.writerow(headers)
+            writer.writerows(rows)
+    return Attachment(filename=f"{filename}.csv.gz", data=buf.getvalue())
+
+
+def _records(
+    headers: tuple[str, ...],
+    rows: Iterable[tuple],
+    columns: tuple[int, ...],
+    count: int,
+    filename: str,
+    max_rows: int,
+) -> tuple[str, list[Attachment]]:
+    """Render the record table inline, or as a CSV attachment above max_rows."""
+    if count <= max_rows:
+        return _table(headers, rows, columns), []
+    note = f"<p><b>{count}</b> kayıt ekteki <code>{filename}.csv.gz</code> dosyasındadır.</p>"
+    return note, [csv_attachment(filename, headers, (tuple(row[idx] for idx in columns) for row in rows))]
+
+
+def build_metrics_table(snapshot: dict | None) -> str:
+    """Render stage timings and counters of a metrics snapshot (empty if metrics are off)."""
+    if not snapshot:
+        return ""
+
+    stages = _table(
+        ("Aşama", "Adet", "Toplam (sn)", "p95 (sn)"),
+        (
+            (name.removesuffix("_seconds"), hist["count"], f"{hist['sum']:.3f}", f"{hist['p95']:.3f}")
+            for name, hist in sorted(snapshot["histograms"].items())
+        ),
+    )
+    counters = "".join(
+        f"<li><b>{name}:</b> {value:g}</li>" for name, value in sorted(snapshot["counters"].items())
+    )
+    return f"{stages}\n<ul>{counters}</ul>"
+
+
+def _totals(summary: dict) -> str:
+    # Only incremental runs count devices dropped at parse time
+    unchanged = (
+        f"<li><b>Skip (Değişmeyen):</b> {summary['unchanged']}</li>" if "unchanged" in summary else ""
+    )
+    # Rows flagged by the validation stage, quarantined or (report mode) only counted
+    anomalies = ""
+    if summary.get("anomalies"):
+        counts = ", ".join(f"{reason}: {count}" for reason, count in sorted(summary["anomalies"].items()))
+        label = f"Karantina ({summary['quarantined']})" if "quarantined" in summary else "Anomali"
+        anomalies = f"<li><b>{label}:</b> {counts}</li>"
+    return (
+        "<ul>"
+        f"<li><b>Insert:</b> {summary['inserted']}</li>"
+        f"<li><b>Skip (Duplicate):</b> {summary['skipped']}</li>"
+        f"{unchanged}"
+        f"{anomalies}"
+        f"<li><b>Hata:</b> {summary['errors']}</li>"
+        "</ul>"
+    )
+
+
+def build_summary_mail(
+    date_str: str,
+    summary: dict,
+    records: MileageBatch,
+    *,
+    max_rows: int = 1000,
+) -> tuple[str, list[Attachment]]:
+    """
+    Render the daily summary mail.
+
+    Args:
+        date_str: Day in YYYY-MM-DD format
+        summary: Job summary (inserted/skipped/errors, optional metrics)
+        records: Inserted records
+        max_rows: Largest record table rendered inline
+
+    Returns:
+        HTML body and attachments
+    """
+    table, attachments = _records(
+        ("Plaka", "DeviceId", "KM"),
+        records.rows(),
+        (1, 0, 2),
+        len(records),
+        f"ats-mileage-{date_str}",
+        max_rows,
+    )
+    html = f"""
+    <h3>ATS Mileage Günlük Senkronizasyon</h3>
+
+    <p><b>Tarih:</b> {date_str}</p>
+
+    {_totals(summary)}
+
+    {build_metrics_table(summary.get('metrics'))}
+
+    {table}
+    """
+    return html, attachments
+
+
+def build_range_summary_mail(
+    summary: dict,
+    records_by_day: dict[str, MileageBatch],
+    *,
+    max_rows: int = 1000,
+) -> tuple[str, list[Attachment]]:
+    """
+    Render the summary mail of a range run.
+
+    Args:
+        summary: Range summary with the per-day "days" list
+        records_by_day: Inserted records per YYYY-MM-DD day
+        max_rows: Largest record table rendered inline
+
+    Returns:
+        HTML body and attachments
+    """
+    days = _table(
+        ("Tarih", "Insert", "Skip", "Hata"),
+        ((day["date"], day["inserted"], day["skipped"], day["errors"]) for day in summary["days"]),
+    )
+    table, attachments = _records(
+        ("Tarih", "Plaka", "DeviceId", "KM"),
+        (
+            (date_str, *row)
+            for date_str, records in sorted(records_by_day.items())
+            for row in records.rows()
+        ),
+        (0, 2, 1, 3),
+        sum(len(records) for records in records_by_day.values()),
+        f"ats-mileage-{summary['from']}_{summary['to']}",
+        max_rows,
+    )
+    html = f"""
+    <h3>ATS Mileage Toplu Senkronizasyon</h3>
+
+    <p><b>Tarih Aralığı:</b> {summary['from']} - {summary['to']}</p>
+
+    {_totals(summary)}
+
+    {days}
+
+    <br>
+
+    {build_metrics_table(summary.get('metrics'))}
+
+    {table}
+    """
+    return html, attachments
+
+
+def build_company_summary_mail(
+    summary: dict,
+    records_by_company: dict[tuple[str, str], MileageBatch],
+    *,
+    max_rows: int = 1000,
+) -> tuple[str, list[Attachment]]:
+    """
+    Render the consolidated summary mail of a multi-company run.
+
+    Args:
+        summary: Run summary with the per-company "companies" list
+        records_by_company: Inserted records per (company, YYYY-MM-DD day)
+        max_rows: Largest record table rendered inline
+
+    Returns:
+        HTML body and attachments
+    """
+    companies = _table(
+        ("Şirket", "Insert", "Skip", "Hata", "SOAP (sn)", "SOAP (MB)"),
+        (
+            (
+                company["company"],
+                company["inserted"],
+                company["skipped"] + company.get("unchanged", 0),
+                company["errors"],
+                f"{company['soap_seconds']:.1f}",
+                f"{company['soap_bytes'] / 1e6:.1f}",
+            )
+            for company in summary["companies"]
+        ),
+    )
+    table, attachments = _records(
+        ("Şirket", "Tarih", "Plaka", "DeviceId", "KM"),
+        (
+            (company, date_str, *row)
+            for (company, date_str), records in sorted(records_by_company.items())
+            for row in records.rows()
+        ),
+        (0, 1, 3, 2, 4),
+        sum(len(records) for records in records_by_company.values()),
+        f"ats-mileage-{summary['from']}_{summary['to']}-companies",
+        max_rows,
+    )
+    period = summary["from"] if summary["from"] == summary["to"] else f"{summary['from']} - {summary['to']}"
+    html = f"""
+    <h3>ATS Mileage Çoklu Şirket Senkronizasyonu</h3>
+
+    <p><b>Tarih:</b> {period}</p>
+
+    {_totals(summary)}
+
+    {companies}
+
+    <br>
+
+    {build_metrics_table(summary.get('metrics'))}
+
+    {table}
+    """
+    return html, attachments
+
+
+def build_error_mail(date_str: str, summary: dict, error: BaseException, *, resumable: bool = False) -> str:
+    """
+    Render the mail sent when a daily run fails and is rolled back.
+
+    Args:
+        date_str: Day in YYYY-MM-DD format
+        summary: Job summary at the time of the failure
+        error: The exception that aborted the run
+        resumable: A checkpoint was kept, so a rerun continues where this one stopped
+    """
+    resume = (
+        "<p>Checkpoint korundu; yeniden çalıştırma kaldığı yerden devam eder.</p>" if resumable else ""
+    )
+    return f"""
+    <h3>ATS Mileage Senkronizasyon Hatası</h3>
+
+    <p><b>Tarih:</b> {date_str}</p>
+
+    <p><b>Hata:</b> {escape(f"{type(error).__name__}: {error}")}</p>
+
+    <p>Commit edilmemiş kayıtlar geri alındı (rollback).</p>
+
+    {resume}
+
+    {_totals(summary)}
+    """
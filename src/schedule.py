@@ -0,0 +1,134 @@
+"""
+Cron expressions for the serve mode of ATS Mileage Sync.
+
+Supports the standard five fields (minute, hour, day of month, month, day
+of week) with ``*``, lists, ranges and steps, plus the ``@hourly``,
+``@daily``/``@midnight`` and ``@weekly`` shortcuts. As in cron, when both
+day fields are restricted a day matches if either of them does. Only a
+bare ``*`` leaves a day field unrestricted: a step or range such as
+``*/2`` or ``1-31`` counts as a restriction (Vixie cron would treat
+``*/2`` as unrestricted).
+"""
+
+from datetime import datetime, timedelta
+
+_SHORTCUTS = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+}
+
+# name -> (lowest, highest) value
+_FIELDS = (
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("day", 1, 31),
+    ("month", 1, 12),
+    ("weekday", 0, 7),  # 0 and 7 are Sunday
+)
+
+
+def _parse_field(spec: str, name: str, low: int, high: int) -> frozenset[int]:
+    """
+    Expand one field into the set of matching values.
+
+    Raises:
+        ValueError: If the field is malformed or out of range
+    """
+    values: set[int] = set()
+    for part in spec.split(","):
+        expr, _, step_txt = part.partition("/")
+        try:
+            step = int(step_txt) if step_txt else 1
+            if expr == "*":
+                start, end = low, high
+            elif "-" in expr:
+                start, end = (int(x) for x in expr.split("-", 1))
+            else:
+                start = int(expr)
+                end = high if step_txt else start
+        except ValueError:
+            raise ValueError(f"Invalid cron {name} field: {spec!r}") from None
+        if step < 1 or not low <= start <= end <= high:
+            raise ValueError(f"Invalid cron {name} field: {spec!r}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+def _unrestricted(spec: str) -> bool:
+    """True for a bare ``*``; any step, range or list restricts the field."""
+    return spec == "*"
+
+
+class CronSchedule:
+    """
+    Parsed cron expression.
+
+    Attributes:
+        expr: The expression as given
+    """
+
+    def __init__(self, expr: str):
+        """
+        Args:
+            expr: Five-field cron expression or one of the @ shortcuts
+
+        Raises:
+            ValueError: If the expression is malformed
+        """
+        self.expr = expr
+        parts = _SHORTCUTS.get(expr.strip(), expr).split()
+        if len(parts) != len(_FIELDS):
+            raise ValueError(f"Cron expression needs {len(_FIELDS)} fields: {expr!r}")
+
+        minutes, hours, days, months, weekdays = (
+            _parse_field(spec, name, low, high) for spec, (name, low, high) in zip(parts, _FIELDS)
+        )
+        self.minutes = minutes
+        self.hours = hours
+        self.days = days
+        self.months = months
+        self.weekdays = frozenset(d % 7 for d in weekdays)
+        self._any_day = _unrestricted(parts[2])
+        self._any_weekday = _unrestricted(parts[4])
+
+    def _day_matches(self, dt: datetime) -> bool:
+        day_ok = dt.day in self.days
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays  # cron counts from Sunday
+        if self._any_day or self._any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def matches(self, dt: datetime) -> bool:
+        """True if the schedule fires in the minute of ``dt``."""
+        return (
+            dt.minute in self.minutes
+            and dt.hour in self.hours
+            and dt.month in self.months
+            and self._day_matches(dt)
+        )
+
+    def next_after(self, dt: datetime) -> datetime:
+        """
+        Return the first matching minute strictly after ``dt``.
+
+        Raises:
+            ValueError: If nothing matches within the next five years
+                (e.g. ``0 0 31 2 *``)
+        """
+        cursor = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = cursor + timedelta(days=366 * 5)
+        while cursor < limit:
+            if cursor.month not in self.months or not self._day_matches(cursor):
+                cursor = cursor.replace(hour=0, minute=0) + timedelta(days=1)
+            elif cursor.hour not in self.hours:
+                cursor = cursor.replace(minute=0) + timedelta(hours=1)
+            elif cursor.minute not in self.minutes:
+                cursor += timedelta(minutes=1)
+            else:
+                return cursor
+        raise ValueError(f"Cron expression never matches: {self.expr!r}")
+
+    def __repr__(self) -> str:
+        return f"CronSchedule({self.expr!r})"
@@ -0,0 +1,298 @@
+"""
+Sharded SOAP fetch strategy for ATS Mileage Sync.
+
+Large fleets make a single full-day wsMileageReport response slow enough to
+hit the request timeout. This module splits a day into time-window and/or
+per-device shards, fetches them concurrently over a shared SoapClient,
+splits a shard further when it times out or its response is too large, and
+merges the results back into one record per device.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import requests
+from urllib3.exceptions import TimeoutError as Urllib3TimeoutError
+
+from .parser import MileageBatch, iter_mileage_batches
+from .soap_client import SoapClient
+from .logger import get_logger
+
+log = get_logger("shard")
+
+ISO_FORMAT = "%Y-%m-%dT%H:%M:%S"
+MERGE_POLICIES = ("max", "last")
+
+
+class ShardTooLarge(Exception):
+    """Raised when a shard response exceeds the configured size limit."""
+
+
+@dataclass(frozen=True, slots=True)
+class Shard:
+    """
+    One SOAP request of a sharded fetch.
+
+    Attributes:
+        start: First second of the window (inclusive)
+        end: Last second of the window (inclusive)
+        device_id: Single device to request, empty for the whole fleet
+        depth: How many times this shard has been split from the original
+    """
+    start: datetime
+    end: datetime
+    device_id: str = ""
+    depth: int = 0
+
+    @property
+    def minutes(self) -> float:
+        return ((self.end - self.start).total_seconds() + 1) / 60
+
+    def __str__(self) -> str:
+        device = f" device={self.device_id}" if self.device_id else ""
+        return f"{self.start.strftime(ISO_FORMAT)}..{self.end.strftime(ISO_FORMAT)}{device}"
+
+
+def plan_shards(
+    day: datetime,
+    *,
+    window_minutes: int = 0,
+    device_ids: tuple[str, ...] = (),
+    start: datetime | None = None,
+) -> list[Shard]:
+    """
+    Build the initial shard list for a day.
+
+    Args:
+        day: Day to fetch (time part is ignored)
+        window_minutes: Window length; 0 or >= 1440 keeps the full day
+        device_ids: If given, one shard per device and window
+        start: Fetch from this time of the day instead of 00:00:00 (incremental runs)
+
+    Returns:
+        Shards covering 00:00:00 (or ``start``) to 23:59:59 of the day
+    """
+    day_start = day.replace(hour=0, minute=0, second=0, microsecond=0)
+    day_end = day_start + timedelta(days=1)
+    step = timedelta(minutes=window_minutes) if 0 < window_minutes < 1440 else timedelta(days=1)
+
+    windows = []
+    cursor = max(day_start, start) if start is not None else day_start
+    while cursor < day_end:
+        nxt = min(cursor + step, day_end)
+        windows.append((cursor, nxt - timedelta(seconds=1)))
+        cursor = nxt
+
+    devices = device_ids or ("",)
+    return [Shard(s, e, device) for s, e in windows for device in devices]
+
+
+def split_shard(shard: Shard, *, min_minutes: int, device_ids: tuple[str, ...] = ()) -> list[Shard]:
+    """
+    Split a shard that timed out or was too large.
+
+    Time windows are halved until they reach ``min_minutes``; a whole-fleet
+    shard at the minimum window is then fanned out per device if a device
+    list is known.
+
+    Args:
+        shard: Shard to split
+        min_minutes: Smallest window that may be halved further
+        device_ids: Known devices for per-device fan-out
+
+    Returns:
+        Replacement shards, or an empty list if the shard cannot be split
+    """
+    if shard.minutes >= 2 * max(1, min_minutes):
+        half = timedelta(seconds=int(((shard.end - shard.start).total_seconds() + 1) // 2))
+        mid = shard.start + half
+        return [
+            Shard(shard.start, mid - timedelta(seconds=1), shard.device_id, shard.depth + 1),
+            Shard(mid, shard.end, shard.device_id, shard.depth + 1),
+        ]
+
+    if not shard.device_id and device_ids:
+        return [Shard(shard.start, shard.end, device, shard.depth + 1) for device in device_ids]
+
+    return []
+
+
+def merge_batches(batches: list[MileageBatch], policy: str = "max") -> MileageBatch:
+    """
+    Merge shard results into one row per device.
+
+    Devices keep the order of their first appearance. The first non-empty
+    plate wins. Mileage is an odometer reading (see
+    src.parser.MileageRecord), so the shards of one device are combined
+    according to ``policy``:
+
+    * ``max``  - the highest reading wins
+    * ``last`` - the reading from the latest shard wins
+
+    Summing is deliberately not offered: adding the readings of several
+    time windows would not give the distance driven.
+
+    NULL mileages are ignored; a device with only NULLs stays NULL.
+
+    Args:
+        batches: Shard results in shard (time) order
+        policy: One of MERGE_POLICIES
+
+    Returns:
+        Merged MileageBatch
+
+    Raises:
+        ValueError: If policy is unknown
+    """
+    if policy not in MERGE_POLICIES:
+        raise ValueError(f"Unsupported shard merge policy: {policy} (use one of {', '.join(MERGE_POLICIES)})")
+
+    plates: dict[str, str | None] = {}
+    mileages: dict[str, int | None] = {}
+
+    for batch in batches:
+        for device_id, plate, mileage in batch.rows():
+            if device_id not in plates:
+                plates[device_id] = plate
+                mileages[device_id] = mileage
+                continue
+
+            if not plates[device_id]:
+                plates[device_id] = plate
+
+            current = mileages[device_id]
+            if mileage is None:
+                continue
+            if current is None or policy == "last":
+                mileages[device_id] = mileage
+            else:
+                mileages[device_id] = max(current, mileage)
+
+    merged = MileageBatch()
+    for device_id, plate in plates.items():
+        merged.append(device_id, plate, mileages[device_id])
+    return merged
+
+
+def _is_timeout(exc: BaseException) -> bool:
+    """True if a requests exception was ultimately caused by a timeout."""
+    if isinstance(exc, requests.Timeout):
+        return True
+    reason = exc.args[0] if exc.args else None
+    reason = getattr(reason, "reason", reason)
+    return isinstance(reason, Urllib3TimeoutError)
+
+
+def fetch_shard(client: SoapClient, shard: Shard, *, max_bytes: int = 0) -> MileageBatch:
+    """
+    Fetch and parse a single shard.
+
+    Args:
+        client: SOAP client to use
+        shard: Shard to fetch
+        max_bytes: Abort with ShardTooLarge once the body exceeds this size (0 = no limit)
+
+    Returns:
+        Parsed records of the shard
+
+    Raises:
+        ShardTooLarge: If the response exceeds max_bytes
+        requests.RequestException: On HTTP or network errors
+    """
+    stream = client.stream(shard.start.strftime(ISO_FORMAT), shard.end.strftime(ISO_FORMAT), shard.device_id)
+
+    def _limited():
+        total = 0
+        for chunk in stream:
+            total += len(chunk)
+            if max_bytes and total > max_bytes:
+                stream.close()
+                raise ShardTooLarge(f"shard {shard} exceeded {max_bytes} bytes")
+            yield chunk
+
+    batch = MileageBatch()
+    for part in iter_mileage_batches(_limited(), 50_000):
+        batch.extend(part)
+    return batch
+
+
+def fetch_sharded(
+    client: SoapClient,
+    settings,
+    day: datetime,
+    *,
+    start: datetime | None = None,
+    device_ids: tuple[str, ...] | None = None,
+) -> MileageBatch:
+    """
+    Fetch one day as concurrent shards and merge the result.
+
+    Shards that time out or exceed settings.soap_max_response_mb are split
+    (see split_shard) and re-queued; any other error, or a shard that can
+    no longer be split, fails the whole fetch.
+
+    Args:
+        client: SOAP client (its pool should allow soap_shard_concurrency connections)
+        settings: Application configuration settings
+        day: Day to fetch
+        start: First second to fetch (default: start of the day)
+        device_ids: Devices to request (default: settings.soap_device_ids)
+
+    Returns:
+        Merged MileageBatch with one row per device
+
+    Raises:
+        ShardTooLarge: If a shard is too large and cannot be split further
+        requests.RequestException: On unrecoverable HTTP or network errors
+    """
+    if device_ids is None:
+        device_ids = settings.soap_device_ids
+    shards = plan_shards(
+        day,
+        window_minutes=settings.soap_shard_minutes,
+        device_ids=device_ids if settings.soap_shard_by_device else (),
+        start=start,
+    )
+    max_bytes = int(settings.soap_max_response_mb * 1024 * 1024)
+    results: dict[Shard, MileageBatch] = {}
+
+    log.debug(
+        "%s planned %d shards (concurrency=%d)",
+        day.strftime("%Y-%m-%d"),
+        len(shards),
+        settings.soap_shard_concurrency,
+    )
+
+    with ThreadPoolExecutor(
+        max_workers=max(1, settings.soap_shard_concurrency), thread_name_prefix="soap-shard"
+    ) as pool:
+        pending: dict[Future, Shard] = {
+            pool.submit(fetch_shard, client, shard, max_bytes=max_bytes): shard for shard in shards
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                shard = pending.pop(future)
+                try:
+                    results[shard] = future.result()
+                    continue
+                except ShardTooLarge:
+                    reason = "too large"
+                except requests.RequestException as e:
+                    if not _is_timeout(e):
+                        raise
+                    reason = "timed out"
+
+                parts = split_shard(shard, min_minutes=settings.soap_min_shard_minutes, device_ids=device_ids)
+                if not parts:
+                    raise ShardTooLarge(f"shard {shard} {reason} and cannot be split further")
+
+                log.info("%s %s, splitting into %d shards", shard, reason, len(parts))
+                for part in parts:
+                    pending[pool.submit(fetch_shard, client, part, max_bytes=max_bytes)] = part
+
+    ordered = [results[s] for s in sorted(results, key=lambda s: (s.start, s.device_id))]
+    merged = merge_batches(ordered, settings.soap_shard_merge)
+    log.debug("%s merged %d shards into %d devices", day.strftime("%Y-%m-%d"), len(results), len(merged))
+    return merged
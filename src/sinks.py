@@ -0,0 +1,306 @@
+"""
+Output sinks of ATS Mileage Sync.
+
+``dbo.arac_km_log`` stays the system of record and is written by
+src.db.MsSql directly, not through the Sink interface: dedup, validation
+and the write modes need its query API. The rows it inserts are handed to
+the archive sinks configured in ARCHIVE_SINKS, so the archive holds what
+the table got and analysts can query history offline instead of scanning
+the OLTP table:
+
+- ``parquet``: columnar Parquet (pyarrow, zstd), written in row groups of
+  ARCHIVE_ROW_GROUP_SIZE rows
+- ``csv``: gzip-compressed CSV, streamed batch by batch
+
+Each format has its own dataset, partitioned Hive-style by day::
+
+    <ARCHIVE_DIR>/parquet/arac_km_log/date=2026-01-06/part-<run>-<n>.parquet
+    <ARCHIVE_DIR>/csv/arac_km_log/date=2026-01-06/part-<run>-<n>.csv.gz
+
+which DuckDB, Spark or pyarrow.dataset read as one table with a ``date``
+column; multi-company runs add a ``company=<name>`` level above the day
+(e.g. ``read_parquet('archive/parquet/arac_km_log/*/*.parquet',
+hive_partitioning=true)``). Sinks follow the database transaction in two
+phases: rows are streamed into a hidden ``.tmp`` part file, prepare()
+finishes and flushes it before the database commits, and commit() then
+only renames it into place; rollback() deletes it. Memory stays bounded by
+one batch (one row group for Parquet) and a failed day leaves no partial
+file. Should a rename still fail after the database committed, the
+finished ``.tmp`` file is kept and logged so it can be moved into place.
+Every commit starts a new part file, so reruns and intra-day syncs add
+files to the partition instead of rewriting it; a row replaced by a later
+run of a day that was still open appears again in a newer part.
+"""
+
+import csv
+import gzip
+import os
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+import numpy as np
+
+from .logger import get_logger
+from .metrics import metrics
+from .parser import MileageBatch
+
+FORMATS = ("parquet", "csv")
+
+COLUMNS = ("DeviceId", "License_Plate", "Mileage")
+
+log = get_logger("sinks")
+
+
+class Sink(ABC):
+    """
+    Destination of the rows a run inserts.
+
+    write() runs inside the run's transaction. prepare() is called before
+    the database commit and does all the work that can fail; commit(),
+    called after it, makes the written rows visible and rollback() drops
+    them.
+    """
+
+    @abstractmethod
+    def write(self, batch: MileageBatch, date_str: str) -> None:
+        """Add inserted rows of a day."""
+
+    @abstractmethod
+    def prepare(self) -> None:
+        """Finish and flush everything written since the last commit."""
+
+    @abstractmethod
+    def commit(self) -> None:
+        """Publish what prepare() finished; must not lose rows the database committed."""
+
+    @abstractmethod
+    def rollback(self) -> None:
+        """Drop everything written since the last commit."""
+
+    def close(self) -> None:
+        """Release the sink; uncommitted rows are dropped."""
+        self.rollback()
+
+
+class _CsvPart:
+    """One gzip CSV part file being written."""
+
+    def __init__(self, path: str):
+        self._fh = gzip.open(path, "wt", encoding="utf-8", newline="", compresslevel=6)
+        self._writer = csv.writer(self._fh)
+        self._writer.writerow(COLUMNS)
+
+    def write(self, batch: MileageBatch) -> None:
+        self._writer.writerows(batch.rows())
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+class _ParquetPart:
+    """One Parquet part file being written, flushed one row group at a time."""
+
+    def __init__(self, path: str, row_group_size: int):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._schema = pa.schema(
+            [("DeviceId", pa.string()), ("License_Plate", pa.string()), ("Mileage", pa.int64())]
+        )
+        self._writer = pq.ParquetWriter(path, self._schema, compression="zstd")
+        self.row_group_size = max(1, row_group_size)
+        self._pending = MileageBatch()
+
+    def write(self, batch: MileageBatch) -> None:
+        self._pending.extend(batch)
+        if len(self._pending) < self.row_group_size:
+            return
+        rest = MileageBatch()
+        for chunk in self._pending.chunks(self.row_group_size):
+            if len(chunk) < self.row_group_size:
+                rest = chunk
+            else:
+                self._write_group(chunk)
+        self._pending = rest
+
+    def _write_group(self, batch: MileageBatch) -> None:
+        pa = self._pa
+        missing = np.frombuffer(batch.mileage_mask, dtype=np.uint8) == 0
+        table = pa.Table.from_arrays(
+            [
+                pa.array(batch.device_ids, type=pa.string()),
+                pa.array(batch.plates, type=pa.string()),
+                pa.array(np.frombuffer(batch.mileages, dtype=np.int64), mask=missing),
+            ],
+            schema=self._schema,
+        )
+        self._writer.write_table(table, row_group_size=len(batch))
+
+    def close(self) -> None:
+        if self._pending:
+            self._write_group(self._pending)
+            self._pending = MileageBatch()
+        self._writer.close()
+
+
+class ArchiveSink(Sink):
+    """
+    Date-partitioned file archive in one format.
+
+    Attributes:
+        files: Part files committed so far
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        fmt: str,
+        *,
+        row_group_size: int = 100_000,
+        table: str = "arac_km_log",
+        company: str = "",
+    ):
+        """
+        Args:
+            directory: Archive root (created if missing)
+            fmt: One of FORMATS
+            row_group_size: Rows per Parquet row group
+            table: Name of the dataset directory below ``<directory>/<fmt>``
+            company: Company partition of a multi-company run, empty for none
+
+        Raises:
+            ValueError: If the format is unknown
+            RuntimeError: If the format needs a package that is not installed
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported archive sink: {fmt}")
+        if fmt == "parquet":
+            try:
+                import pyarrow.parquet  # noqa: F401
+            except ImportError:
+                raise RuntimeError("ARCHIVE_SINKS=parquet needs the pyarrow package") from None
+
+        self.root = os.path.join(directory, fmt, table)
+        if company:
+            self.root = os.path.join(self.root, f"company={company}")
+        self.fmt = fmt
+        self.row_group_size = row_group_size
+        self.files: list[str] = []
+        self._suffix = ".parquet" if fmt == "parquet" else ".csv.gz"
+        self._run = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self._seq = 0
+        # date -> (final path, open part)
+        self._open: dict[str, tuple[str, _CsvPart | _ParquetPart]] = {}
+        # Final paths of finished parts waiting for commit()
+        self._prepared: list[str] = []
+
+    def _tmp(self, path: str) -> str:
+        directory, name = os.path.split(path)
+        return os.path.join(directory, f".{name}.tmp")
+
+    def write(self, batch: MileageBatch, date_str: str) -> None:
+        if not batch:
+            return
+        with metrics.timer("archive_write"):
+            entry = self._open.get(date_str)
+            if entry is None:
+                self._seq += 1
+                directory = os.path.join(self.root, f"date={date_str}")
+                os.makedirs(directory, exist_ok=True)
+                path = os.path.join(directory, f"part-{self._run}-{self._seq:04d}{self._suffix}")
+                if self.fmt == "parquet":
+                    part = _ParquetPart(self._tmp(path), self.row_group_size)
+                else:
+                    part = _CsvPart(self._tmp(path))
+                entry = self._open[date_str] = (path, part)
+            entry[1].write(batch)
+        metrics.inc(f"archive_{self.fmt}_rows_total", len(batch))
+
+    def prepare(self) -> None:
+        with metrics.timer("archive_prepare"):
+            for date_str, (path, part) in list(self._open.items()):
+                part.close()
+                del self._open[date_str]
+                self._prepared.append(path)
+
+    def commit(self) -> None:
+        self.prepare()
+        prepared, self._prepared = self._prepared, []
+        for path in prepared:
+            try:
+                os.replace(self._tmp(path), path)
+            except OSError as e:
+                metrics.inc("archive_commit_errors_total")
+                log.error(
+                    "Archive part %s not moved into place (%s); finished file kept as %s", path, e, self._tmp(path)
+                )
+                continue
+            self.files.append(path)
+            log.debug("Archived %s", path)
+
+    def rollback(self) -> None:
+        opened, self._open = self._open, {}
+        prepared, self._prepared = self._prepared, []
+        for path, part in opened.values():
+            try:
+                part.close()
+            finally:
+                os.remove(self._tmp(path))
+        for path in prepared:
+            os.remove(self._tmp(path))
+
+
+class Archive(Sink):
+    """Fans the inserted rows out to every configured archive sink."""
+
+    def __init__(self, sinks: list[Sink]):
+        self.sinks = sinks
+
+    @classmethod
+    def from_settings(cls, settings, *, company: str = "") -> "Archive | None":
+        """
+        Build the archive sinks of ARCHIVE_SINKS.
+
+        Args:
+            settings: Application configuration settings
+            company: Company partition of a multi-company run
+
+        Returns:
+            Archive, or None when no sink is configured
+
+        Raises:
+            ValueError: If a sink name is unknown
+            RuntimeError: If a sink needs a package that is not installed
+        """
+        if not settings.archive_sinks:
+            return None
+        return cls([
+            ArchiveSink(settings.archive_dir, fmt, row_group_size=settings.archive_row_group_size, company=company)
+            for fmt in settings.archive_sinks
+        ])
+
+    @property
+    def files(self) -> list[str]:
+        """Part files committed by all sinks."""
+        return [path for sink in self.sinks for path in getattr(sink, "files", ())]
+
+    def write(self, batch: MileageBatch, date_str: str) -> None:
+        for sink in self.sinks:
+            sink.write(batch, date_str)
+
+    def prepare(self) -> None:
+        for sink in self.sinks:
+            sink.prepare()
+
+    def commit(self) -> None:
+        for sink in self.sinks:
+            sink.commit()
+
+    def rollback(self) -> None:
+        for sink in self.sinks:
+            try:
+                sink.rollback()
+            except OSError as e:
+                log.warning("Archive rollback failed: %s", e)
@@ -5,8 +5,22 @@ This module handles SOAP web service communication for fetching mileage data
 from external reporting services using XML-based SOAP envelopes.
 """
 
+import time
+from collections import deque
+from datetime import datetime
+from xml.sax.saxutils import escape
+from collections.abc import Iterator
+from dataclasses import dataclass
+
 import requests
-from .logger import log_debug
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .cache import ResponseCache
+from .logger import get_logger
+from .metrics import metrics
+
+log = get_logger("soap")
 
 # SOAP Envelope Template for mileage report requests
 SOAP_ENVELOPE_TEMPLATE = """<?xml version="1.0" encoding="utf-8"?>
@@ -20,7 +34,7 @@ SOAP_ENVELOPE_TEMPLATE = """<?xml version="1.0" encoding="utf-8"?>
         <Password>{password}</Password>
         <CompanyCode>{company_code}</CompanyCode>
       </User>
-      <DeviceID></DeviceID>
+      <DeviceID>{device_id}</DeviceID>
       <Startdate>{start_date}</Startdate>
       <Enddate>{end_date}</Enddate>
     </wsMileageReport>
@@ -29,6 +43,369 @@ SOAP_ENVELOPE_TEMPLATE = """<?xml version="1.0" encoding="utf-8"?>
 """
 
 
+@dataclass(slots=True)
+class RequestStats:
+    """
+    Timing and size of a single SOAP request.
+
+    Attributes:
+        start_date: Requested window start (ISO format)
+        end_date: Requested window end (ISO format)
+        device_id: Requested device, empty for the whole fleet
+        status: HTTP status code of the final response
+        elapsed_sec: Wall time from sending the request to the last body byte
+        wire_bytes: Body bytes received on the wire (compressed if gzip/deflate)
+        payload_bytes: Decoded body size in bytes
+    """
+    start_date: str
+    end_date: str
+    device_id: str
+    status: int
+    elapsed_sec: float
+    wire_bytes: int
+    payload_bytes: int
+
+
+def _build_request(
+    *,
+    soap_action: str,
+    username: str,
+    password: str,
+    company_code: str,
+    start_date: str,
+    end_date: str,
+    device_id: str = "",
+) -> tuple[dict, bytes]:
+    """
+    Build SOAP request headers and the encoded envelope body.
+
+    An empty device_id requests every device of the company.
+
+    Returns:
+        Tuple of (headers, body) ready to be posted
+    """
+    # Prepare SOAP request headers
+    headers = {
+        "Content-Type": "text/xml; charset=utf-8",
+        "SOAPAction": soap_action,
+    }
+
+    # Format SOAP envelope with provided parameters, escaped as XML text
+    body = SOAP_ENVELOPE_TEMPLATE.format(
+        username=escape(username),
+        password=escape(password),
+        company_code=escape(company_code),
+        start_date=escape(start_date),
+        end_date=escape(end_date),
+        device_id=escape(device_id),
+    )
+    log.debug("SOAP envelope prepared with company code: %s", company_code)
+    return headers, body.encode("utf-8")
+
+
+def _window_closed(end_date: str) -> bool:
+    """True if a report window ends in the past, so its response can be cached."""
+    try:
+        end = datetime.fromisoformat(end_date)
+    except ValueError:
+        return False
+    return end < datetime.now(end.tzinfo)
+
+
+class SoapClient:
+    """
+    Reusable client for the wsMileageReport SOAP service.
+
+    Owns a requests.Session whose HTTPAdapter keeps up to ``pool_size``
+    keep-alive connections, so repeated requests (range runs, shards) skip
+    the TCP/TLS handshake. Responses are negotiated with gzip/deflate, and
+    connection errors, read errors and 429/5xx responses are retried by
+    urllib3 with exponential, jittered backoff. The report call only reads
+    data, so POST is treated as idempotent for retries.
+
+    Every request appends a RequestStats entry to ``stats``.
+
+    With a ResponseCache attached, bodies are written through to the cache;
+    if ``cache_read`` is set, cached windows are served from disk without
+    any network request (counted in ``cache_hits``). Windows that end in
+    the future are never cached, since their data is still growing.
+
+    Thread-safe for concurrent requests (one connection per in-flight call).
+    """
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(
+        self,
+        *,
+        soap_url: str,
+        soap_action: str,
+        username: str,
+        password: str,
+        company_code: str,
+        timeout_sec: int = 60,
+        pool_size: int = 4,
+        retries: int = 3,
+        backoff_factor: float = 0.5,
+        backoff_jitter: float = 0.5,
+        stats_history: int = 1000,
+        cache: ResponseCache | None = None,
+        cache_read: bool = True,
+    ):
+        """
+        Create the session and connection pool.
+
+        Args:
+            soap_url: URL of the SOAP web service endpoint
+            soap_action: SOAP action header for the request
+            username: Service authentication username
+            password: Service authentication password
+            company_code: Company identifier for the service
+            timeout_sec: Connect/read timeout per attempt in seconds
+            pool_size: Maximum keep-alive connections kept per host
+            retries: Retry attempts after the first try (0 disables retries)
+            backoff_factor: Base of the exponential backoff in seconds
+            backoff_jitter: Maximum random seconds added to each backoff
+            stats_history: Number of RequestStats entries to keep
+            cache: Optional on-disk response cache
+            cache_read: Serve cached entries (False only refreshes the cache)
+        """
+        self.soap_url = soap_url
+        self.soap_action = soap_action
+        self.username = username
+        self.password = password
+        self.company_code = company_code
+        self.timeout_sec = timeout_sec
+        self.stats: deque[RequestStats] = deque(maxlen=stats_history)
+        self.cache = cache
+        self.cache_read = cache_read
+        self.cache_hits = 0
+
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            status_forcelist=self.RETRY_STATUSES,
+            # urllib3 retries only idempotent methods by default. wsMileageReport
+            # is a read-only report query sent as a SOAP POST, so repeating it
+            # cannot write anything twice; no other call goes through this session.
+            allowed_methods=frozenset({"POST"}),
+            backoff_factor=backoff_factor,
+            backoff_jitter=backoff_jitter,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size), max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+
+    @classmethod
+    def from_settings(cls, settings, *, pool_size: int | None = None) -> "SoapClient":
+        """
+        Build a client from application Settings.
+
+        Args:
+            settings: Application configuration settings
+            pool_size: Override for the connection pool size; by default the
+                pool is large enough for settings.soap_shard_concurrency
+
+        Raises:
+            RuntimeError: If a required SOAP_* variable is missing
+        """
+        settings.validate("soap")
+        if pool_size is None:
+            pool_size = settings.soap_pool_size
+            if settings.soap_sharding:
+                pool_size = max(pool_size, settings.soap_shard_concurrency)
+
+        if settings.soap_cache_mode not in ("off", "use", "refresh"):
+            raise ValueError(f"Unsupported SOAP_CACHE_MODE: {settings.soap_cache_mode}")
+
+        cache = None
+        if settings.soap_cache_mode != "off":
+            cache = ResponseCache(
+                settings.soap_cache_dir,
+                ttl_sec=int(settings.soap_cache_ttl_hours * 3600),
+                max_bytes=int(settings.soap_cache_max_mb * 1024 * 1024),
+                codec=settings.soap_cache_codec,
+            )
+
+        return cls(
+            soap_url=settings.soap_url,
+            soap_action=settings.soap_action,
+            username=settings.soap_username,
+            password=settings.soap_password,
+            company_code=settings.soap_company_code,
+            timeout_sec=settings.soap_timeout_sec,
+            pool_size=pool_size,
+            retries=settings.soap_retries,
+            backoff_factor=settings.soap_backoff_factor,
+            backoff_jitter=settings.soap_backoff_jitter,
+            cache=cache,
+            cache_read=settings.soap_cache_mode == "use",
+        )
+
+    def _cache_key(self, start_date: str, end_date: str, device_id: str) -> str:
+        return ResponseCache.key(self.company_code, start_date, end_date, device_id)
+
+    def _post(self, start_date: str, end_date: str, device_id: str, *, stream: bool) -> requests.Response:
+        headers, body = _build_request(
+            soap_action=self.soap_action,
+            username=self.username,
+            password=self.password,
+            company_code=self.company_code,
+            start_date=start_date,
+            end_date=end_date,
+            device_id=device_id,
+        )
+        resp = self.session.post(
+            self.soap_url,
+            data=body,
+            headers=headers,
+            timeout=self.timeout_sec,
+            stream=stream,
+        )
+        try:
+            resp.raise_for_status()
+        except Exception:
+            resp.close()
+            raise
+        return resp
+
+    def _record(
+        self,
+        start_date: str,
+        end_date: str,
+        device_id: str,
+        resp: requests.Response,
+        started: float,
+        payload_bytes: int,
+    ) -> RequestStats:
+        wire_bytes = resp.raw.tell() if hasattr(resp.raw, "tell") else payload_bytes
+        stat = RequestStats(
+            start_date=start_date,
+            end_date=end_date,
+            device_id=device_id,
+            status=resp.status_code,
+            elapsed_sec=time.perf_counter() - started,
+            wire_bytes=wire_bytes,
+            payload_bytes=payload_bytes,
+        )
+        self.stats.append(stat)
+        metrics.inc("soap_requests_total")
+        metrics.inc("soap_wire_bytes_total", wire_bytes)
+        metrics.inc("soap_payload_bytes_total", payload_bytes)
+        metrics.observe("soap_request_seconds", stat.elapsed_sec)
+        log.debug(
+            "Request completed - Status: %s, Elapsed: %.3fs, Wire bytes: %d, Payload bytes: %d",
+            stat.status,
+            stat.elapsed_sec,
+            stat.wire_bytes,
+            stat.payload_bytes,
+        )
+        return stat
+
+    def fetch(self, start_date: str, end_date: str, device_id: str = "") -> str:
+        """
+        Fetch the mileage report for a window as a string.
+
+        Args:
+            start_date: Start date for mileage data (ISO format)
+            end_date: End date for mileage data (ISO format)
+            device_id: Single device to report on (default: all devices)
+
+        Returns:
+            Raw XML response string from the SOAP service
+
+        Raises:
+            requests.HTTPError: If the request still fails after retries
+        """
+        cache = self.cache if _window_closed(end_date) else None
+        if cache is not None and self.cache_read:
+            cached = cache.open(self._cache_key(start_date, end_date, device_id))
+            if cached is not None:
+                with cached:
+                    self.cache_hits += 1
+                    metrics.inc("soap_cache_hits_total")
+                    log.debug("Cache hit for %s to %s", start_date, end_date)
+                    return cached.read().decode("utf-8")
+
+        log.debug("Starting SOAP request to %s for %s to %s", self.soap_url, start_date, end_date)
+        started = time.perf_counter()
+        resp = self._post(start_date, end_date, device_id, stream=False)
+        text = resp.text
+        self._record(start_date, end_date, device_id, resp, started, len(resp.content))
+
+        if cache is not None:
+            cache.put(self._cache_key(start_date, end_date, device_id), resp.content)
+        return text
+
+    def stream(
+        self,
+        start_date: str,
+        end_date: str,
+        device_id: str = "",
+        *,
+        chunk_size: int = 64 * 1024,
+    ) -> Iterator[bytes]:
+        """
+        Fetch the mileage report for a window as a stream of byte chunks.
+
+        The response body is never held in memory as a whole; chunks are
+        meant to be fed straight into parser.iter_mileage_batches. The
+        connection goes back to the pool when the generator is exhausted
+        or closed.
+
+        Args:
+            start_date: Start date for mileage data (ISO format)
+            end_date: End date for mileage data (ISO format)
+            device_id: Single device to report on (default: all devices)
+            chunk_size: Size of the yielded chunks in bytes (default: 64 KiB)
+
+        Yields:
+            Raw (already content-decoded) response body chunks
+
+        Raises:
+            requests.HTTPError: If the request still fails after retries
+        """
+        key = self._cache_key(start_date, end_date, device_id)
+        cache = self.cache if _window_closed(end_date) else None
+        if cache is not None and self.cache_read:
+            cached = cache.read_chunks(key, chunk_size)
+            if cached is not None:
+                self.cache_hits += 1
+                metrics.inc("soap_cache_hits_total")
+                log.debug("Cache hit for %s to %s", start_date, end_date)
+                yield from cached
+                return
+
+        log.debug("Starting streaming SOAP request to %s for %s to %s", self.soap_url, start_date, end_date)
+        started = time.perf_counter()
+        with self._post(start_date, end_date, device_id, stream=True) as resp:
+            chunks = (chunk for chunk in resp.iter_content(chunk_size=chunk_size) if chunk)
+            if cache is not None:
+                chunks = cache.write_through(key, chunks)
+
+            total = 0
+            for chunk in chunks:
+                total += len(chunk)
+                yield chunk
+            self._record(start_date, end_date, device_id, resp, started, total)
+
+    def close(self) -> None:
+        """Close all pooled connections."""
+        self.session.close()
+
+    def __enter__(self) -> "SoapClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
 def fetch_mileage_xml(
     *,
     soap_url: str,
@@ -43,8 +420,9 @@ def fetch_mileage_xml(
     """
     Fetch mileage data from SOAP web service.
 
-    Sends a SOAP request to the mileage reporting service and returns
-    the XML response containing mileage records for the specified date range.
+    One-shot convenience wrapper around SoapClient.fetch (retries and
+    gzip included). Callers issuing several requests should keep a
+    SoapClient instead so connections are reused.
 
     Args:
         soap_url: URL of the SOAP web service endpoint
@@ -62,37 +440,59 @@ def fetch_mileage_xml(
     Raises:
         requests.HTTPError: If the SOAP request fails with an HTTP error
     """
-    #log_debug(f"SOAP REQUEST START | URL={soap_url} | Start={start_date} | End={end_date}")
-    print(f"DEBUG SOAP: Starting SOAP request to {soap_url} for {start_date} to {end_date}")
-
-    # Prepare SOAP request headers
-    headers = {
-        "Content-Type": "text/xml; charset=utf-8",
-        "SOAPAction": soap_action,
-    }
-
-    # Format SOAP envelope with provided parameters
-    body = SOAP_ENVELOPE_TEMPLATE.format(
+    with SoapClient(
+        soap_url=soap_url,
+        soap_action=soap_action,
         username=username,
         password=password,
         company_code=company_code,
-        start_date=start_date,
-        end_date=end_date,
-    )
-    print(f"DEBUG SOAP: SOAP envelope prepared with company code: {company_code}")
+        timeout_sec=timeout_sec,
+        pool_size=1,
+    ) as client:
+        return client.fetch(start_date, end_date)
 
-    #log_debug("Sending SOAP request...")
-    print("DEBUG SOAP: Sending SOAP request...")
 
-    # Send SOAP request
-    resp = requests.post(
-        soap_url,
-        data=body.encode("utf-8"),
-        headers=headers,
-        timeout=timeout_sec,
-    )
-    resp.raise_for_status()
+def stream_mileage_xml(
+    *,
+    soap_url: str,
+    soap_action: str,
+    username: str,
+    password: str,
+    company_code: str,
+    start_date: str,
+    end_date: str,
+    timeout_sec: int = 60,
+    chunk_size: int = 64 * 1024,
+) -> Iterator[bytes]:
+    """
+    Fetch mileage data from SOAP web service as a stream of byte chunks.
+
+    One-shot convenience wrapper around SoapClient.stream.
+
+    Args:
+        soap_url: URL of the SOAP web service endpoint
+        soap_action: SOAP action header for the request
+        username: Service authentication username
+        password: Service authentication password
+        company_code: Company identifier for the service
+        start_date: Start date for mileage data (ISO format)
+        end_date: End date for mileage data (ISO format)
+        timeout_sec: Connect/read timeout in seconds (default: 60)
+        chunk_size: Size of the yielded chunks in bytes (default: 64 KiB)
+
+    Yields:
+        Raw (already content-decoded) response body chunks
 
-    #log_debug(f"SOAP REQUEST COMPLETE | Status={resp.status_code} | ResponseLength={len(resp.text)}")
-    print(f"DEBUG SOAP: SOAP request completed - Status: {resp.status_code}, Response length: {len(resp.text)}")
-    return resp.text
+    Raises:
+        requests.HTTPError: If the SOAP request fails with an HTTP error
+    """
+    with SoapClient(
+        soap_url=soap_url,
+        soap_action=soap_action,
+        username=username,
+        password=password,
+        company_code=company_code,
+        timeout_sec=timeout_sec,
+        pool_size=1,
+    ) as client:
+        yield from client.stream(start_date, end_date, chunk_size=chunk_size)
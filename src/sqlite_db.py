@@ -0,0 +1,250 @@
+"""
+SQLite stand-in for ``src.db.MsSql``.
+
+Implements the same public methods against an SQLite database so write
+strategies can be benchmarked, and saved responses replayed (``replay
+--backend sqlite``), without a SQL Server. Every ``execute`` /
+``executemany`` call is counted as one round trip; on a real server each
+of those pays network latency, so ``round_trips`` is the number to watch;
+``rtt_ms`` adds that latency to every round trip to model a remote server.
+The bcp bulk copy is modelled by writing and re-reading the real bcp data
+file and charging ``bcp_startup_ms`` (process start and login) per load.
+"""
+
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+from datetime import date, timedelta
+
+from .db import write_bcp_file
+from .logger import get_logger
+from .metrics import metrics
+
+# Same logger as src.db, so per-row DEBUG output costs the same as on MsSql
+log = get_logger("db")
+
+
+def next_day(date_str: str) -> str:
+    """Return the YYYY-MM-DD string of the following day."""
+    return (date.fromisoformat(date_str[:10]) + timedelta(days=1)).isoformat()
+
+
+class SqliteKmLog:
+    """SQLite-backed adapter exposing the MsSql write API."""
+
+    def __init__(self, path: str = ":memory:", *, rtt_ms: float = 0.0, bcp_startup_ms: float = 0.0):
+        """
+        Args:
+            path: SQLite database file (in-memory by default)
+            rtt_ms: Simulated network round-trip time per statement
+            bcp_startup_ms: Simulated bcp process start and login per bulk copy
+        """
+        self.rtt = rtt_ms / 1000
+        self.bcp_startup = bcp_startup_ms / 1000
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS arac_km_log (
+                DeviceId TEXT NOT NULL,
+                License_Plate TEXT NULL,
+                [Date] TEXT NOT NULL,
+                Mileage INTEGER NULL,
+                KayitTarihi TEXT NOT NULL
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS IX_log_device_date ON arac_km_log (DeviceId, [Date])")
+        self.conn.commit()
+        self.round_trips = 0
+
+    def _round_trip(self) -> None:
+        self.round_trips += 1
+        metrics.inc("db_round_trips_total")
+        if self.rtt:
+            time.sleep(self.rtt)
+
+    def _execute(self, cur: sqlite3.Cursor, sql: str, *params):
+        self._round_trip()
+        return cur.execute(sql, params)
+
+    def insert_km_log(self, device_id, license_plate, date_str, mileage):
+        self._execute(
+            self.conn.cursor(),
+            "INSERT INTO arac_km_log (DeviceId, License_Plate, [Date], Mileage, KayitTarihi) "
+            "VALUES (?, ?, ?, ?, datetime('now'))",
+            device_id, license_plate, date_str, mileage,
+        )
+        log.debug("Executed INSERT for Plate=%s, Date=%s, KM=%s", license_plate, date_str, mileage)
+
+    def exists_for_date(self, device_id: str, date_str: str) -> bool:
+        row = self._execute(
+            self.conn.cursor(),
+            "SELECT 1 FROM arac_km_log WHERE DeviceId = ? AND [Date] >= ? AND [Date] < ?",
+            device_id, date_str, next_day(date_str),
+        ).fetchone()
+        return row is not None
+
+    def delete_km_logs(self, device_ids: list[str], date_str: str) -> None:
+        if not device_ids:
+            return
+        self._round_trip()
+        self.conn.executemany(
+            "DELETE FROM arac_km_log WHERE DeviceId = ? AND [Date] >= ? AND [Date] < ?",
+            [(device_id, date_str, next_day(date_str)) for device_id in device_ids],
+        )
+
+    def bulk_insert_km_logs(self, batch, date_str: str, *, deduplicate: bool = True) -> list[bool]:
+        if not batch:
+            return []
+        return self._stage_and_merge(
+            ((idx, *row) for idx, row in enumerate(batch.rows())), len(batch), date_str, deduplicate
+        )
+
+    def bulk_copy_km_logs(self, batch, date_str: str, *, deduplicate: bool = True, **_bcp_options) -> list[bool]:
+        if not batch:
+            return []
+
+        with tempfile.TemporaryDirectory(prefix="ats-bcp-") as tmp:
+            data_file = os.path.join(tmp, "stage.dat")
+            write_bcp_file(batch, data_file, uuid.uuid4().hex)
+            if self.bcp_startup:
+                time.sleep(self.bcp_startup)
+            # What bcp does client-side: read the wide-char file and split the fields
+            with open(data_file, encoding="utf-16-le", newline="") as f:
+                rows = [line.rstrip("\r\n").split("\t") for line in f]
+        return self._stage_and_merge(
+            ((int(row_no), device_id, plate or None, int(km) if km else None)
+             for _load, row_no, device_id, plate, km, *_rest in rows),
+            len(batch),
+            date_str,
+            deduplicate,
+        )
+
+    def _stage_and_merge(self, rows, count: int, date_str: str, deduplicate: bool) -> list[bool]:
+        cur = self.conn.cursor()
+        self._execute(cur, "DROP TABLE IF EXISTS temp.km_stage")
+        self._execute(
+            cur,
+            "CREATE TEMP TABLE km_stage (RowNo INTEGER PRIMARY KEY, DeviceId TEXT NOT NULL, "
+            "License_Plate TEXT NULL, Mileage INTEGER NULL, Skip INTEGER NOT NULL DEFAULT 0)",
+        )
+        self._execute(cur, "CREATE INDEX temp.IX_km_stage_device ON km_stage (DeviceId, RowNo)")
+
+        self._round_trip()
+        cur.executemany(
+            "INSERT INTO km_stage (RowNo, DeviceId, License_Plate, Mileage) VALUES (?, ?, ?, ?)",
+            rows,
+        )
+
+        if deduplicate:
+            self._execute(
+                cur,
+                """
+                UPDATE km_stage
+                SET Skip = 1
+                WHERE EXISTS (
+                        SELECT 1 FROM arac_km_log l
+                        WHERE l.DeviceId = km_stage.DeviceId AND l.[Date] >= ? AND l.[Date] < ?
+                    )
+                   OR EXISTS (
+                        SELECT 1 FROM km_stage p
+                        WHERE p.DeviceId = km_stage.DeviceId AND p.RowNo < km_stage.RowNo
+                    )
+                """,
+                date_str, next_day(date_str),
+            )
+
+        self._execute(
+            cur,
+            "INSERT INTO arac_km_log (DeviceId, License_Plate, [Date], Mileage, KayitTarihi) "
+            "SELECT DeviceId, License_Plate, ?, Mileage, datetime('now') FROM km_stage "
+            "WHERE Skip = 0 ORDER BY RowNo",
+            date_str,
+        )
+        skipped = {row[0] for row in self._execute(cur, "SELECT RowNo FROM km_stage WHERE Skip = 1")}
+        self._execute(cur, "DROP TABLE temp.km_stage")
+        return [idx not in skipped for idx in range(count)]
+
+    def ensure_quarantine_table(self) -> None:
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS arac_km_log_quarantine (
+                DeviceId TEXT NOT NULL,
+                License_Plate TEXT NULL,
+                [Date] TEXT NOT NULL,
+                Mileage INTEGER NULL,
+                PreviousMileage INTEGER NULL,
+                Reason TEXT NOT NULL,
+                KayitTarihi TEXT NOT NULL DEFAULT (datetime('now'))
+            )
+            """
+        )
+
+    def quarantine_km_logs(self, batch, date_str: str, reasons, previous) -> None:
+        if not batch:
+            return
+        self.ensure_quarantine_table()
+        self._round_trip()
+        self.conn.executemany(
+            "INSERT INTO arac_km_log_quarantine (DeviceId, License_Plate, [Date], Mileage, PreviousMileage, Reason) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (device_id, plate, date_str, mileage, prev, reason)
+                for (device_id, plate, mileage), reason, prev in zip(batch.rows(), reasons, previous)
+            ],
+        )
+
+    def iter_previous_mileages(self, date_str: str, lookback_days: int, *, chunk_size: int = 50_000):
+        cur = self._execute(
+            self.conn.cursor(),
+            """
+            SELECT DeviceId, Mileage, CAST(julianday(?) - julianday(substr([Date], 1, 10)) AS INTEGER)
+            FROM (
+                SELECT DeviceId, Mileage, [Date],
+                       ROW_NUMBER() OVER (PARTITION BY DeviceId ORDER BY [Date] DESC) AS rn
+                FROM arac_km_log
+                WHERE [Date] < ? AND [Date] >= date(?, ?) AND Mileage IS NOT NULL
+            )
+            WHERE rn = 1
+            """,
+            date_str, date_str, date_str, f"-{lookback_days} days",
+        )
+        while rows := cur.fetchmany(chunk_size):
+            yield from rows
+
+    def iter_dedup_keys(self, start_date: str, end_date: str, *, chunk_size: int = 50_000):
+        cur = self._execute(
+            self.conn.cursor(),
+            "SELECT DISTINCT DeviceId, substr([Date], 1, 10) FROM arac_km_log "
+            "WHERE [Date] >= ? AND [Date] < ? AND DeviceId IS NOT NULL",
+            start_date, next_day(end_date),
+        )
+        while rows := cur.fetchmany(chunk_size):
+            yield from rows
+
+    def count_dedup_keys(self, start_date: str, end_date: str) -> int:
+        return self._execute(
+            self.conn.cursor(),
+            "SELECT COUNT(*) FROM arac_km_log WHERE [Date] >= ? AND [Date] < ? AND DeviceId IS NOT NULL",
+            start_date, next_day(end_date),
+        ).fetchone()[0]
+
+    def commit(self):
+        with metrics.timer("db_commit"):
+            self._round_trip()
+            self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+
+    def ping(self) -> bool:
+        try:
+            self._execute(self.conn.cursor(), "SELECT 1").fetchone()
+        except sqlite3.Error:
+            return False
+        return True
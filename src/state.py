@@ -0,0 +1,290 @@
+"""
+Local state files for ATS Mileage Sync.
+
+Small JSON documents kept next to the application (commit checkpoints and
+similar bookkeeping that must survive between runs). Writes go to a temp
+file that atomically replaces the previous version, so a crash never
+leaves a half-written state file behind. RunLock keeps two runs (cron,
+serve mode, manual) from working on the same data at the same time.
+"""
+
+import json
+import os
+import tempfile
+import threading
+from collections.abc import Iterable
+from datetime import datetime
+
+
+class JsonStateFile:
+    """
+    Thread-safe JSON object persisted to a single file.
+
+    The whole document is loaded on first access and rewritten on every
+    change; state files are expected to stay small.
+    """
+
+    # Pretty-printed by default; subclasses with large documents write compact JSON
+    _indent: int | None = 2
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: File location; parent directories are created on first write
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._data: dict | None = None
+
+    def _load(self) -> dict:
+        if self._data is None:
+            try:
+                with open(self.path, encoding="utf-8") as fh:
+                    self._data = json.load(fh)
+            except FileNotFoundError:
+                self._data = {}
+        return self._data
+
+    def _flush(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump(self._data, fh, ensure_ascii=False, indent=self._indent, sort_keys=True)
+            os.replace(tmp, self.path)
+        except Exception:
+            os.remove(tmp)
+            raise
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            return self._load().get(key, default)
+
+    def set(self, key: str, value) -> None:
+        with self._lock:
+            self._load()[key] = value
+            self._flush()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if self._load().pop(key, None) is not None:
+                self._flush()
+
+
+class CheckpointStore(JsonStateFile):
+    """
+    Per-date progress of chunked-commit runs.
+
+    A checkpoint records how many parsed records of a day's response have
+    been committed and the DeviceId of the last one, so a rerun can skip
+    the committed prefix and verify that the response order still matches.
+    """
+
+    def save(self, date_str: str, *, offset: int, last_device_id: str, inserted: int, skipped: int) -> None:
+        """
+        Persist progress after a commit.
+
+        Args:
+            date_str: Target date in YYYY-MM-DD format
+            offset: Number of parsed records committed so far
+            last_device_id: DeviceId of the record at ``offset - 1``
+            inserted: Rows inserted so far for the date
+            skipped: Rows skipped so far for the date
+        """
+        self.set(date_str, {
+            "offset": offset,
+            "last_device_id": last_device_id,
+            "inserted": inserted,
+            "skipped": skipped,
+            "updated_at": datetime.now().isoformat(timespec="seconds"),
+        })
+
+    def load(self, date_str: str) -> dict | None:
+        """Return the checkpoint of a date, or None if there is none."""
+        return self.get(date_str)
+
+    def clear(self, date_str: str) -> None:
+        """Remove the checkpoint of a date (after it completed)."""
+        self.delete(date_str)
+
+
+class PendingDays(JsonStateFile):
+    """
+    Daily syncs of the serve mode that did not finish.
+
+    A day whose run was stopped by a shutdown, failed or was skipped
+    because another run held the lock stays listed (``{date: {reason,
+    since}}``) until a later run of it completes, so a restarted serve
+    process reruns it first.
+    """
+
+    def add(self, date_str: str, reason: str) -> None:
+        """Record a day that still has to be synced."""
+        self.set(date_str, {"reason": reason, "since": datetime.now().isoformat(timespec="seconds")})
+
+    def remove(self, date_str: str) -> None:
+        """Forget a day once it has been synced completely."""
+        self.delete(date_str)
+
+    def days(self) -> list[str]:
+        """Pending dates in YYYY-MM-DD format, oldest first."""
+        with self._lock:
+            return sorted(self._load())
+
+
+class HighWaterMarks(JsonStateFile):
+    """
+    Per-device high-water marks of the incremental sync mode.
+
+    For every device the last synced date and mileage are kept under
+    ``devices`` (``{device_id: [date, mileage]}``); ``synced`` records per
+    date the last second of the day that has been fetched and committed, so
+    a later run of the same date only requests the window after it. The
+    document holds one entry per device and is written compactly, once per
+    committed day.
+    """
+
+    _indent = None
+
+    def baseline(self, date_str: str) -> tuple[dict[str, int], set[str]]:
+        """
+        Return what a run of ``date_str`` can leave out.
+
+        Args:
+            date_str: Target date in YYYY-MM-DD format
+
+        Returns:
+            Last synced mileage of each device whose mark is not newer than
+            the date, and the devices that already have a row for the date
+        """
+        previous: dict[str, int] = {}
+        synced: set[str] = set()
+        with self._lock:
+            for device_id, (mark_date, mileage) in self._load().get("devices", {}).items():
+                if mark_date == date_str:
+                    synced.add(device_id)
+                if mark_date <= date_str and mileage is not None:
+                    previous[device_id] = mileage
+        return previous, synced
+
+    def synced_through(self, date_str: str) -> datetime | None:
+        """Last second of ``date_str`` already fetched and committed, or None."""
+        value = self.get("synced", {}).get(date_str)
+        return datetime.fromisoformat(value) if value else None
+
+    def advance(
+        self,
+        date_str: str,
+        rows: Iterable[tuple[str, str | None, int | None]],
+        synced_through: datetime,
+    ) -> int:
+        """
+        Move the marks forward after a day has been committed.
+
+        Marks of a later date are kept, so backfilling an old day never
+        moves a device back.
+
+        Args:
+            date_str: Committed date in YYYY-MM-DD format
+            rows: ``(device_id, license_plate, mileage)`` tuples written for the date
+            synced_through: Last second of the date covered by the run
+
+        Returns:
+            Number of device marks updated
+        """
+        with self._lock:
+            data = self._load()
+            devices = data.setdefault("devices", {})
+            updated = 0
+            for device_id, _plate, mileage in rows:
+                mark = devices.get(device_id)
+                if mark is None or mark[0] <= date_str:
+                    devices[device_id] = [date_str, mileage]
+                    updated += 1
+
+            synced = data.setdefault("synced", {})
+            value = synced_through.isoformat(timespec="seconds")
+            if synced.get(date_str, "") < value:
+                synced[date_str] = value
+            self._flush()
+        return updated
+
+
+class RunLock:
+    """
+    Exclusive, non-blocking lock on a file.
+
+    The operating system releases the lock when the process exits, so a
+    crashed run never leaves a stale lock behind. The file itself is kept
+    and holds the PID of the current owner, for error messages.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Lock file location; parent directories are created on first use
+        """
+        self.path = path
+        self._fd: int | None = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def acquire(self) -> bool:
+        """
+        Take the lock if no other process holds it.
+
+        Returns:
+            False if the lock is held elsewhere
+        """
+        if self._fd is not None:
+            return True
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if not _try_lock(fd):
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        fd, self._fd = self._fd, None
+        if fd is not None:
+            os.close(fd)
+
+    def owner(self) -> str:
+        """PID written by the current holder, or "?" if unknown."""
+        try:
+            with open(self.path, encoding="utf-8") as fh:
+                return fh.read().strip() or "?"
+        except OSError:
+            return "?"
+
+    def __enter__(self) -> "RunLock":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+def _try_lock(fd: int) -> bool:
+    try:
+        import fcntl
+    except ImportError:  # Windows
+        import msvcrt
+
+        try:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
@@ -0,0 +1,194 @@
+"""
+Validation stage of ATS Mileage Sync.
+
+Runs between parsing and the DB write. Every batch is checked as a whole
+with NumPy over the columns of MileageBatch: the readings are compared
+with the last known mileage of each device (loaded once per day with
+MsSql.iter_previous_mileages) and rows are flagged as
+
+- ``missing``: no usable mileage (absent, or not an integer in the response)
+- ``negative``: reading below zero
+- ``zero``: reading of zero
+- ``rollback``: reading lower than the previous known mileage
+- ``outlier``: more than ``max_daily_km`` per day since the previous reading
+- ``duplicate``: device already seen earlier in the day's response
+
+A row gets the first matching reason in that order. The checks rely on
+Mileage being an odometer reading (see src.parser.MileageRecord): a
+parked vehicle repeats its last reading, so ``zero`` and ``rollback``
+really are suspicious. In ``report`` mode (the default) flagged rows are
+only counted and still written; ``quarantine`` mode, which needs the
+quarantine table, writes them there instead of ``dbo.arac_km_log``.
+"""
+
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+import numpy as np
+
+from .parser import MileageBatch
+
+MODES = ("quarantine", "report", "off")
+
+# Index = reason code stored per row; 0 means the row passed
+REASONS = ("", "missing", "negative", "zero", "rollback", "outlier", "duplicate")
+
+
+class PreviousMileage:
+    """
+    Last known mileage per device before a day, as sorted NumPy columns.
+
+    Attributes:
+        device_ids: Sorted device IDs
+        mileages: Mileage of each device's last reading
+        days_ago: Days between that reading and the validated day
+    """
+
+    def __init__(self, rows: Iterable[tuple[str, int, int]] = ()):
+        """
+        Args:
+            rows: ``(device_id, mileage, days_ago)`` tuples, one per device
+        """
+        device_ids, mileages, days_ago = [], [], []
+        for device_id, mileage, ago in rows:
+            device_ids.append(device_id)
+            mileages.append(mileage)
+            days_ago.append(ago)
+
+        ids = np.array(device_ids, dtype=str)
+        order = np.argsort(ids, kind="stable")
+        self.device_ids = ids[order]
+        self.mileages = np.array(mileages, dtype=np.int64)[order]
+        self.days_ago = np.array(days_ago, dtype=np.int64)[order]
+
+    @classmethod
+    def load(cls, db, date_str: str, lookback_days: int) -> "PreviousMileage":
+        """Load the last reading of every device within ``lookback_days`` before ``date_str``."""
+        return cls(db.iter_previous_mileages(date_str, lookback_days))
+
+    def __len__(self) -> int:
+        return len(self.device_ids)
+
+    def lookup(self, ids: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Find the previous reading of each device.
+
+        Args:
+            ids: Device IDs of a batch
+
+        Returns:
+            ``(found, mileages, days_ago)`` arrays aligned with ``ids``;
+            mileages and days_ago are 0 where nothing was found
+        """
+        if not len(self.device_ids):
+            zeros = np.zeros(len(ids), dtype=np.int64)
+            return np.zeros(len(ids), dtype=bool), zeros, zeros
+
+        pos = np.searchsorted(self.device_ids, ids)
+        pos = np.minimum(pos, len(self.device_ids) - 1)
+        found = self.device_ids[pos] == ids
+        return (
+            found,
+            np.where(found, self.mileages[pos], 0),
+            np.where(found, self.days_ago[pos], 0),
+        )
+
+
+@dataclass
+class Flagged:
+    """
+    Rows of a batch that failed validation.
+
+    Attributes:
+        indices: Row positions in the checked batch
+        reasons: Reason name per flagged row
+        previous: Previous known mileage per flagged row (None if unknown)
+    """
+    indices: list[int]
+    reasons: list[str]
+    previous: list[int | None]
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+
+class BatchValidator:
+    """
+    Validates the batches of one day's response.
+
+    Keeps the device IDs seen so far, so duplicates are found across
+    batches of a streamed response as well as within one batch.
+    """
+
+    def __init__(self, previous: PreviousMileage, *, max_daily_km: int):
+        """
+        Args:
+            previous: Last known readings before the day
+            max_daily_km: Largest plausible distance per day; above it a reading is an outlier
+        """
+        self.previous = previous
+        self.max_daily_km = max_daily_km
+        self._seen = np.array([], dtype=str)
+
+    def check(self, batch: MileageBatch) -> np.ndarray:
+        """
+        Assign a reason code to every row.
+
+        Returns:
+            uint8 array aligned with the batch; 0 where the row passed,
+            otherwise an index into REASONS
+        """
+        n = len(batch)
+        if not n:
+            return np.zeros(0, dtype=np.uint8)
+
+        ids = np.array(batch.device_ids, dtype=str)
+        mileage = np.frombuffer(batch.mileages, dtype=np.int64)
+        present = np.frombuffer(batch.mileage_mask, dtype=np.uint8).astype(bool)
+
+        found, previous, days_ago = self.previous.lookup(ids)
+        known = present & found
+        delta = mileage - previous
+        allowed = self.max_daily_km * np.maximum(days_ago, 1)
+
+        unique, first = np.unique(ids, return_index=True)
+        duplicate = np.ones(n, dtype=bool)
+        duplicate[first] = False
+        if len(self._seen):
+            duplicate |= np.isin(ids, self._seen)
+        self._seen = np.union1d(self._seen, unique)
+
+        return np.select(
+            (
+                ~present,
+                present & (mileage < 0),
+                present & (mileage == 0),
+                known & (delta < 0),
+                known & (delta > allowed),
+                duplicate,
+            ),
+            np.arange(1, len(REASONS), dtype=np.uint8),
+            default=0,
+        ).astype(np.uint8)
+
+    def split(self, batch: MileageBatch) -> tuple[MileageBatch, Flagged]:
+        """
+        Separate the rows that pass from the flagged ones.
+
+        Returns:
+            The passing rows as a batch, and the flagged rows with their
+            reasons and previous readings
+        """
+        codes = self.check(batch)
+        bad = np.flatnonzero(codes)
+        if not len(bad):
+            return batch, Flagged([], [], [])
+
+        ids = np.array([batch.device_ids[idx] for idx in bad], dtype=str)
+        found, previous, _ = self.previous.lookup(ids)
+        flagged = Flagged(
+            indices=bad.tolist(),
+            reasons=[REASONS[code] for code in codes[bad].tolist()],
+            previous=[int(p) if f else None for f, p in zip(found.tolist(), previous.tolist())],
+        )
+        return batch.compress((codes == 0).tolist()), flagged
@@ -0,0 +1,37 @@
+"""Shared fixtures of the test suite."""
+
+from dataclasses import replace
+
+import pytest
+
+from src.config import Settings
+from src.memory_db import MemoryKmLog
+
+
+@pytest.fixture
+def settings(tmp_path) -> Settings:
+    """Settings independent of the environment, with state files under tmp_path."""
+    return replace(
+        Settings(),
+        deduplicate=True,
+        dedup_cache="set",
+        db_write_mode="executemany",
+        validation="off",
+        commit_batch_size=0,
+        resume_checkpoints=True,
+        incremental=False,
+        soap_streaming=False,
+        parse_batch_size=1000,
+        db_write_max_rows_per_sec=0,
+        archive_sinks=(),
+        archive_dir=str(tmp_path / "archive"),
+        checkpoint_file=str(tmp_path / "checkpoints.json"),
+        high_water_file=str(tmp_path / "high_water.json"),
+        serve_pending_file=str(tmp_path / "serve_pending.json"),
+        metrics_file="",
+    )
+
+
+@pytest.fixture
+def db() -> MemoryKmLog:
+    return MemoryKmLog()
@@ -0,0 +1,33 @@
+"""Builders of test data."""
+
+from src.parser import MileageBatch
+
+RESPONSE_HEAD = (
+    '<?xml version="1.0" encoding="utf-8"?>'
+    '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body>'
+    '<wsMileageReportResponse xmlns="http://tempuri.org/"><wsMileageReportResult>'
+)
+RESPONSE_TAIL = "</wsMileageReportResult></wsMileageReportResponse></soap:Body></soap:Envelope>"
+
+
+def make_batch(*rows: tuple[str, str | None, int | None]) -> MileageBatch:
+    """Build a batch from ``(device_id, plate, mileage)`` tuples."""
+    batch = MileageBatch()
+    for device_id, plate, mileage in rows:
+        batch.append(device_id, plate, mileage)
+    return batch
+
+
+def make_response(*rows: tuple[str, str | None, int | None]) -> str:
+    """Render ``(device_id, plate, mileage)`` tuples as a wsMileageReport response."""
+    items = "".join(
+        f"<MileageL><DeviceId>{device_id}</DeviceId>"
+        f"<License_Plate>{plate or ''}</License_Plate>"
+        f"<Mileage>{'' if mileage is None else mileage}</Mileage></MileageL>"
+        for device_id, plate, mileage in rows
+    )
+    return RESPONSE_HEAD + items + RESPONSE_TAIL
+
+
+def new_summary() -> dict:
+    return {"inserted": 0, "skipped": 0, "errors": 0}
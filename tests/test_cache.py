@@ -0,0 +1,60 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+from src.cache import ResponseCache
+from src.soap_client import _window_closed
+
+
+def _age(cache: ResponseCache, key: str, seconds: int) -> None:
+    path = cache._existing_path(key)
+    stamp = time.time() - seconds
+    os.utime(path, (stamp, stamp))
+
+
+def test_roundtrip_and_streaming_reads(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    key = ResponseCache.key("ACME", "2026-01-06T00:00:00", "2026-01-06T23:59:59")
+    assert cache.open(key) is None
+
+    cache.put(key, b"<xml/>" * 1000)
+    assert b"".join(cache.read_chunks(key, chunk_size=100)) == b"<xml/>" * 1000
+
+
+def test_interrupted_write_stores_nothing(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    key = ResponseCache.key("ACME", "a", "b")
+    chunks = cache.write_through(key, [b"one", b"two"])
+    next(chunks)
+    chunks.close()
+
+    assert cache.open(key) is None
+    assert [name for _dir, _subdirs, names in os.walk(tmp_path) for name in names] == []
+
+
+def test_expired_entry_is_a_miss(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl_sec=60)
+    key = ResponseCache.key("ACME", "a", "b")
+    cache.put(key, b"<xml/>")
+    _age(cache, key, 120)
+    assert cache.open(key) is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    body = os.urandom(4096)  # incompressible, so every entry has about the same size
+    cache = ResponseCache(str(tmp_path), ttl_sec=0, max_bytes=3 * 4200)
+    keys = [ResponseCache.key("ACME", str(i), "") for i in range(3)]
+    for age, key in zip((300, 200, 100), keys):
+        cache.put(key, body)
+        _age(cache, key, age)
+
+    cache.put(ResponseCache.key("ACME", "new", ""), body)
+    assert cache._existing_path(keys[0]) is None
+    assert cache._existing_path(keys[2]) is not None
+    assert cache._size <= cache.max_bytes
+
+
+def test_only_closed_windows_are_cached():
+    assert _window_closed("2026-01-06T23:59:59")
+    assert not _window_closed((datetime.now() + timedelta(hours=1)).isoformat(timespec="seconds"))
+    assert not _window_closed("not a date")
@@ -0,0 +1,54 @@
+import pytest
+
+from src.db import DedupIndex
+from src.sqlite_db import SqliteKmLog
+
+from .helpers import make_batch
+
+
+def _loaded(mode: str) -> DedupIndex:
+    db = SqliteKmLog()
+    db.bulk_insert_km_logs(make_batch(("A", None, 1), ("B", None, 2)), "2026-01-06")
+    db.bulk_insert_km_logs(make_batch(("A", None, 1)), "2026-01-07")
+    db.commit()
+    return DedupIndex.load(db, "2026-01-06", "2026-01-07", mode=mode)
+
+
+def test_set_mode_partitions_known_new_and_repeated_rows():
+    index = _loaded("set")
+    assert index.preloaded == 3
+
+    new, unsure = index.partition(make_batch(("A", None, 5), ("C", None, 6), ("C", None, 7)), "2026-01-06")
+    assert new == [False, True, False]
+    assert unsure == [False, False, False]
+
+    # Keys are per date
+    new, _ = index.partition(make_batch(("B", None, 5)), "2026-01-07")
+    assert new == [True]
+
+
+def test_bloom_mode_reports_preloaded_keys_as_unsure():
+    index = _loaded("bloom")
+    assert index.keys == {}
+
+    new, unsure = index.partition(make_batch(("A", None, 5), ("C", None, 6), ("C", None, 7)), "2026-01-06")
+    assert unsure[0] and not new[0]
+    assert new[1] and not unsure[1]
+    assert not new[2] and not unsure[2]
+
+
+def test_rollback_forgets_uncommitted_keys():
+    index = _loaded("set")
+    index.partition(make_batch(("C", None, 1)), "2026-01-06")
+    index.rollback()
+    # A retry of the rolled back day writes C again; preloaded keys stay
+    assert index.partition(make_batch(("C", None, 1), ("A", None, 1)), "2026-01-06")[0] == [True, False]
+
+    index.commit()
+    index.rollback()
+    assert index.partition(make_batch(("C", None, 1)), "2026-01-06")[0] == [False]
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        DedupIndex(mode="trie")
@@ -0,0 +1,206 @@
+import csv
+import gzip
+import glob
+import os
+import threading
+from dataclasses import replace
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from src.job import (
+    _advance_marks,
+    _commit,
+    _load_dedup,
+    _plan_delta,
+    _rollback,
+    _write_batches,
+    _write_day,
+    run_for_date,
+)
+from src.parser import MileageBatch
+from src.sinks import Archive, ArchiveSink
+from src.state import CheckpointStore, HighWaterMarks
+
+from .helpers import make_batch, new_summary
+
+DAY = "2026-01-06"
+ROWS = [(f"D{i}", None, 1000 + i) for i in range(5)]
+
+
+def _write(db, settings, batch, **kwargs) -> tuple[dict, bool]:
+    summary = new_summary()
+    completed = _write_batches(db, [batch], DAY, settings, summary, MileageBatch(), **kwargs)
+    return summary, completed
+
+
+def test_dedup_skips_existing_rows_and_retries_after_rollback(db, settings):
+    db.bulk_insert_km_logs(make_batch(ROWS[0]), DAY)
+    db.commit()
+    dedup = _load_dedup(db, settings, DAY, DAY)
+
+    summary, _ = _write(db, settings, make_batch(*ROWS[:3]), dedup=dedup)
+    assert (summary["inserted"], summary["skipped"]) == (2, 1)
+    _rollback(db, None, dedup)
+
+    # The retry in the same process must not treat the rolled back rows as written
+    summary, _ = _write(db, settings, make_batch(*ROWS[:3]), dedup=dedup)
+    _commit(db, None, dedup)
+    assert (summary["inserted"], summary["skipped"]) == (2, 1)
+    assert len(db.rows) == 3
+
+
+def test_stopped_run_resumes_after_the_committed_prefix(db, settings):
+    settings = replace(settings, commit_batch_size=2)
+    checkpoints = CheckpointStore(settings.checkpoint_file)
+    stop = threading.Event()
+    stop.set()
+
+    summary, completed = _write(db, settings, make_batch(*ROWS), checkpoints=checkpoints, stop=stop)
+    assert not completed
+    assert summary["inserted"] == 2
+    assert checkpoints.load(DAY)["offset"] == 2
+    assert len(db.rows) == 2  # committed with the checkpoint
+
+    summary, completed = _write(db, settings, make_batch(*ROWS), checkpoints=checkpoints)
+    db.commit()
+    assert completed
+    assert summary["resumed_from"] == 2
+    assert summary["inserted"] == 5
+    assert sorted(row[0] for row in db.rows) == [row[0] for row in ROWS]
+
+
+def test_checkpoint_of_a_different_response_is_rejected(db, settings):
+    settings = replace(settings, commit_batch_size=2)
+    checkpoints = CheckpointStore(settings.checkpoint_file)
+    checkpoints.save(DAY, offset=2, last_device_id="OTHER", inserted=2, skipped=0)
+
+    with pytest.raises(RuntimeError, match="does not match"):
+        _write(db, settings, make_batch(*ROWS), checkpoints=checkpoints)
+
+
+def _sync(db, settings, marks, day, rows):
+    """One incremental run of ``day`` over an already fetched response."""
+    date_str = day.strftime("%Y-%m-%d")
+    plan = _plan_delta(settings, marks, day)
+    summary, inserted = new_summary(), MileageBatch()
+    if not plan.empty:
+        batch = plan.skip.apply(make_batch(*rows))
+        _write_batches(
+            db, [batch], date_str, settings, summary, inserted,
+            _load_dedup(db, settings, date_str, date_str), replace=set(plan.replace),
+        )
+        db.commit()
+        _advance_marks(marks, plan, date_str, inserted, summary)
+    return plan, summary
+
+
+def test_incremental_run_of_a_closed_day_is_not_repeated(db, settings):
+    settings = replace(settings, incremental=True)
+    marks = HighWaterMarks(settings.high_water_file)
+    day = datetime.now() - timedelta(days=2)
+
+    _sync(db, settings, marks, day, [("A", None, 100)])
+    plan, summary = _sync(db, settings, marks, day, [("A", None, 150)])
+
+    assert plan.empty
+    assert [row[3] for row in db.rows] == [100]
+
+
+def test_incremental_run_replaces_rows_written_while_the_day_was_open(db, settings):
+    settings = replace(settings, incremental=True)
+    marks = HighWaterMarks(settings.high_water_file)
+    today = datetime.now()
+
+    _sync(db, settings, marks, today, [("A", "P1", 100), ("B", "P2", 200)])
+    plan, summary = _sync(db, settings, marks, today, [("A", "P1", 150), ("B", "P2", 200), ("C", None, 5)])
+
+    assert plan.replace == {"A", "B"}
+    assert summary["replaced"] == 1
+    assert summary["unchanged"] == 1
+    assert sorted((row[0], row[3]) for row in db.rows) == [("A", 150), ("B", 200), ("C", 5)]
+
+
+def _files(root: str) -> list[str]:
+    return [name for _dir, _subdirs, names in os.walk(root) for name in names]
+
+
+def _archived_rows(root: str) -> list[list[str]]:
+    rows = []
+    for path in glob.glob(os.path.join(root, "csv", "arac_km_log", "date=*", "*.csv.gz")):
+        with gzip.open(path, "rt", encoding="utf-8", newline="") as fh:
+            rows.extend(list(csv.reader(fh))[1:])
+    return rows
+
+
+def test_day_is_archived_with_its_commit(db, settings):
+    settings = replace(settings, archive_sinks=("csv",))
+    archive = Archive.from_settings(settings)
+    day = datetime(2026, 1, 6)
+
+    summary, _ = _write_day(db, day, lambda: make_batch(*ROWS), settings, archive=archive)
+    assert summary["inserted"] == 5
+    assert sorted(row[0] for row in _archived_rows(settings.archive_dir)) == [row[0] for row in ROWS]
+    assert not [name for name in _files(settings.archive_dir) if name.endswith(".tmp")]
+
+
+def test_failed_archive_prepare_rolls_the_day_back(db, settings, monkeypatch):
+    settings = replace(settings, archive_sinks=("csv",))
+    archive = Archive.from_settings(settings)
+
+    prepare = ArchiveSink.prepare
+
+    def _fail(self):
+        prepare(self)
+        raise OSError("disk full")
+
+    monkeypatch.setattr(ArchiveSink, "prepare", _fail)
+    summary, inserted = _write_day(db, datetime(2026, 1, 6), lambda: make_batch(*ROWS), settings, archive=archive)
+
+    assert summary["errors"] == 1
+    assert not inserted
+    assert db.rows == []
+    assert _files(settings.archive_dir) == []
+
+
+def _run_stopped(db, settings, monkeypatch) -> dict:
+    monkeypatch.setattr("src.job._fetch_batches", lambda *args: iter([make_batch(*ROWS[:2]), make_batch(*ROWS[2:])]))
+    stop = threading.Event()
+    stop.set()
+    client = SimpleNamespace(stats=[])
+    return run_for_date(datetime(2026, 1, 6), settings, db=db, client=client, stop=stop, send_summary=False)
+
+
+def test_interrupted_day_without_checkpoints_is_rolled_back(db, settings, monkeypatch):
+    summary = _run_stopped(db, settings, monkeypatch)
+
+    assert summary["interrupted"]
+    assert (summary["inserted"], summary["skipped"]) == (0, 0)
+    assert db.rows == []
+
+
+def test_interrupted_day_with_checkpoints_keeps_the_committed_prefix(db, settings, monkeypatch):
+    settings = replace(settings, commit_batch_size=10)
+    summary = _run_stopped(db, settings, monkeypatch)
+
+    assert summary["interrupted"]
+    assert summary["inserted"] == 2
+    assert len(db.rows) == 2
+    assert CheckpointStore(settings.checkpoint_file).load(DAY)["offset"] == 2
+
+
+def test_failed_day_reports_only_checkpointed_rows(db, settings, monkeypatch):
+    settings = replace(settings, commit_batch_size=2)
+
+    def _batches(*args):
+        yield make_batch(*ROWS[:3])
+        raise ConnectionError("response cut off")
+
+    monkeypatch.setattr("src.job._fetch_batches", _batches)
+    monkeypatch.setattr("src.job.send_html_mail", lambda **kwargs: None)
+    summary = run_for_date(datetime(2026, 1, 6), settings, db=db, client=SimpleNamespace(stats=[]))
+
+    assert summary["errors"] == 1
+    assert (summary["inserted"], summary["skipped"]) == (2, 0)
+    assert len(db.rows) == 2
@@ -0,0 +1,76 @@
+import gzip
+from dataclasses import replace
+
+import pytest
+
+from src.replay import expand_paths, format_report, replay_date, run_replay
+
+from .helpers import make_response
+
+
+def _save(tmp_path, name: str, *rows) -> str:
+    path = tmp_path / name
+    with gzip.open(path, "wt", encoding="utf-8") as fh:
+        fh.write(make_response(*rows))
+    return str(path)
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+@pytest.mark.parametrize("streaming", [False, True])
+def test_later_file_is_deduplicated_against_earlier_ones(tmp_path, settings, backend, streaming):
+    settings = replace(settings, soap_streaming=streaming)
+    paths = [
+        _save(tmp_path, "2026-01-06-a.xml.gz", ("A", "34 A 1", 100), ("B", None, 200)),
+        _save(tmp_path, "2026-01-06-b.xml.gz", ("A", "34 A 1", 100), ("C", None, 300)),
+    ]
+    summary = run_replay(paths, settings, backend=backend, sqlite_path=str(tmp_path / "replay.db"))
+
+    assert [(part["date"], part["inserted"], part["skipped"]) for part in summary["files"]] == [
+        ("2026-01-06", 2, 0),
+        ("2026-01-06", 1, 1),
+    ]
+    assert (summary["inserted"], summary["skipped"], summary["errors"]) == (3, 1, 0)
+    assert summary["records"] == 4
+    assert "backend=" + backend in format_report(summary)
+
+
+def test_replayed_rows_are_archived(tmp_path, settings):
+    settings = replace(settings, archive_sinks=("csv",))
+    run_replay([_save(tmp_path, "2026-01-06.xml.gz", ("A", None, 100))], settings)
+
+    parts = list((tmp_path / "archive" / "csv" / "arac_km_log" / "date=2026-01-06").glob("part-*.csv.gz"))
+    assert len(parts) == 1
+
+
+def test_unreadable_file_counts_as_error(tmp_path, settings):
+    broken = tmp_path / "2026-01-07.xml"
+    broken.write_text("<not xml", encoding="utf-8")
+    paths = [str(broken), _save(tmp_path, "2026-01-06.xml.gz", ("A", None, 100))]
+
+    summary = run_replay(paths, settings)
+    assert [part["errors"] for part in summary["files"]] == [1, 0]
+    assert summary["inserted"] == 1
+
+
+def test_replay_date_comes_from_the_file_name():
+    assert replay_date("/cache/acme_2026-01-06_x.xml.gz") == "2026-01-06"
+    assert replay_date("C:\\cache\\2026-01-06\\resp.xml", "2026-02-01") == "2026-02-01"
+    with pytest.raises(ValueError):
+        replay_date("resp.xml")
+
+
+def test_expand_paths_keeps_order_and_rejects_empty_globs(tmp_path):
+    for name in ("b.xml", "a.xml"):
+        (tmp_path / name).write_text("", encoding="utf-8")
+    assert expand_paths([str(tmp_path / "*.xml"), "literal.xml"]) == [
+        str(tmp_path / "a.xml"),
+        str(tmp_path / "b.xml"),
+        "literal.xml",
+    ]
+    with pytest.raises(ValueError):
+        expand_paths([str(tmp_path / "*.zst")])
+
+
+def test_unknown_backend_is_rejected(tmp_path, settings):
+    with pytest.raises(ValueError):
+        run_replay([_save(tmp_path, "2026-01-06.xml.gz")], settings, backend="oracle")
@@ -0,0 +1,60 @@
+from datetime import datetime
+
+import pytest
+
+from src.schedule import CronSchedule
+
+
+def test_daily_schedule_fires_next_day_after_its_minute():
+    schedule = CronSchedule("30 5 * * *")
+    assert schedule.next_after(datetime(2026, 1, 6, 4, 0)) == datetime(2026, 1, 6, 5, 30)
+    assert schedule.next_after(datetime(2026, 1, 6, 5, 30)) == datetime(2026, 1, 7, 5, 30)
+
+
+def test_lists_ranges_and_steps():
+    schedule = CronSchedule("*/15 8-10 * * *")
+    assert schedule.minutes == frozenset({0, 15, 30, 45})
+    assert schedule.hours == frozenset({8, 9, 10})
+    assert schedule.next_after(datetime(2026, 1, 6, 10, 45)) == datetime(2026, 1, 7, 8, 0)
+
+
+def test_shortcuts_and_sunday_as_seven():
+    assert CronSchedule("@daily").next_after(datetime(2026, 1, 6, 12, 0)) == datetime(2026, 1, 7, 0, 0)
+    # 2026-01-11 is a Sunday
+    assert CronSchedule("0 0 * * 7").next_after(datetime(2026, 1, 6)) == datetime(2026, 1, 11)
+    assert CronSchedule("@weekly").next_after(datetime(2026, 1, 6)) == datetime(2026, 1, 11)
+
+
+def test_only_weekday_restricted_matches_weekdays_only():
+    # Mondays; the day-of-month field is a bare *
+    schedule = CronSchedule("0 6 * * 1")
+    assert schedule.next_after(datetime(2026, 1, 6)) == datetime(2026, 1, 12, 6, 0)
+
+
+def test_both_day_fields_restricted_match_either():
+    # The 15th, or any Monday
+    schedule = CronSchedule("0 6 15 * 1")
+    assert schedule.next_after(datetime(2026, 1, 6)) == datetime(2026, 1, 12, 6, 0)
+    assert schedule.next_after(datetime(2026, 1, 13)) == datetime(2026, 1, 15, 6, 0)
+
+
+def test_day_step_counts_as_restricted():
+    # */2 is odd days; with a weekday given, either field may match
+    schedule = CronSchedule("0 0 */2 * 1")
+    assert schedule.next_after(datetime(2026, 1, 1)) == datetime(2026, 1, 3)
+    assert schedule.matches(datetime(2026, 1, 12))  # even day, but a Monday
+    assert not schedule.matches(datetime(2026, 1, 14))  # even day, Wednesday
+
+
+@pytest.mark.parametrize(
+    "expr",
+    ["* * *", "60 * * * *", "0 24 * * *", "0 0 0 * *", "0 0 * 13 *", "0 0 * * 8", "*/0 * * * *", "a * * * *"],
+)
+def test_malformed_expressions_are_rejected(expr):
+    with pytest.raises(ValueError):
+        CronSchedule(expr)
+
+
+def test_expression_that_never_matches():
+    with pytest.raises(ValueError):
+        CronSchedule("0 0 31 2 *").next_after(datetime(2026, 1, 1))
@@ -0,0 +1,51 @@
+from datetime import datetime
+
+import pytest
+
+from src.sharding import Shard, merge_batches, plan_shards, split_shard
+
+from .helpers import make_batch
+
+
+def test_merge_keeps_highest_odometer_reading():
+    merged = merge_batches([
+        make_batch(("A", None, 100), ("B", "34 B 2", 50)),
+        make_batch(("A", "34 A 1", 120), ("C", None, None)),
+        make_batch(("A", None, 110), ("C", None, 7)),
+    ])
+    assert list(merged.rows()) == [("A", "34 A 1", 120), ("B", "34 B 2", 50), ("C", None, 7)]
+
+
+def test_merge_last_takes_latest_shard_and_ignores_nulls():
+    merged = merge_batches(
+        [make_batch(("A", "P", 100)), make_batch(("A", None, 90)), make_batch(("A", None, None))],
+        "last",
+    )
+    assert list(merged.rows()) == [("A", "P", 90)]
+
+
+def test_merge_rejects_summing_odometer_readings():
+    with pytest.raises(ValueError):
+        merge_batches([make_batch(("A", None, 1))], "sum")
+
+
+def test_plan_covers_the_day_in_windows_and_devices():
+    shards = plan_shards(datetime(2026, 1, 6, 15, 0), window_minutes=360, device_ids=("A", "B"))
+    assert len(shards) == 8
+    assert shards[0] == Shard(datetime(2026, 1, 6), datetime(2026, 1, 6, 5, 59, 59), "A")
+    assert shards[-1].end == datetime(2026, 1, 6, 23, 59, 59)
+
+
+def test_plan_starts_at_the_incremental_window():
+    shards = plan_shards(datetime(2026, 1, 6), start=datetime(2026, 1, 6, 20, 0))
+    assert [(s.start, s.end) for s in shards] == [(datetime(2026, 1, 6, 20, 0), datetime(2026, 1, 6, 23, 59, 59))]
+
+
+def test_split_halves_then_fans_out_per_device():
+    shard = Shard(datetime(2026, 1, 6), datetime(2026, 1, 6, 0, 59, 59))
+    halves = split_shard(shard, min_minutes=30)
+    assert [h.end for h in halves] == [datetime(2026, 1, 6, 0, 29, 59), datetime(2026, 1, 6, 0, 59, 59)]
+
+    per_device = split_shard(halves[0], min_minutes=30, device_ids=("A", "B"))
+    assert [s.device_id for s in per_device] == ["A", "B"]
+    assert split_shard(per_device[0], min_minutes=30) == []
@@ -0,0 +1,103 @@
+import csv
+import gzip
+import os
+from dataclasses import replace
+
+import pytest
+
+from src.sinks import Archive, ArchiveSink
+
+from .helpers import make_batch
+
+DAY = "2026-01-06"
+ROWS = [("A", "34 A 1", 100), ("B", None, None), ("C", "34 C 3", 300)]
+
+
+def _files(root: str) -> list[str]:
+    return sorted(name for _dir, _subdirs, names in os.walk(root) for name in names)
+
+
+def test_csv_part_appears_only_on_commit(tmp_path):
+    sink = ArchiveSink(str(tmp_path), "csv", company="acme")
+    sink.write(make_batch(*ROWS), DAY)
+    sink.prepare()
+    assert sink.files == []
+    assert all(name.startswith(".") and name.endswith(".tmp") for name in _files(tmp_path))
+
+    sink.commit()
+    [path] = sink.files
+    assert os.path.dirname(path) == os.path.join(str(tmp_path), "csv", "arac_km_log", "company=acme", f"date={DAY}")
+    with gzip.open(path, "rt", encoding="utf-8", newline="") as fh:
+        rows = list(csv.reader(fh))
+    assert rows == [["DeviceId", "License_Plate", "Mileage"], ["A", "34 A 1", "100"], ["B", "", ""], ["C", "34 C 3", "300"]]
+
+
+def test_parquet_row_groups_and_nulls(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    sink = ArchiveSink(str(tmp_path), "parquet", row_group_size=2)
+    sink.write(make_batch(*ROWS), DAY)
+    sink.commit()
+
+    [path] = sink.files
+    assert pq.ParquetFile(path).num_row_groups == 2
+    assert pq.read_table(path).to_pylist() == [
+        {"DeviceId": "A", "License_Plate": "34 A 1", "Mileage": 100},
+        {"DeviceId": "B", "License_Plate": None, "Mileage": None},
+        {"DeviceId": "C", "License_Plate": "34 C 3", "Mileage": 300},
+    ]
+
+
+def test_every_commit_starts_a_new_part(tmp_path):
+    sink = ArchiveSink(str(tmp_path), "csv")
+    for rows in (ROWS[:1], ROWS[1:]):
+        sink.write(make_batch(*rows), DAY)
+        sink.commit()
+    assert len(sink.files) == 2
+    assert len(set(sink.files)) == 2
+
+
+@pytest.mark.parametrize("prepared", [False, True])
+def test_rollback_leaves_no_file(tmp_path, prepared):
+    sink = ArchiveSink(str(tmp_path), "csv")
+    sink.write(make_batch(*ROWS), DAY)
+    sink.write(make_batch(*ROWS), "2026-01-07")
+    if prepared:
+        sink.prepare()
+    sink.rollback()
+
+    sink.commit()
+    assert sink.files == []
+    assert _files(tmp_path) == []
+
+
+def test_failed_rename_keeps_the_finished_file(tmp_path, monkeypatch):
+    sink = ArchiveSink(str(tmp_path), "csv")
+    sink.write(make_batch(*ROWS), DAY)
+    sink.prepare()
+
+    def _fail(src, dst):
+        raise OSError("read-only")
+
+    monkeypatch.setattr(os, "replace", _fail)
+    sink.commit()
+    assert sink.files == []
+    [name] = _files(tmp_path)
+    assert name.endswith(".csv.gz.tmp")
+
+
+def test_archive_fans_out_to_every_format(settings):
+    pytest.importorskip("pyarrow")
+    archive = Archive.from_settings(replace(settings, archive_sinks=("parquet", "csv")))
+    archive.write(make_batch(*ROWS), DAY)
+    archive.prepare()
+    archive.commit()
+    assert sorted(os.path.basename(path).rsplit(".", 1)[-1] for path in archive.files) == ["gz", "parquet"]
+
+
+def test_archive_is_off_without_sinks(settings):
+    assert Archive.from_settings(settings) is None
+
+
+def test_unknown_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ArchiveSink(str(tmp_path), "json")
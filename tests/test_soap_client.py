@@ -0,0 +1,21 @@
+from lxml import etree
+
+from src.soap_client import _build_request
+
+
+def test_envelope_values_are_escaped():
+    _headers, body = _build_request(
+        soap_action="act",
+        username="ats<user>",
+        password='p&ss"word',
+        company_code="A&B",
+        start_date="2026-01-06T00:00:00",
+        end_date="2026-01-06T23:59:59",
+        device_id="D<1>",
+    )
+    root = etree.fromstring(body)
+    values = {el.tag.split("}")[-1]: el.text for el in root.iter() if el.text and el.text.strip()}
+    assert values["UserName"] == "ats<user>"
+    assert values["Password"] == 'p&ss"word'
+    assert values["CompanyCode"] == "A&B"
+    assert values["DeviceID"] == "D<1>"
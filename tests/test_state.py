@@ -0,0 +1,52 @@
+from datetime import datetime
+
+from src.state import CheckpointStore, HighWaterMarks, PendingDays
+
+
+def test_checkpoint_roundtrip_survives_reload(tmp_path):
+    path = str(tmp_path / "checkpoints.json")
+    CheckpointStore(path).save("2026-01-06", offset=500, last_device_id="D499", inserted=480, skipped=20)
+
+    checkpoint = CheckpointStore(path).load("2026-01-06")
+    assert checkpoint["offset"] == 500
+    assert checkpoint["last_device_id"] == "D499"
+    assert (checkpoint["inserted"], checkpoint["skipped"]) == (480, 20)
+
+    store = CheckpointStore(path)
+    store.clear("2026-01-06")
+    assert CheckpointStore(path).load("2026-01-06") is None
+
+
+def test_high_water_baseline_splits_synced_and_previous(tmp_path):
+    marks = HighWaterMarks(str(tmp_path / "hw.json"))
+    marks.advance("2026-01-05", [("A", None, 100), ("B", None, 200)], datetime(2026, 1, 5, 23, 59, 59))
+    marks.advance("2026-01-06", [("A", None, 150)], datetime(2026, 1, 6, 12, 0, 0))
+
+    previous, synced = marks.baseline("2026-01-06")
+    assert synced == {"A"}
+    # Same-day readings are the baseline of an open day as well
+    assert previous == {"A": 150, "B": 200}
+    assert marks.synced_through("2026-01-06") == datetime(2026, 1, 6, 12, 0, 0)
+
+
+def test_high_water_never_moves_back(tmp_path):
+    path = str(tmp_path / "hw.json")
+    marks = HighWaterMarks(path)
+    marks.advance("2026-01-06", [("A", None, 150)], datetime(2026, 1, 6, 23, 59, 59))
+    # Backfilling an older day keeps the newer device mark and window
+    assert marks.advance("2026-01-04", [("A", None, 90)], datetime(2026, 1, 4, 23, 59, 59)) == 0
+    marks.advance("2026-01-06", [], datetime(2026, 1, 6, 10, 0, 0))
+
+    reloaded = HighWaterMarks(path)
+    assert reloaded.baseline("2026-01-07")[0] == {"A": 150}
+    assert reloaded.synced_through("2026-01-06") == datetime(2026, 1, 6, 23, 59, 59)
+
+
+def test_pending_days_are_sorted_and_removed(tmp_path):
+    pending = PendingDays(str(tmp_path / "pending.json"))
+    pending.add("2026-01-07", "interrupted")
+    pending.add("2026-01-05", "failed")
+    assert PendingDays(pending.path).days() == ["2026-01-05", "2026-01-07"]
+
+    pending.remove("2026-01-05")
+    assert PendingDays(pending.path).days() == ["2026-01-07"]
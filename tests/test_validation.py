@@ -0,0 +1,48 @@
+from src.validation import BatchValidator, PreviousMileage
+
+from .helpers import make_batch
+
+
+def _validator() -> BatchValidator:
+    previous = PreviousMileage([("ROLL", 5000, 1), ("FAST", 1000, 1), ("SLOW", 1000, 3), ("OK", 1000, 1)])
+    return BatchValidator(previous, max_daily_km=500)
+
+
+def test_every_reason_is_assigned():
+    batch = make_batch(
+        ("MISSING", None, None),
+        ("NEG", None, -5),
+        ("ZERO", None, 0),
+        ("ROLL", None, 4999),
+        ("FAST", None, 1501),
+        ("OK", None, 1200),
+        ("OK", None, 1300),
+        ("NEW", None, 10),
+    )
+    passed, flagged = _validator().split(batch)
+
+    assert dict(zip(flagged.indices, flagged.reasons)) == {
+        0: "missing",
+        1: "negative",
+        2: "zero",
+        3: "rollback",
+        4: "outlier",
+        6: "duplicate",
+    }
+    assert flagged.previous[3] == 5000
+    assert flagged.previous[0] is None
+    assert list(passed.device_ids) == ["OK", "NEW"]
+
+
+def test_outlier_limit_scales_with_days_since_previous_reading():
+    passed, flagged = _validator().split(make_batch(("SLOW", None, 2400), ("OK", None, 1000)))
+    # 1400 km over three days is within 3 * 500; an unchanged odometer passes
+    assert not flagged
+    assert len(passed) == 2
+
+
+def test_duplicates_are_found_across_batches():
+    validator = _validator()
+    validator.split(make_batch(("OK", None, 1200)))
+    _, flagged = validator.split(make_batch(("OK", None, 1200)))
+    assert flagged.reasons == ["duplicate"]